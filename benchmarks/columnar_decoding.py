@@ -0,0 +1,43 @@
+"""Compares the throughput of parsing a log file line by line with :class:`ChroniclesRawSource` over
+:class:`MmapLogSource`, and in columnar batches with :class:`ColumnarChroniclesSource`, both as whole batches and
+through its per-line adapter."""
+import tempfile
+from argparse import ArgumentParser
+from pathlib import Path
+
+from benchmarks.utils import synthetic_lines, throughput
+from logtools.log.sources.input.mmap_log_source import MmapLogSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource, LogLevel
+from logtools.log.sources.parse.columnar import ColumnarChroniclesSource
+from logtools.log.sources.transform.filtered_source import FilteredSource, level_in
+
+
+def consume(source):
+    for _ in source:
+        pass
+
+
+def main():
+    args = ArgumentParser()
+    args.add_argument('--lines', type=int, default=500_000)
+    lines = args.parse_args().lines
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'synthetic.log'
+        path.write_text(''.join(synthetic_lines(lines)))
+        warnings = level_in(LogLevel.warning)
+
+        throughput('lazily parsed lines (ChroniclesRawSource)', lines,
+                   lambda: consume(ChroniclesRawSource(MmapLogSource(path), lazy=True)))
+        throughput('columnar lines (ColumnarChroniclesSource)', lines,
+                   lambda: consume(ColumnarChroniclesSource(path)))
+        throughput('columnar batches (ColumnarChroniclesSource)', lines,
+                   lambda: consume(ColumnarChroniclesSource(path).iter_batches()))
+        throughput('warnings, line by line', lines,
+                   lambda: consume(FilteredSource(ChroniclesRawSource(MmapLogSource(path), lazy=True), warnings)))
+        throughput('warnings, batch masks', lines,
+                   lambda: consume(ColumnarChroniclesSource(path, predicate=warnings).iter_batches()))
+
+
+if __name__ == '__main__':
+    main()
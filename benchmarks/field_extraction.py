@@ -0,0 +1,54 @@
+"""Compares strategies for extracting Chronicles topics into columns, as done by `log-to-csv --extract-fields`, over
+increasingly wide extraction lists."""
+import re
+from argparse import ArgumentParser
+
+from benchmarks.utils import throughput
+from logtools.log.sources.input.string_log_source import StringLogSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+
+# the regex which was originally used to parse topics, applied once per extracted field.
+_TOPICS_KV = re.compile(r'(?P<key>\w+)=(?P<value>"(?:\\"|[^"])+"|\S+)')
+
+KEYS = [f'key{i}' for i in range(32)]
+
+
+def main():
+    args = ArgumentParser()
+    args.add_argument('--lines', type=int, default=20_000)
+    lines = args.parse_args().lines
+
+    topics = ' '.join(f'{key}=value{i}' for i, key in enumerate(KEYS))
+    contents = ''.join(
+        f'TRC 2023-10-16 17:28:46.579+00:00 Message {i} topics="codex node" {topics} count={i}\n'
+        for i in range(lines)
+    )
+    parsed = list(ChroniclesRawSource(StringLogSource(contents)))
+
+    for width in (1, 5, 10, 20):
+        # ask for keys spread over the line, including the first one, so that extract_fields (which scans topics
+        # right to left, until it gets to the leftmost key asked for) does not get to stop early
+        wanted = KEYS[::len(KEYS) // width][:width]
+
+        def rescan():
+            for line in parsed:
+                _ = {key: dict(_TOPICS_KV.findall(line.topics)).get(key, 'NA') for key in wanted}
+
+        def memoized():
+            for line in parsed:
+                line._fields = None
+                _ = {key: line.fields.get(key, 'NA') for key in wanted}
+
+        def selective():
+            for line in parsed:
+                line._fields = None
+                extracted = line.extract_fields(wanted)
+                _ = {key: extracted.get(key, 'NA') for key in wanted}
+
+        throughput(f'{width:>2} fields, rescan per field', lines, rescan)
+        throughput(f'{width:>2} fields, memoized fields', lines, memoized)
+        throughput(f'{width:>2} fields, extract_fields', lines, selective)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Measures, with :mod:`tracemalloc`, the memory retained by parsed log lines and the memory allocated while
+streaming through a log file."""
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+from pathlib import Path
+
+from benchmarks.utils import synthetic_lines
+from logtools.log.sources.input.file_log_source import FileLogSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+
+
+def _measure(label: str, lines: int, task):
+    tracemalloc.start()
+    retained = task()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<40} {current / lines:>10,.1f} B/line retained {peak / lines:>10,.1f} B/line peak')
+    return retained
+
+
+def main():
+    args = ArgumentParser()
+    args.add_argument('--lines', type=int, default=1_000_000)
+    lines = args.parse_args().lines
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'fixture.log'
+        with path.open('w', encoding='utf-8') as fixture:
+            fixture.writelines(synthetic_lines(lines))
+
+        _measure('raw lines (FileLogSource)', lines, lambda: list(FileLogSource(path)))
+        _measure('parsed lines (ChroniclesRawSource)', lines,
+                 lambda: list(ChroniclesRawSource(FileLogSource(path))))
+        _measure('lazy lines (ChroniclesRawSource)', lines,
+                 lambda: list(ChroniclesRawSource(FileLogSource(path), lazy=True)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Compares the throughput of the tuple-keyed :class:`MergedSource` with that of a heap of :class:`OrderedSource`
+objects compared through their rich comparison methods, which is how sources used to be merged."""
+from argparse import ArgumentParser
+from datetime import timedelta, datetime, timezone
+from heapq import heapify, heappop, heappush
+from typing import List
+
+from benchmarks.utils import synthetic_lines, throughput
+from logtools.log.sources.input.string_log_source import StringLogSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource, ChroniclesLogLine
+from logtools.log.sources.transform.merged_source import MergedSource
+from logtools.log.sources.transform.ordered_source import OrderedSource
+
+
+def ordered_source_merge(*sources: OrderedSource):
+    heap = [source for source in sources if source.peek is not None]
+    heapify(heap)
+    while heap:
+        log = heappop(heap)
+        yield next(log)
+        if log.peek is not None:
+            heappush(heap, log)
+
+
+def main():
+    args = ArgumentParser()
+    args.add_argument('--lines', type=int, default=200_000, help='Total number of lines across all sources')
+    total = args.parse_args().lines
+
+    for count in [2, 32, 512]:
+        # sources overlap in time, and start at slightly different offsets so that some timestamps tie.
+        per_source = total // count
+        sources: List[List[ChroniclesLogLine]] = [
+            list(ChroniclesRawSource(StringLogSource(''.join(synthetic_lines(
+                per_source, start=datetime(2023, 10, 16, tzinfo=timezone.utc) + timedelta(milliseconds=i % 7),
+                seed=i)))))
+            for i in range(count)
+        ]
+        units = per_source * count
+
+        throughput(f'{count} sources (OrderedSource heap)', units,
+                   lambda: sum(1 for _ in ordered_source_merge(*(OrderedSource(iter(s)) for s in sources))))
+        throughput(f'{count} sources (tuple-keyed heap)', units,
+                   lambda: sum(1 for _ in MergedSource(*sources)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Compares the throughput of a log pipeline built as a stack of sources (:meth:`Pipeline.nested`) with the same
+pipeline fused into a single loop (:meth:`Pipeline.fused`), with and without filters and transforms."""
+import tempfile
+from argparse import ArgumentParser
+from pathlib import Path
+
+from benchmarks.utils import synthetic_lines, throughput
+from logtools.log.sources.parse.chronicles_raw_source import LogLevel
+from logtools.log.sources.pipeline import Pipeline
+from logtools.log.sources.transform.filtered_source import level_in, topic_value
+
+
+def consume(source):
+    for _ in source:
+        pass
+
+
+def main():
+    args = ArgumentParser()
+    args.add_argument('--lines', type=int, default=500_000)
+    lines = args.parse_args().lines
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'synthetic.log'
+        path.write_text(''.join(synthetic_lines(lines)))
+
+        pipelines = {
+            'lazy': Pipeline(path=path, lazy=True),
+            'eager': Pipeline(path=path),
+            'lazy, filtered and transformed': Pipeline(
+                path=path, lazy=True, filters=(level_in(LogLevel.trace, LogLevel.debug), topic_value('tid', '1')),
+                transforms=(lambda line: line, lambda line: line)),
+        }
+        for name, pipeline in pipelines.items():
+            throughput(f'{name}, nested', lines, lambda: consume(pipeline.nested()), repeat=5)
+            throughput(f'{name}, fused', lines, lambda: consume(pipeline.fused()), repeat=5)
+
+
+if __name__ == '__main__':
+    main()
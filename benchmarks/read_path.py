@@ -0,0 +1,36 @@
+"""Compares the throughput of reading (and optionally parsing) a log file through :class:`FileLogSource`, which
+decodes every line, and through :class:`MmapLogSource`, which splits lines out of a memory mapping as bytes."""
+import tempfile
+from argparse import ArgumentParser
+from pathlib import Path
+
+from benchmarks.utils import synthetic_lines, throughput
+from logtools.log.sources.input.file_log_source import FileLogSource
+from logtools.log.sources.input.mmap_log_source import MmapLogSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+
+
+def consume(source):
+    for _ in source:
+        pass
+
+
+def main():
+    args = ArgumentParser()
+    args.add_argument('--lines', type=int, default=500_000)
+    lines = args.parse_args().lines
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'synthetic.log'
+        path.write_text(''.join(synthetic_lines(lines)))
+
+        throughput('raw lines (FileLogSource)', lines, lambda: consume(FileLogSource(path)))
+        throughput('raw lines (MmapLogSource)', lines, lambda: consume(MmapLogSource(path)))
+        throughput('lazily parsed lines (FileLogSource)', lines,
+                   lambda: consume(ChroniclesRawSource(FileLogSource(path), lazy=True)))
+        throughput('lazily parsed lines (MmapLogSource)', lines,
+                   lambda: consume(ChroniclesRawSource(MmapLogSource(path), lazy=True)))
+
+
+if __name__ == '__main__':
+    main()
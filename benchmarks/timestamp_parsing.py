@@ -0,0 +1,35 @@
+"""Compares Chronicles log parsing throughput with the generic :mod:`dateutil` timestamp parser and with the
+fixed-layout parser in :func:`parse_timestamp`."""
+from argparse import ArgumentParser
+from unittest.mock import patch
+
+from dateutil import parser
+
+from benchmarks.utils import synthetic_lines, throughput
+from logtools.log.sources.input.string_log_source import StringLogSource
+from logtools.log.sources.parse import chronicles_raw_source
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource, parse_timestamp
+
+
+def main():
+    args = ArgumentParser()
+    args.add_argument('--lines', type=int, default=100_000)
+    lines = args.parse_args().lines
+
+    contents = ''.join(synthetic_lines(lines))
+    timestamps = [line[4:33] for line in contents.splitlines()]
+
+    throughput('timestamps (dateutil)', lines, lambda: [parser.parse(ts) for ts in timestamps])
+    throughput('timestamps (fixed layout)', lines, lambda: [parse_timestamp(ts) for ts in timestamps])
+
+    def parse_all():
+        for _ in ChroniclesRawSource(StringLogSource(contents)):
+            pass
+
+    with patch.object(chronicles_raw_source, 'parse_timestamp', parser.parse):
+        throughput('ChroniclesRawSource lines (dateutil)', lines, parse_all)
+    throughput('ChroniclesRawSource lines (fixed layout)', lines, parse_all)
+
+
+if __name__ == '__main__':
+    main()
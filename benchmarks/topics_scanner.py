@@ -0,0 +1,58 @@
+"""Compares the original topics regex with the linear-time topics scanner, on typical Chronicles lines and on
+pathological lines made of long chains of quoted values which fail to match at the very end."""
+import re
+import time
+from argparse import ArgumentParser
+
+from benchmarks.utils import synthetic_lines, throughput
+from logtools.log.sources.parse.topics import topics_start
+
+# the regex which was originally used to split topics from messages.
+_TOPICS = re.compile(r'((\w+=("[^"]+"|\S+) )+)?\w+=("(\\"|[^"])+"|\S+)$')
+
+
+def _chain(tokens: int) -> str:
+    return 'msg ' + ' '.join(f'k{i}="v{i}"' for i in range(tokens))
+
+
+def _pathological(tokens: int) -> str:
+    return _chain(tokens) + ' "x'
+
+
+def _time(task) -> float:
+    start = time.perf_counter()
+    task()
+    return time.perf_counter() - start
+
+
+def main():
+    args = ArgumentParser()
+    args.add_argument('--lines', type=int, default=100_000)
+    args.add_argument('--max-regex-tokens', type=int, default=18,
+                      help='largest pathological chain to run the regex on (time roughly quadruples every 2 tokens)')
+    options = args.parse_args()
+
+    bodies = [line[34:line.rindex(' count=')] for line in synthetic_lines(options.lines)]
+    throughput('typical lines (regex)', options.lines, lambda: [_TOPICS.search(body) for body in bodies])
+    throughput('typical lines (scanner)', options.lines, lambda: [topics_start(body) for body in bodies])
+
+    print()
+    print(f'{"pathological chain length":<32} {"regex (s)":>12} {"scanner (s)":>12}')
+    for tokens in range(10, options.max_regex_tokens + 1, 2):
+        body = _pathological(tokens)
+        print(f'{tokens:<32} {_time(lambda: _TOPICS.search(body)):>12.6f} {_time(lambda: topics_start(body)):>12.6f}')
+
+    for tokens in (1_000, 10_000, 100_000):
+        body = _pathological(tokens)
+        print(f'{tokens:<32} {"-":>12} {_time(lambda: topics_start(body)):>12.6f}')
+
+    # well-formed chains are where the scanner has to do the most work, as it walks through every token.
+    print()
+    print(f'{"well-formed chain length":<32} {"regex (s)":>12} {"scanner (s)":>12}')
+    for tokens in (10, 1_000, 10_000, 100_000):
+        body = _chain(tokens)
+        print(f'{tokens:<32} {_time(lambda: _TOPICS.search(body)):>12.6f} {_time(lambda: topics_start(body)):>12.6f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Shared helpers for the benchmark scripts. These are not part of the library, and are meant to be run by hand as
+`python -m benchmarks.<name>` from the root of the repository."""
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator, Any
+
+_MESSAGES = [
+    'Sending want list to peer',
+    'Advertising block',
+    'Provided to nodes',
+    'Retrieved record from repo',
+    'Received blocks from peer',
+]
+
+_LEVELS = ['TRC', 'DBG', 'INF', 'WRN']
+
+
+def synthetic_lines(count: int, start: datetime = datetime(2023, 10, 16, tzinfo=timezone.utc),
+                    seed: int = 42) -> Iterator[str]:
+    """Generates `count` time-ordered, newline-terminated Chronicles log lines."""
+    rng = random.Random(seed)
+    timestamp = start
+    for i in range(1, count + 1):
+        timestamp += timedelta(milliseconds=rng.randint(0, 3))
+        yield (f'{rng.choice(_LEVELS)} {timestamp.isoformat(sep=" ", timespec="milliseconds")} '
+               f'{rng.choice(_MESSAGES):<32} topics="codex blockexcnetwork" tid={rng.randint(1, 8)} '
+               f'peer=16U*{rng.randint(0, 99999):05d} cid=zb2rh{rng.getrandbits(64):016x} items={rng.randint(1, 9)} '
+               f'count={i}\n')
+
+
+def throughput(label: str, units: int, task: Callable[[], Any], repeat: int = 3) -> float:
+    """Runs `task` `repeat` times and reports the best observed throughput in units per second."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        task()
+        best = min(best, time.perf_counter() - start)
+
+    rate = units / best
+    print(f'{label:<48} {rate:>14,.0f} /s')
+    return rate
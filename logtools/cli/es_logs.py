@@ -1,5 +1,6 @@
 import dataclasses
 import os
+from itertools import islice
 from argparse import ArgumentParser
 from datetime import timedelta, datetime
 from enum import Enum
@@ -16,7 +17,13 @@ from rich.table import Table
 
 from logtools import version_string
 from logtools.cli.palettes import ColorMap
+from logtools.cli.utils import filter_expression, positive_int
+from logtools.log.base import LogSource
 from logtools.log.sources.input.elastic_search_source import ElasticSearchSource
+from logtools.log.sources.parallel.prefetch_source import PrefetchSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+from logtools.log.sources.transform.filter_expression import FilterExpression
+from logtools.log.sources.transform.filtered_source import FilteredSource
 from logtools.resource.elastic_search_log_repo import ElasticSearchLogRepo
 
 
@@ -77,11 +84,14 @@ def get_logs(args, client: Elasticsearch):
             start_date=args.from_,
             end_date=args.to,
             limit=args.limit,
+            expression=args.filter,
+            slices=args.parallel,
         )
     elif resource == ResourceType.runs:
         run = ElasticSearchLogRepo(client=client).test_run(test_run_id=args.test_run_id).test_run
         get_pod_logs(set(run.pods).union(set(args.additional_pods)),
-                     client, limit=args.limit, start_date=run.start, end_date=run.end)
+                     client, limit=args.limit, start_date=run.start, end_date=run.end, expression=args.filter,
+                     slices=args.parallel)
 
 
 def get_pod_logs(pods: Set[str],
@@ -89,15 +99,28 @@ def get_pod_logs(pods: Set[str],
                  colored_output: bool = True,
                  limit: Optional[int] = None,
                  start_date: Optional[datetime] = None,
-                 end_date: Optional[datetime] = None):
+                 end_date: Optional[datetime] = None,
+                 expression: Optional[FilterExpression] = None,
+                 slices: Optional[int] = None):
     colors = ColorMap()
-    for i, line in enumerate(ElasticSearchSource(
-            pods=pods,
-            client=client,
-            start_date=start_date,
-            end_date=end_date,
-            limit=limit,
-    )):
+    clause, exact = expression.es_clause() if expression is not None else (None, True)
+    # pages get fetched on a background thread while the lines already fetched get printed.
+    logs: LogSource = PrefetchSource(ElasticSearchSource(
+        pods=pods,
+        client=client,
+        start_date=start_date,
+        end_date=end_date,
+        # entries still to be filtered locally do not count towards the limit, so it gets applied after filtering.
+        limit=limit if exact else None,
+        filters=[clause] if clause is not None else [],
+        slices=slices,
+    ))
+    lines: Iterable = logs
+    # whatever could not be filtered server-side gets filtered once lines are parsed.
+    if expression is not None and not exact:
+        lines = islice(FilteredSource(ChroniclesRawSource(logs, lazy=True), expression), limit)
+
+    for line in lines:
         output = f'[{line.location.pod_name}]: {line.raw}'
         if colored_output:
             output = f'{colors[line.location.pod_name]}{output}{Style.reset}'
@@ -181,6 +204,12 @@ def _add_logs_cli(subparsers):
     logs = subparsers.add_parser('logs', help='fetch pod logs')
     logs.set_defaults(main=get_logs)
     logs.add_argument('--limit', type=int, help='limit the number of log entries to fetch')
+    logs.add_argument('--filter', type=filter_expression, metavar='EXPRESSION',
+                      help='only show log entries matching a filter expression, e.g. \'level>=WRN and '
+                           'topics.cid=zb2...\'. filtering happens server-side where possible')
+    logs.add_argument('--parallel', type=positive_int, metavar='N',
+                      help='fetch logs from a point in time in N slices at once, merging them back by timestamp, '
+                           'rather than through a single scroll cursor per index')
 
     log_subparsers = logs.add_subparsers(title='resource type', dest='resource_type', required=True)
 
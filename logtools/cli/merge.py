@@ -1,75 +1,209 @@
 """Merges two log files by timestamp. Accepts aliases for log files. Can filter by timestamp."""
 import argparse
 import random
-from datetime import datetime
+import sys
+from concurrent.futures import ProcessPoolExecutor, Executor
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from functools import partial
 from pathlib import Path
 from random import shuffle
-from typing import Dict
+from typing import Dict, List, Optional, Callable, Tuple
 
 import pytz
 from colored import Fore, Style
 from dateutil import parser as tsparser
 
 from logtools import version_string
-from logtools.log.sources.input.file_log_source import FileLogSource
-from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
-from logtools.log.sources.transform.filtered_source import FilteredSource, timestamp_range
+from logtools.cli.utils import filter_expression, add_parse_cache_arguments, parse_cache, positive_int
+from logtools.log.base import LogSource
+from logtools.log.sources.input.compressed import is_compressed
+from logtools.log.sources.input.rotated_log_source import RotatedLog, RotatedLogSource, collatable, \
+    expand_log_paths, overlapping_files, rotated_logs
+from logtools.log.sources.parallel.chunked_file_source import ChunkedChroniclesSource
+from logtools.log.sources.parallel.process_source import ProcessSource, DEFAULT_BATCH_SIZE
+from logtools.log.sources.parallel.windowed_merge_source import WindowedMergeSource, DEFAULT_WINDOW_SIZE
+from logtools.log.sources.pipeline import Pipeline
+from logtools.log.sources.parse.chronicles_raw_source import BytesChroniclesLogLine
+from logtools.log.sources.parse.parse_cache import ParseCache
+from logtools.log.sources.parse.time_bounds import seek_range
+from logtools.log.sources.parse.timestamp_index import ByteRange
+from logtools.log.sources.transform.cascading_merge_source import CascadingMergeSource
+from logtools.log.sources.transform.filtered_source import FilteredSource, timestamp_range, all_of
 from logtools.log.sources.transform.merged_source import MergedSource
-from logtools.log.sources.transform.ordered_source import OrderedSource
+from logtools.log.sources.transform.reordered_source import ReorderedSource, SortedSource
 
 
 def merge(args):
-    names = _assign_aliases(args)
+    logs = _logs(args)
+    names = _assign_aliases(args, logs)
     palette = _assign_colors(names)
+    predicate = _filtering_predicate(args)
 
-    parts = [
-        OrderedSource(
-            FilteredSource(
-                ChroniclesRawSource(
-                    FileLogSource(path)
-                ),
-                predicate=_filtering_predicate(args)
+    # when seeking, whole files outside the time range are left out, without even being opened with
+    # --cache-time-bounds.
+    time_range = _time_range(args)
+    if time_range is not None:
+        logs = [RotatedLog(log.name, overlapping_files(log.paths, *time_range, args.cache_time_bounds), log.collated)
+                for log in logs]
+
+    pooled = args.parallel == 'windows' or (args.parallel == 'chunks' and args.jobs > 1)
+    with ProcessPoolExecutor(max_workers=args.jobs) if pooled else nullcontext() as executor:
+        if args.parallel == 'windows':
+            merged = WindowedMergeSource(
+                [path for log in logs for path in log.paths], executor,
+                windows=args.windows,
+                start=_ensure_utc(args.from_) if args.from_ is not None else None,
+                end=_ensure_utc(args.to) if args.to is not None else None,
+                lazy=True,
+                # windows require time-ordered logs anyway, and reading whole files would cost a pass per window.
+                seek=args.seek if args.seek != 'none' else 'bisect',
+                cache=parse_cache(args),
+                window_size=args.window_size * 1024 * 1024,
+                min_windows=args.jobs,
             )
-        )
-        for path in args.files
-    ]
+            # windows are already restricted to --from and --to, but not to the filter expression.
+            if args.filter is not None:
+                merged = FilteredSource(merged, args.filter)
+        else:
+            parts = [
+                ProcessSource(partial(_parse_log, log, args, predicate, None), batch_size=args.batch_size)
+                if args.parallel == 'files' else _parse_log(log, args, predicate, executor)
+                for log in logs
+            ]
+
+            if args.sort:
+                parts = [SortedSource(part, spill_dir=args.spill_dir) for part in parts]
+            elif args.reorder_slack is not None:
+                parts = [ReorderedSource(part, slack=timedelta(milliseconds=args.reorder_slack)) for part in parts]
+
+            # If we only have one source, then no need to actually do a merge.
+            if len(parts) == 1:
+                merged = parts[0]
+            elif args.fan_in is not None:
+                merged = CascadingMergeSource(*parts, fan_in=args.fan_in, spill_dir=args.spill_dir)
+            else:
+                merged = MergedSource(*parts)
 
-    # If we only have one source, then no need to actually do a merge.
-    logs = MergedSource(*parts) if len(parts) > 1 else parts[0]
+        _write(merged, names, palette)
 
+
+def _write(logs: LogSource, names: Dict[str, str], palette: Dict[str, str]):
+    # lines parsed from bytes get written out as they were read, so only the alias and colors need encoding.
+    prefixes = {name: f'{getattr(Fore, palette[log_id])}{log_id}: '.encode() for name, log_id in names.items()}
+    reset: bytes = Style.reset.encode()
+    out = sys.stdout.buffer
     for line in logs:
-        log_id = names[line.location.path.name]
-        print(f'{getattr(Fore, palette[log_id])}{log_id}: {line.raw}{Style.reset}', end='')
+        out.write(prefixes[line.location.path.name])
+        out.write(line.data if isinstance(line, BytesChroniclesLogLine) else line.raw.encode())
+        out.write(reset)
+    out.flush()
+
+
+def _logs(args) -> List[RotatedLog]:
+    """Returns the logs to merge: one per file, unless rotated files are to be read as a single log."""
+    if not args.rotated:
+        return [RotatedLog(path.name, [path]) for path in args.files]
+
+    logs = []
+    for log in rotated_logs(args.files):
+        if len(log.paths) > 1 and not collatable(log.paths, args.cache_time_bounds):
+            print(f'Files of {log.name} overlap in time or are not in rotation order, merging them instead',
+                  file=sys.stderr)
+            log = RotatedLog(log.name, log.paths, collated=False)
+        logs.append(log)
+    return logs
+
+
+def _parse_log(
+        log: RotatedLog,
+        args,
+        predicate: Optional[Callable],
+        executor: Optional[Executor],
+) -> LogSource:
+    def open_file(path: Path) -> LogSource:
+        return _parse(path, predicate, executor, _byte_range(args, path), parse_cache(args), args.prefetch)
+
+    if not log.collated:
+        return MergedSource(*[open_file(path) for path in log.paths])
+    # the files of a rotated log are read one after the other, each of them seeking to the time range on its own.
+    return RotatedLogSource(log.paths, open_file)
 
 
-def _assign_aliases(args):
-    names = {path.name: path.name for path in args.files}
+def _parse(
+        path: Path,
+        predicate: Optional[Callable],
+        executor: Optional[Executor],
+        byte_range: Optional[ByteRange] = None,
+        cache: Optional[ParseCache] = None,
+        prefetch: bool = False,
+) -> LogSource:
+    byte_range = byte_range if byte_range is not None else ByteRange()
+    if executor is not None:
+        return ChunkedChroniclesSource(path, executor, predicate=predicate, lazy=True, start=byte_range.start,
+                                       end=byte_range.end, first_line_number=byte_range.first_line_number,
+                                       cache=cache)
+
+    # only compressed files are slow enough to read for prefetching to pay off.
+    return Pipeline(path=path, byte_range=byte_range, lazy=True, cache=cache, prefetch=prefetch and is_compressed(path),
+                    filters=(predicate,) if predicate is not None else ()).fused()
+
+
+def _time_range(args) -> Optional[Tuple[Optional[datetime], Optional[datetime]]]:
+    """Returns the time range to seek to in each log file, or `None` if log files must be read whole."""
+    # unsorted logs cannot be searched.
+    if args.seek == 'none' or args.sort or (args.from_ is None and args.to is None):
+        return None
+
+    # lines can be up to the reorder slack out of order, so we need to look for them that much further.
+    slack = timedelta(milliseconds=args.reorder_slack if args.reorder_slack is not None else 0)
+    start = _ensure_utc(args.from_) - slack if args.from_ is not None else None
+    end = _ensure_utc(args.to) + slack if args.to is not None else None
+    return start, end
+
+
+def _byte_range(args, path: Path) -> Optional[ByteRange]:
+    time_range = _time_range(args)
+    if time_range is None:
+        return None
+    return seek_range(path, *time_range, args.seek)
+
+
+def _assign_aliases(args, logs: List[RotatedLog]) -> Dict[str, str]:
+    # logs made of a single file are shown under the name of that file, as it might not follow rotation naming.
+    aliases = [log.name if len(log.paths) > 1 else log.paths[0].name for log in logs]
     for i, alias in enumerate(args.aliases):
-        if i >= len(args.files):  # excess aliases are just ignored
+        if i >= len(logs):  # excess aliases are just ignored
             break
-        names[args.files[i].name] = alias
+        aliases[i] = alias
 
-    max_len = max([len(alias) for alias in names.values()])
+    max_len = max([len(alias) for alias in aliases])
 
-    return {name: alias.rjust(max_len) for name, alias in names.items()}
+    return {path.name: alias.rjust(max_len) for log, alias in zip(logs, aliases) for path in log.paths}
 
 
 def _assign_colors(names: Dict[str, str]) -> Dict[str, str]:
     random.seed(4)
     colors = list(Fore._COLORS.keys())
     shuffle(colors)
-    return {names[key]: colors[i] for i, key in enumerate(names.keys())}
+    # the files of a rotated log share their alias, and therefore their color.
+    return {alias: colors[i] for i, alias in enumerate(dict.fromkeys(names.values()))}
 
 
 def _filtering_predicate(args):
+    predicates = []
     if args.from_ or args.to:
-        return timestamp_range(
+        predicates.append(timestamp_range(
             _ensure_utc(args.from_) if args.from_ is not None else datetime(
                 year=1980, month=1, day=1, hour=0, minute=0, second=0, tzinfo=pytz.UTC),
             _ensure_utc(args.to) if args.to is not None else datetime.utcnow().replace(tzinfo=pytz.UTC)
-        )
+        ))
+    if args.filter is not None:
+        predicates.append(args.filter)
 
-    return lambda x: True
+    if not predicates:
+        return None
+    return predicates[0] if len(predicates) == 1 else all_of(*predicates)
 
 
 def _ensure_utc(ts: datetime) -> datetime:
@@ -83,7 +217,16 @@ def main():
         description='Merges Chronicles logs chronologically and outputs colored, interleaved content.')
     parser.add_argument('--version', action='version', version=version_string)
 
-    parser.add_argument("files", nargs="+", help='Log files to merge.', type=Path)
+    parser.add_argument("files", nargs="+", type=Path,
+                        help='Log files to merge, or directories or (quoted) glob patterns to take them from.')
+    parser.add_argument('--rotated', action='store_true',
+                        help='Read the rotated files of a log (e.g. node.log.2.gz, node.log.1 and node.log) one after '
+                             'the other, as a single log under a single alias. Files which overlap in time or are not '
+                             'in rotation order get merged instead.')
+    parser.add_argument('--cache-time-bounds', action='store_true',
+                        help='Cache the first and last timestamps of each log file in .logtools-time-bounds.json in '
+                             'its directory, so that later runs with --from/--to or --rotated do not need to open '
+                             'files outside the time range')
     parser.add_argument('--aliases', nargs="*",
                         help='Optional aliases to print instead of the log file name in merged output',
                         type=str, default=[])
@@ -91,8 +234,68 @@ def main():
                         help='Show entries from date/time (multiple formats accepted)')
     parser.add_argument('--to', type=tsparser.parse,
                         help='Show entries to date/time (multiple formats accepted)')
+    parser.add_argument('--filter', type=filter_expression, metavar='EXPRESSION',
+                        help='Show entries matching a filter expression, e.g. \'level>=WRN and topics.cid=zb2... and '
+                             'message~"Block"\'')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='Number of processes used to parse each log file in parallel chunks (defaults to 1)')
+    parser.add_argument('--parallel', choices=['chunks', 'files', 'windows'], default='chunks',
+                        help='How to parallelize: split each file into chunks parsed by --jobs processes, parse '
+                             'each file in a process of its own, or split the time range into windows merged by '
+                             '--jobs processes (defaults to chunks). Windows require time-ordered log files.')
+    parser.add_argument('--windows', type=int,
+                        help='Number of time windows to split the merge into with --parallel windows (defaults to '
+                             'as many as it takes for each window to hold about --window-size of logs, and at least '
+                             '--jobs)')
+    parser.add_argument('--window-size', type=positive_int, metavar='MB',
+                        default=DEFAULT_WINDOW_SIZE // (1024 * 1024),
+                        help='Approximate size of the logs merged by each window with --parallel windows (defaults to '
+                             f'{DEFAULT_WINDOW_SIZE // (1024 * 1024)}MB). Memory use is bounded by a few windows.')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='Number of lines sent at once by per-file processes (defaults to '
+                             f'{DEFAULT_BATCH_SIZE}). Memory use per file is bounded by a few batches.')
+    parser.add_argument('--fan-in', type=int,
+                        help='Merge at most this many files at once, spilling intermediate merges to temporary '
+                             'files. Bounds the number of open files when merging hundreds of logs. Not supported '
+                             'with --parallel windows.')
+    parser.add_argument('--spill-dir', type=Path,
+                        help='Directory for the temporary files written with --fan-in or --sort (defaults to the system '
+                             'temporary directory)')
+    parser.add_argument('--reorder-slack', type=float, metavar='MILLISECONDS',
+                        help='Restore the order of log files whose lines can be up to this many milliseconds out of '
+                             'order, e.g. because they are written by several threads')
+    parser.add_argument('--sort', action='store_true',
+                        help='Fully sort log files which are not time-ordered before merging them, spilling to '
+                             'temporary files if they do not fit in memory')
+    parser.add_argument('--seek', choices=['bisect', 'index', 'none'], default='none',
+                        help='How to find the part of each log file between --from and --to: by binary search over '
+                             'the file, using sparse timestamp indexes which are built on first use and kept next to '
+                             'each log file (as <log>.tsidx), or by reading whole files (the default). Seeking '
+                             'requires time-ordered log files, skips whole files outside the time range, and is '
+                             'disabled with --sort. Binary search cannot tell the line numbers of the lines it finds, '
+                             'which get counted from the start of the part of the file read instead. --parallel '
+                             'windows always seeks, by binary search unless using indexes.')
+    parser.add_argument('--index', dest='seek', action='store_const', const='index',
+                        help='Same as --seek index')
+    parser.add_argument('--prefetch', action='store_true',
+                        help='Decompress compressed log files ahead of parsing them, on a background thread. This '
+                             'only pays off with a spare core, and does not apply to --jobs.')
+    add_parse_cache_arguments(parser)
+
+    args = parser.parse_args()
+    args.files = expand_log_paths(args.files)
+    if not args.files:
+        parser.error('no log files to merge')
+    if (args.sort or args.reorder_slack is not None) and args.parallel == 'windows':
+        parser.error('--sort and --reorder-slack are not supported with --parallel windows')
+    if args.sort and args.seek == 'index':
+        parser.error('--sort is not supported with --seek index')
+    if args.fan_in is not None and args.parallel == 'windows':
+        parser.error('--fan-in is not supported with --parallel windows')
+    if args.fan_in is not None and args.fan_in < 2:
+        parser.error('--fan-in must be at least 2')
 
-    merge(parser.parse_args())
+    merge(args)
 
 
 if __name__ == '__main__':
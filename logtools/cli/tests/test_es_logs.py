@@ -0,0 +1,22 @@
+from dateutil import parser
+
+from logtools.cli.es_logs import get_pod_logs
+from logtools.log.sources.input.tests.test_elasticsearch_source import PointInTimeClient, document
+from logtools.log.sources.transform.filter_expression import compile_filter
+
+
+def chronicles_documents(count: int):
+    return [document('codex1', f'{"ERR" if i % 3 == 0 else "TRC"} 2024-02-08 11:50:{i:02d}.000+00:00 '
+                               f'Line {i} topics="codex" count={i}', f'2024-02-08T11:50:{i:02d}.000Z')
+            for i in range(count)]
+
+
+def test_should_apply_limit_after_filtering_entries_locally(capsys):
+    client = PointInTimeClient(chronicles_documents(30))
+
+    get_pod_logs({'codex1'}, client, colored_output=False, limit=3,  # type: ignore[arg-type]
+                 start_date=parser.parse('2024-02-08'), end_date=parser.parse('2024-02-08'),
+                 expression=compile_filter('message~"line" and level=ERR'), slices=1)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split(' ')[4:6] for line in lines] == [['Line', '0'], ['Line', '3'], ['Line', '6']]
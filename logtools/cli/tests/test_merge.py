@@ -0,0 +1,50 @@
+import re
+import sys
+from datetime import timedelta
+
+from dateutil import parser
+
+from logtools.cli import merge
+
+START = parser.parse('2023-10-16 20:29:24.000+00:00')
+
+
+def log_lines(first: int, last: int) -> str:
+    return ''.join(
+        f'TRC {(START + timedelta(seconds=i)).isoformat(sep=" ", timespec="milliseconds")} '
+        f'Advertising block topics="codex discoveryengine" count={i}\n'
+        for i in range(first, last + 1)
+    )
+
+
+def run_merge(monkeypatch, capsysbinary, *args) -> list:
+    monkeypatch.setattr(sys, 'argv', ['log-merge', '--seek', 'none', *map(str, args)])
+    merge.main()
+    return [count.decode() for count in re.findall(rb'count=(\d+)', capsysbinary.readouterr().out)]
+
+
+def test_should_merge_files_named_like_rotated_files_unless_asked_to_collate_them(tmp_path, monkeypatch,
+                                                                                    capsysbinary):
+    (tmp_path / 'pod.1').write_text(log_lines(1, 3))
+    (tmp_path / 'pod.2').write_text(log_lines(2, 4))
+
+    assert run_merge(monkeypatch, capsysbinary, tmp_path / 'pod.1', tmp_path / 'pod.2') == \
+           ['1', '2', '2', '3', '3', '4']
+    assert not list(tmp_path.glob('.logtools-*'))
+
+
+def test_should_merge_rotated_files_which_overlap_in_time(tmp_path, monkeypatch, capsysbinary):
+    (tmp_path / 'pod.1').write_text(log_lines(1, 3))
+    (tmp_path / 'pod.2').write_text(log_lines(4, 6))
+
+    # pod.2 is the older file by rotation order, but its lines come last.
+    assert run_merge(monkeypatch, capsysbinary, '--rotated', tmp_path / 'pod.1', tmp_path / 'pod.2') == \
+           ['1', '2', '3', '4', '5', '6']
+
+
+def test_should_collate_rotated_files_in_rotation_order(tmp_path, monkeypatch, capsysbinary):
+    (tmp_path / 'pod.2').write_text(log_lines(1, 3))
+    (tmp_path / 'pod.1').write_text(log_lines(4, 6))
+    (tmp_path / 'pod').write_text(log_lines(7, 9))
+
+    assert run_merge(monkeypatch, capsysbinary, '--rotated', tmp_path) == [str(i) for i in range(1, 10)]
@@ -2,13 +2,17 @@
 extracted into their own columns."""
 import sys
 from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from csv import DictWriter
 from pathlib import Path
 
 from logtools import version_string
-from logtools.cli.utils import kv_pair
+from logtools.cli.utils import kv_pair, filter_expression, add_parse_cache_arguments, parse_cache
+from logtools.log.sources.input.compressed import is_compressed
 from logtools.log.sources.input.file_log_source import FileLogSource
-from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+from logtools.log.sources.parallel.chunked_file_source import ChunkedChroniclesSource
+from logtools.log.sources.pipeline import Pipeline
 
 
 def to_csv(args):
@@ -21,30 +25,58 @@ def to_csv(args):
     )
 
     writer.writeheader()
-    # FIXME '/dev/stdin' is a non-portable hack.
-    for line in ChroniclesRawSource(FileLogSource(Path('/dev/stdin'))):
-        line_fields = {field: line.fields.get(field, 'NA') for field in fields}
-        writer.writerow({
-            'timestamp': line.timestamp.isoformat(),
-            'line_number': line.location.line_number,
-            'level': line.level.value,
-            'fields': line.topics,
-            'count': line.count,
-            'message': line.message,
-            **line_fields,
-            **constant_columns,
-        })
+    cache = parse_cache(args)
+    with ProcessPoolExecutor(max_workers=args.jobs) if args.jobs > 1 else nullcontext() as executor:
+        # FIXME '/dev/stdin' is a non-portable hack.
+        if executor is not None:
+            source = ChunkedChroniclesSource(args.log, executor, predicate=args.filter, cache=cache)
+        else:
+            filters = (args.filter,) if args.filter is not None else ()
+            # only stdin and compressed files are slow enough to read for prefetching to pay off.
+            pipeline = Pipeline(path=args.log, cache=cache, prefetch=args.prefetch and is_compressed(args.log),
+                                filters=filters) if args.log is not None else \
+                Pipeline(source=FileLogSource(Path('/dev/stdin')), prefetch=args.prefetch, filters=filters)
+            source = pipeline.fused()
+
+        for line in source:
+            extracted = line.extract_fields(fields)
+            line_fields = {field: extracted.get(field, 'NA') for field in fields}
+            writer.writerow({
+                'timestamp': line.timestamp.isoformat(),
+                'line_number': line.location.line_number,
+                'level': line.level.value,
+                'fields': line.topics,
+                'count': line.count,
+                'message': line.message,
+                **line_fields,
+                **constant_columns,
+            })
 
 
 def main():
     argparse = ArgumentParser()
-    parser.add_argument('--version', action='version', version=version_string)
+    argparse.add_argument('--version', action='version', version=version_string)
+    argparse.add_argument('log', nargs='?', type=Path, help='Log file to transform (defaults to stdin)')
     argparse.add_argument('--extract-fields', nargs='+', default=[],
                           help='Extract chronicles topics into CSV columns')
     argparse.add_argument('--constant-column', metavar='KEY=VALUE', nargs='+', type=kv_pair,
                           help='Adds a column with key KEY and constant value VALUE to the CSV')
+    argparse.add_argument('--filter', type=filter_expression, metavar='EXPRESSION',
+                          help='Only transform log lines matching a filter expression, e.g. \'level>=WRN and '
+                               'topics.cid=zb2...\'')
+    argparse.add_argument('--jobs', '-j', type=int, default=1,
+                          help='Number of processes used to parse the log file in parallel chunks (defaults to 1). '
+                               'Requires the log to be a file rather than stdin.')
+    argparse.add_argument('--prefetch', action='store_true',
+                          help='Read stdin or a compressed log file ahead of parsing it, on a background thread. This '
+                               'only pays off with a spare core, and does not apply to --jobs.')
+    add_parse_cache_arguments(argparse)
+
+    args = argparse.parse_args()
+    if args.jobs > 1 and args.log is None:
+        argparse.error('--jobs requires a log file')
 
-    to_csv(argparse.parse_args())
+    to_csv(args)
 
 
 if __name__ == '__main__':
@@ -1,5 +1,9 @@
 import argparse
-from typing import Tuple
+from pathlib import Path
+from typing import Optional, Tuple
+
+from logtools.log.sources.parse.parse_cache import ParseCache, DEFAULT_MAX_BYTES, default_cache_directory
+from logtools.log.sources.transform.filter_expression import FilterExpression, compile_filter
 
 
 def kv_pair(raw: str) -> Tuple[str, str]:
@@ -12,3 +16,42 @@ def kv_pair(raw: str) -> Tuple[str, str]:
 
     key, value = raw.split("=", 1)
     return key, value
+
+
+def positive_int(raw: str) -> int:
+    """
+    Parse a string into a strictly positive integer.
+    """
+    try:
+        value = int(raw)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(f'{raw} is not a positive integer')
+    return value
+
+
+def filter_expression(raw: str) -> FilterExpression:
+    """
+    Compiles a filter expression (e.g. 'level>=WRN and topics.cid=zb2...'), reporting syntax errors as usage errors.
+    """
+    try:
+        return compile_filter(raw)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def add_parse_cache_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--parse-cache', type=Path, nargs='?', const=default_cache_directory(), metavar='DIRECTORY',
+                        help='Cache the parse of each log file read as a whole, and reuse it in later runs until the '
+                             f'file changes. Caches are kept in DIRECTORY (defaults to {default_cache_directory()}).')
+    parser.add_argument('--parse-cache-size', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), metavar='MB',
+                        help='Size cap of the parse cache, past which the least recently used files are evicted '
+                             f'(defaults to {DEFAULT_MAX_BYTES // (1024 * 1024)}MB)')
+
+
+def parse_cache(args) -> Optional[ParseCache]:
+    """Returns the parse cache set up by the arguments of :func:`add_parse_cache_arguments`, if any."""
+    if args.parse_cache is None:
+        return None
+    return ParseCache(args.parse_cache, max_bytes=args.parse_cache_size * 1024 * 1024)
@@ -2,22 +2,27 @@ import abc
 from abc import ABC
 from dataclasses import dataclass
 from datetime import datetime
-from typing import TypeVar, Generic, Iterator
+from itertools import islice
+from typing import TypeVar, Generic, Iterator, Sequence
 
 TLocation = TypeVar('TLocation')
 
 
-@dataclass
+@dataclass(slots=True)
 class LineNumberLocation:
     """Commonly used location type which tracks the line number of a log line with respect to a given source."""
     line_number: int
 
 
-@dataclass
+@dataclass(slots=True)
 class RawLogLine(Generic[TLocation]):
     """
     A :class:`RawLogLine` is a log line that has not been parsed. It contains the raw text of the line and a
     location, when that can be meaningfully established by the input source.
+
+    Log line and location types are slotted, as sources may yield millions of them. Location types should keep
+    whatever is shared by all lines of a source (a path, an index name) in a single object referenced by every
+    location, so that only the per-line part (e.g. a line number) gets allocated for each line.
     """
     location: TLocation
     raw: str
@@ -26,7 +31,7 @@ class RawLogLine(Generic[TLocation]):
 TLogLine = TypeVar('TLogLine', bound=RawLogLine)
 
 
-@dataclass
+@dataclass(slots=True)
 class TimestampedLogLine(RawLogLine[TLocation]):
     """
     A :class:`TimestampedLogLine` is a log line with a known timestamp.
@@ -34,7 +39,21 @@ class TimestampedLogLine(RawLogLine[TLocation]):
     timestamp: datetime
 
 
+DEFAULT_BATCH_SIZE = 1000
+
+
 class LogSource(ABC, Generic[TLogLine]):
     @abc.abstractmethod
     def __iter__(self) -> Iterator[TLogLine]:
         ...
+
+    def iter_batches(self, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Sequence[TLogLine]]:
+        """
+        Iterates over the lines of the source in batches of up to `batch_size` lines. By default, batches are lists of
+        lines; sources which can decode many lines at once (see
+        :class:`~logtools.log.sources.parse.columnar.ColumnarChroniclesSource`) yield columnar batches instead, which
+        are sequences of lines too.
+        """
+        lines = iter(self)
+        while batch := list(islice(lines, batch_size)):
+            yield batch
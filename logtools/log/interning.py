@@ -0,0 +1,31 @@
+from typing import Dict
+
+DEFAULT_MAX_SIZE = 65_536
+
+
+class StringInterner:
+    """
+    A bounded intern table. Calling a :class:`StringInterner` with a string returns a previously seen string with the
+    same contents if there is one, so that equal strings coming from different log lines can share a single object.
+
+    Once the table holds `max_size` strings, new strings are passed through without being added to it. Values which
+    repeat enough to be worth interning are seen early on, whereas high-cardinality values (e.g. block ids) are exactly
+    the ones which could otherwise make the table grow without bound.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self._table: Dict[str, str] = {}
+
+    def __call__(self, string: str) -> str:
+        interned = self._table.get(string)
+        if interned is not None:
+            return interned
+
+        if len(self._table) < self.max_size:
+            self._table[string] = string
+
+        return string
+
+    def __len__(self) -> int:
+        return len(self._table)
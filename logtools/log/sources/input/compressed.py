@@ -0,0 +1,210 @@
+"""
+Transparent decompression of log files, chosen from their extension, and checkpoints for seeking into gzip files
+without inflating them from the start.
+
+Python's :mod:`zlib` cannot resume inflating from an arbitrary point in a deflate stream, so gzip checkpoints are placed
+at gzip member boundaries, where a fresh decompressor can take over. Files written as many members (e.g. by `bgzip`,
+`pigz --independent`, or by concatenating rotated logs) get one checkpoint every few MiB; files made of a single member
+only get one at the start, and seeking into them still inflates everything before the target offset.
+"""
+import bz2
+import gzip
+import lzma
+import os
+import struct
+import zlib
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Optional, Tuple, cast
+
+_OPENERS: Dict[str, Callable[[Path], BinaryIO]] = {
+    '.gz': lambda path: cast(BinaryIO, gzip.open(path, 'rb')),
+    '.bz2': lambda path: cast(BinaryIO, bz2.open(path, 'rb')),
+    '.xz': lambda path: cast(BinaryIO, lzma.open(path, 'rb')),
+}
+
+DEFAULT_CHECKPOINT_SPACING = 4 * 1024 * 1024
+
+SIDECAR_SUFFIX = '.gzidx'
+
+_READ_SIZE = 1024 * 1024
+
+# magic, version, size and mtime (in nanoseconds) of the compressed file, uncompressed size, number of checkpoints.
+_HEADER = struct.Struct('<4sIqqqq')
+_MAGIC = b'LGZX'
+_VERSION = 1
+
+
+def is_compressed(path: Path) -> bool:
+    return path.suffix in _OPENERS
+
+
+def is_gzip(path: Path) -> bool:
+    return path.suffix == '.gz'
+
+
+def open_binary(path: Path) -> BinaryIO:
+    """Opens a log file for reading bytes, decompressing it if its extension calls for it."""
+    opener = _OPENERS.get(path.suffix)
+    return opener(path) if opener is not None else path.open('rb')
+
+
+class GzipCheckpoints:
+    """
+    Positions in a gzip file at which decompression can start over, as parallel arrays of compressed and uncompressed
+    offsets. The first checkpoint is always at the start of the file.
+    """
+
+    def __init__(self, size: int, mtime_ns: int, uncompressed_size: int, compressed: array, uncompressed: array):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.uncompressed_size = uncompressed_size
+        self.compressed = compressed
+        self.uncompressed = uncompressed
+
+    @staticmethod
+    def sidecar(path: Path) -> Path:
+        return path.with_name(path.name + SIDECAR_SUFFIX)
+
+    @staticmethod
+    def for_file(path: Path) -> 'GzipCheckpoints':
+        """
+        Loads the checkpoints of a gzip file from their sidecar, or finds them (and attempts to save them) if the
+        sidecar is missing or out of date with respect to the size and modification time of the file.
+        """
+        checkpoints = GzipCheckpoints.cached(path)
+        if checkpoints is not None:
+            return checkpoints
+
+        checkpoints = GzipCheckpoints.build(path)
+        try:
+            checkpoints.save(GzipCheckpoints.sidecar(path))
+        except OSError:
+            pass
+        return checkpoints
+
+    @staticmethod
+    def cached(path: Path) -> Optional['GzipCheckpoints']:
+        """Returns the checkpoints saved in the sidecar of a gzip file, if they are still valid."""
+        stat = path.stat()
+        checkpoints = GzipCheckpoints.load(GzipCheckpoints.sidecar(path))
+        if checkpoints is not None and checkpoints.size == stat.st_size and checkpoints.mtime_ns == stat.st_mtime_ns:
+            return checkpoints
+        return None
+
+    @staticmethod
+    def build(path: Path, spacing: int = DEFAULT_CHECKPOINT_SPACING) -> 'GzipCheckpoints':
+        """Finds the member boundaries of a gzip file, keeping those at least `spacing` uncompressed bytes apart."""
+        stat = path.stat()
+        compressed, uncompressed = array('q', [0]), array('q', [0])
+        compressed_offset = uncompressed_offset = 0
+        decompressor = zlib.decompressobj(wbits=31)
+
+        with path.open('rb') as file:
+            data = file.read(_READ_SIZE)
+            member_start: Optional[Tuple[int, int]] = None
+            first_member = True
+            while data:
+                try:
+                    uncompressed_offset += len(decompressor.decompress(data))
+                except zlib.error:
+                    # like gzip.open, ignore trailing garbage (e.g. zero padding) after the first member.
+                    if first_member:
+                        raise
+                    break
+
+                if member_start is not None:
+                    compressed.append(member_start[0])
+                    uncompressed.append(member_start[1])
+                    member_start = None
+
+                if not decompressor.eof:
+                    compressed_offset += len(data)
+                    data = file.read(_READ_SIZE)
+                    continue
+
+                # a member ended: whatever follows it starts a new one.
+                compressed_offset += len(data) - len(decompressor.unused_data)
+                data = decompressor.unused_data or file.read(_READ_SIZE)
+                decompressor = zlib.decompressobj(wbits=31)
+                first_member = False
+                if uncompressed_offset - uncompressed[-1] >= spacing:
+                    member_start = (compressed_offset, uncompressed_offset)
+
+        return GzipCheckpoints(stat.st_size, stat.st_mtime_ns, uncompressed_offset, compressed, uncompressed)
+
+    @staticmethod
+    def load(sidecar: Path) -> Optional['GzipCheckpoints']:
+        """Loads checkpoints from a sidecar file, returning `None` if it is missing or unreadable."""
+        try:
+            contents = sidecar.read_bytes()
+            magic, version, size, mtime_ns, uncompressed_size, count = _HEADER.unpack_from(contents)
+        except (OSError, struct.error):
+            return None
+
+        if magic != _MAGIC or version != _VERSION or len(contents) != _HEADER.size + 2 * 8 * count:
+            return None
+
+        compressed, uncompressed = array('q'), array('q')
+        compressed.frombytes(contents[_HEADER.size:_HEADER.size + 8 * count])
+        uncompressed.frombytes(contents[_HEADER.size + 8 * count:])
+        return GzipCheckpoints(size, mtime_ns, uncompressed_size, compressed, uncompressed)
+
+    def save(self, sidecar: Path):
+        """Saves the checkpoints to a sidecar file, which is replaced atomically."""
+        temporary = sidecar.with_name(f'{sidecar.name}.{os.getpid()}.tmp')
+        try:
+            with temporary.open('wb') as output:
+                output.write(_HEADER.pack(_MAGIC, _VERSION, self.size, self.mtime_ns, self.uncompressed_size,
+                                          len(self.compressed)))
+                output.write(self.compressed.tobytes())
+                output.write(self.uncompressed.tobytes())
+            os.replace(temporary, sidecar)
+        finally:
+            temporary.unlink(missing_ok=True)
+
+    def before(self, offset: int) -> Tuple[int, int]:
+        """Returns the compressed and uncompressed offsets of the last checkpoint at or before `offset`."""
+        i = bisect_right(self.uncompressed, offset) - 1
+        return self.compressed[i], self.uncompressed[i]
+
+
+class _CheckpointReader(gzip.GzipFile):
+    """A :class:`gzip.GzipFile` reading from a checkpoint, which also closes the underlying file when closed."""
+
+    def __init__(self, file: BinaryIO):
+        super().__init__(fileobj=file, mode='rb')
+        self._file = file
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._file.close()
+
+
+def open_binary_at(path: Path, offset: int) -> BinaryIO:
+    """
+    Opens a log file for reading bytes from the uncompressed `offset` onwards. Plain files are simply seeked; gzip
+    files start decompressing from the closest checkpoint, if a valid checkpoint sidecar exists; other compressed files
+    are decompressed from the start.
+    """
+    if not is_compressed(path):
+        plain = path.open('rb')
+        plain.seek(offset)
+        return plain
+
+    if offset > 0 and is_gzip(path):
+        checkpoints = GzipCheckpoints.cached(path)
+        if checkpoints is not None:
+            compressed, uncompressed = checkpoints.before(offset)
+            file = path.open('rb')
+            file.seek(compressed)
+            reader = _CheckpointReader(file)
+            reader.seek(offset - uncompressed)
+            return cast(BinaryIO, reader)
+
+    stream = open_binary(path)
+    stream.seek(offset)
+    return stream
@@ -1,11 +1,14 @@
 import logging
+import threading
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, Iterator, Set
+from typing import Optional, Dict, Any, Iterator, Set, Tuple, Sequence
 
 from elasticsearch import Elasticsearch
 
 from logtools.log.base import TimestampedLogLine, LogSource
+from logtools.log.sources.parallel.prefetch_source import PrefetchSource
+from logtools.log.sources.transform.merged_source import MergedSource
 from logtools.log.utils import tree
 
 logger = logging.getLogger(__name__)
@@ -13,16 +16,61 @@ logger = logging.getLogger(__name__)
 INDEX_PREFIX = 'continuous-tests-pods'
 ES_MAX_BATCH_SIZE = 10_000
 
+# How long ElasticSearch keeps scroll cursors and points in time alive between two requests.
+_KEEP_ALIVE = '2m'
 
-@dataclass
-class ElasticSearchLocation:
+
+@dataclass(slots=True, frozen=True)
+class ElasticSearchContext:
+    """The part of an :class:`ElasticSearchLocation` which is shared by all lines of a pod within an index."""
     index: str
-    result_number: int
     pod_name: str
     run_id: str
 
 
+@dataclass(slots=True, init=False)
+class ElasticSearchLocation:
+    context: ElasticSearchContext
+    result_number: int
+
+    def __init__(self, index: str, result_number: int, pod_name: str, run_id: str):
+        self.context = ElasticSearchContext(index=index, pod_name=pod_name, run_id=run_id)
+        self.result_number = result_number
+
+    @classmethod
+    def in_context(cls, context: ElasticSearchContext, result_number: int) -> 'ElasticSearchLocation':
+        """Builds a location sharing `context` with other locations, rather than holding a context of its own."""
+        location = cls.__new__(cls)
+        location.context = context
+        location.result_number = result_number
+        return location
+
+    @property
+    def index(self) -> str:
+        return self.context.index
+
+    @property
+    def pod_name(self) -> str:
+        return self.context.pod_name
+
+    @property
+    def run_id(self) -> str:
+        return self.context.run_id
+
+
 class ElasticSearchSource(LogSource[TimestampedLogLine[ElasticSearchLocation]]):
+    """
+    Fetches pod logs from ElasticSearch.
+
+    Additional query clauses in `filters` (e.g. translated from a filter expression with
+    :meth:`FilterExpression.es_clause`) get applied server-side, along with the pod, run and date filters.
+
+    Logs are fetched through a scroll cursor per index by default. If `slices` is set, they are instead fetched from a
+    point in time over all indices, paginated with `search_after` on `@timestamp`, and split into as many slices,
+    which get fetched concurrently and merged back into timestamp order. Lines are then numbered across indices, in
+    that order.
+    """
+
     def __init__(
             self,
             pods: Optional[Set[str]] = None,
@@ -31,7 +79,9 @@ class ElasticSearchSource(LogSource[TimestampedLogLine[ElasticSearchLocation]]):
             start_date: Optional[datetime] = None,
             end_date: Optional[datetime] = None,
             limit: Optional[int] = None,
-            es_batch_size=ES_MAX_BATCH_SIZE
+            es_batch_size=ES_MAX_BATCH_SIZE,
+            filters: Sequence[Dict[str, Any]] = (),
+            slices: Optional[int] = None,
     ):
         if client is None:
             logger.warning('No client provided, defaulting to localhost')
@@ -45,13 +95,76 @@ class ElasticSearchSource(LogSource[TimestampedLogLine[ElasticSearchLocation]]):
         self.end_date = end_date
         self.limit = limit
         self.es_batch_size = es_batch_size
+        self.filters = filters
+        self.slices = slices
         self.page_fetch_counter = 0
+        self._contexts: Dict[Tuple[str, str, str], ElasticSearchContext] = {}
+        # slices get fetched on threads of their own, which all count pages.
+        self._counter_lock = threading.Lock()
 
     def __iter__(self) -> Iterator[TimestampedLogLine[ElasticSearchLocation]]:
+        if self.slices is not None:
+            yield from self._iter_sliced(self.slices)
+            return
+
         for index in self._indices():
             for i, document in enumerate(self._run_scan(self._build_query(), index)):
                 yield self._format_log_line(i, index, document)
 
+    def _iter_sliced(self, slices: int) -> Iterator[TimestampedLogLine[ElasticSearchLocation]]:
+        indices = list(self._indices())
+        if not indices:
+            return
+
+        pit_id = self.client.open_point_in_time(index=indices, keep_alive=_KEEP_ALIVE)['id']
+        try:
+            # slices are done fetching by the time the merge is over, so the point in time can be closed.
+            yield from self._merge_slices(pit_id, slices)
+        finally:
+            self.client.close_point_in_time(id=pit_id)
+
+    def _merge_slices(self, pit_id: str, slices: int) -> Iterator[TimestampedLogLine[ElasticSearchLocation]]:
+        page_size = min(self.limit, self.es_batch_size) if self.limit is not None else self.es_batch_size
+        # each slice gets fetched at most a page ahead of the merge.
+        merged = MergedSource(*[
+            PrefetchSource(_Slice(self, pit_id, slice_id, slices), batch_size=page_size, max_batches=1)
+            for slice_id in range(slices)
+        ])
+        for result_number, line in enumerate(merged):
+            line.location.result_number = result_number
+            yield line
+            if result_number + 1 == self.limit:
+                return
+
+    def _run_slice(self, pit_id: str, slice_id: int, slices: int) -> Iterator[Dict[str, Any]]:
+        query = self._build_query()
+        # documents with the same timestamp need a tiebreaker for search_after to resume between them.
+        query['sort'] = [{'@timestamp': 'asc'}, {'_shard_doc': 'asc'}]
+        query['pit'] = {'id': pit_id, 'keep_alive': _KEEP_ALIVE}
+        if slices > 1:
+            query['slice'] = {'id': slice_id, 'max': slices}
+
+        # slices are merged in timestamp order, so the first `limit` lines overall are among the first of each slice.
+        remaining = self.limit if self.limit is not None else float('inf')
+        while True:
+            size = min(remaining, self.es_batch_size)
+            # XXX the search type stub does not contain the body argument for some reason so we disable typing here.
+            results = self.client.search(body=query, size=size)  # type: ignore
+            with self._counter_lock:
+                self.page_fetch_counter += 1
+
+            documents = results['hits']['hits']
+            for doc in documents:
+                yield doc
+                remaining -= 1
+                if remaining <= 0:
+                    return
+
+            if len(documents) < size:
+                return
+            query['search_after'] = documents[-1]['sort']
+            query['pit']['id'] = results.get('pit_id', pit_id)
+
     def _indices(self) -> Iterator[str]:
         # FIXME this is a VERY INEFFICIENT fallback
         if self.start_date is None:
@@ -88,6 +201,10 @@ class ElasticSearchSource(LogSource[TimestampedLogLine[ElasticSearchLocation]]):
             filters = query['query']['bool'].setdefault('filter', [])
             filters.append({"term": {"pod_labels.runid.keyword": self.run_id}})  # type: ignore
 
+        if self.filters:
+            filters = query['query']['bool'].setdefault('filter', [])
+            filters.extend(self.filters)  # type: ignore
+
         if 'query' not in query:
             query['query'] = {'match_all': {}}
 
@@ -97,7 +214,7 @@ class ElasticSearchSource(LogSource[TimestampedLogLine[ElasticSearchLocation]]):
         remaining = self.limit if self.limit is not None else float('inf')
         # XXX the search type stub does not contain the body argument for some reason so we disable typing here.
         initial = self.client.search(index=index, body=query, size=min(remaining, self.es_batch_size),
-                                     scroll='2m')  # type: ignore
+                                     scroll=_KEEP_ALIVE)  # type: ignore
         self.page_fetch_counter += 1
         scroll_id = initial['_scroll_id']
         results = initial
@@ -114,18 +231,39 @@ class ElasticSearchSource(LogSource[TimestampedLogLine[ElasticSearchLocation]]):
                     if remaining <= 0:
                         return
 
-                results = self.client.scroll(scroll_id=scroll_id, scroll='2m')
+                results = self.client.scroll(scroll_id=scroll_id, scroll=_KEEP_ALIVE)
                 self.page_fetch_counter += 1
         finally:
             self.client.clear_scroll(scroll_id=scroll_id)
 
+    def _context(self, index: str, pod_name: str, run_id: str) -> ElasticSearchContext:
+        key = (index, pod_name, run_id)
+        context = self._contexts.get(key)
+        if context is None:
+            context = self._contexts[key] = ElasticSearchContext(index=index, pod_name=pod_name, run_id=run_id)
+        return context
+
     def _format_log_line(self, result_number: int, index: str, document: Dict[str, Any]):
         contents = document['_source']
 
         return TimestampedLogLine(
-            location=ElasticSearchLocation(index=index, result_number=result_number,
-                                           run_id=contents['pod_labels']['runid'],
-                                           pod_name=contents['pod_name']),
+            location=ElasticSearchLocation.in_context(
+                self._context(index, contents['pod_name'], contents['pod_labels']['runid']), result_number
+            ),
             timestamp=datetime.fromisoformat(contents['@timestamp']),
             raw=contents['message'],
         )
+
+
+class _Slice(LogSource[TimestampedLogLine[ElasticSearchLocation]]):
+    """The lines of a slice of a point in time, in timestamp order. Lines get numbered once slices are merged."""
+
+    def __init__(self, source: ElasticSearchSource, pit_id: str, slice_id: int, slices: int):
+        self.source = source
+        self.pit_id = pit_id
+        self.slice_id = slice_id
+        self.slices = slices
+
+    def __iter__(self) -> Iterator[TimestampedLogLine[ElasticSearchLocation]]:
+        for document in self.source._run_slice(self.pit_id, self.slice_id, self.slices):
+            yield self.source._format_log_line(0, document['_index'], document)
@@ -1,23 +1,75 @@
+import io
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterator
+from typing import Optional, TextIO, BinaryIO, Iterator
 
-from logtools.log.base import LogSource, RawLogLine, LineNumberLocation
+from logtools.log.base import LineNumberLocation, RawLogLine
+from logtools.log.sources.input.compressed import is_compressed, open_binary_at
 from logtools.log.sources.input.textio_log_source import TextIOLogSource
 
 
-@dataclass
+@dataclass(slots=True)
 class FileLineLocation(LineNumberLocation):
     path: Path
 
 
 class FileLogSource(TextIOLogSource[FileLineLocation]):
-    def __init__(self, path: Path):
-        super().__init__(path.open(encoding='utf-8'))
+    """
+    Reads log lines from a file. Reading can be restricted to the byte range [`start`, `end`), which must be aligned
+    to line boundaries, in which case `first_line_number` should be set to the line number of the line at `start`.
+
+    Files compressed with gzip, bzip2 or xz (as told by their extension) are decompressed on the fly, and byte ranges
+    then refer to their decompressed contents.
+
+    The file is only opened while the source is iterated, so sources can be built for many files without holding any
+    of them open, and each iteration reads the file anew.
+    """
+
+    def __init__(self, path: Path, start: int = 0, end: Optional[int] = None, first_line_number: int = 1):
+        # there is no stream to hand over to TextIOLogSource until the file gets opened.
         self.path = path
+        self.start = start
+        self.end = end
+        self.first_line_number = first_line_number
+        self.lines_read = 0
+
+    def __iter__(self) -> Iterator[RawLogLine[FileLineLocation]]:
+        with _open_range(self.path, self.start, self.end) as source:
+            yield from self._read(source)
 
     def _location(self, line_no: int):
         return FileLineLocation(path=self.path, line_number=line_no)
 
-    def _done(self):
-        self.source.close()
+
+class _ByteRange(io.RawIOBase):
+    """Exposes at most `length` bytes of a binary stream, starting at its current position."""
+
+    def __init__(self, stream: BinaryIO, length: int):
+        self.stream = stream
+        self.remaining = length
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.remaining <= 0:
+            return 0
+        with memoryview(buffer) as view:
+            read = self.stream.readinto(view[:min(len(view), self.remaining)])  # type: ignore
+        self.remaining -= read
+        return read
+
+    def close(self):
+        self.stream.close()
+        super().close()
+
+
+def _open_range(path: Path, start: int, end: Optional[int]) -> TextIO:
+    if start == 0 and end is None and not is_compressed(path):
+        return path.open(encoding='utf-8')
+
+    stream = open_binary_at(path, start)
+    if end is not None:
+        stream = io.BufferedReader(_ByteRange(stream, end - start))  # type: ignore
+
+    return io.TextIOWrapper(stream, encoding='utf-8')
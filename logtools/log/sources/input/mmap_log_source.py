@@ -0,0 +1,96 @@
+import mmap
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from logtools.log.base import LogSource, RawLogLine, TLocation
+from logtools.log.sources.input.compressed import is_compressed
+from logtools.log.sources.input.file_log_source import FileLineLocation, FileLogSource
+
+
+@dataclass(slots=True)
+class MappedLineLocation(FileLineLocation):
+    """A :class:`FileLineLocation` which also records the byte offset at which the line starts in its file."""
+    offset: int
+
+
+class MappedLogLine(RawLogLine[TLocation]):
+    """
+    A :class:`RawLogLine` which holds the undecoded bytes of the line in `data`. The line is decoded into `raw` the
+    first time `raw` is accessed, so lines which get discarded based on their bytes never pay for decoding.
+    """
+
+    __slots__ = ('data', '_raw')
+
+    def __init__(self, location: TLocation, data: bytes):
+        self.location = location
+        self.data = data
+        self._raw: Optional[str] = None
+
+    @property
+    def raw(self) -> str:  # type: ignore[override]
+        if self._raw is None:
+            self._raw = self.data.decode('utf-8', errors='replace')
+        return self._raw
+
+    def __reduce__(self):
+        # the decoded line is not pickled, as it can be decoded again from the data.
+        return MappedLogLine, (self.location, self.data)
+
+
+class MmapLogSource(LogSource[RawLogLine[MappedLineLocation]]):
+    """
+    Reads log lines from a memory-mapped file, as :class:`MappedLogLine` objects holding the bytes of each line.
+    Lines are split by the OS-backed mapping without going through a text decoder, and their locations record the byte
+    offset of each line, so a line can be read back later on by seeking straight to it (e.g. with
+    `FileLogSource(path, start=offset)`).
+
+    As with :class:`FileLogSource`, reading can be restricted to the line-aligned byte range [`start`, `end`), with
+    `first_line_number` being the line number of the line at `start`. Lines are copied out of the mapping, so they
+    remain valid once iteration is over and the file is unmapped.
+    """
+
+    def __init__(self, path: Path, start: int = 0, end: Optional[int] = None, first_line_number: int = 1):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.first_line_number = first_line_number
+        self.lines_read = 0
+
+    def __iter__(self) -> Iterator[MappedLogLine[MappedLineLocation]]:
+        line_number = self.first_line_number
+        try:
+            with self.path.open('rb') as file:
+                size = file.seek(0, 2)
+                end = size if self.end is None else min(self.end, size)
+                # empty files cannot be mapped.
+                if self.start >= end:
+                    return
+
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    mapped.seek(self.start)
+                    offset = self.start
+                    path = self.path
+                    readline = mapped.readline
+                    while offset < end:
+                        data = readline()
+                        yield MappedLogLine(MappedLineLocation(line_number, path, offset), data)
+                        offset += len(data)
+                        line_number += 1
+        finally:
+            self.lines_read = line_number - self.first_line_number
+
+
+def log_file_source(
+        path: Path,
+        start: int = 0,
+        end: Optional[int] = None,
+        first_line_number: int = 1
+) -> Union[MmapLogSource, FileLogSource]:
+    """
+    Returns the cheapest source for reading a log file: an :class:`MmapLogSource` for plain files, or a
+    :class:`FileLogSource` for compressed files, which cannot be mapped.
+    """
+    if is_compressed(path):
+        return FileLogSource(path, start, end, first_line_number)
+    return MmapLogSource(path, start, end, first_line_number)
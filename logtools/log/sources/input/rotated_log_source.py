@@ -0,0 +1,176 @@
+"""
+Sources for logs which get rotated into several files, e.g. `node.log.2`, `node.log.1` and `node.log`, from oldest to
+newest. Optionally compressed files (e.g. `node.log.2.gz`) are rotated files too.
+"""
+import glob
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from logtools.log.base import LogSource, TLogLine
+from logtools.log.sources.input import compressed
+from logtools.log.sources.input.mmap_log_source import log_file_source
+from logtools.log.sources.parse import time_bounds, timestamp_index
+from logtools.log.sources.parse.time_bounds import TimeBoundsCache
+from logtools.log.sources.transform.collating_source import CollatingSource
+
+_ROTATION_NUMBER = re.compile(r'^(?P<base>.+)\.(?P<number>\d+)$')
+
+# files which live next to logs, but are not logs themselves.
+_NOT_LOGS = (compressed.SIDECAR_SUFFIX, timestamp_index.SIDECAR_SUFFIX, '.tmp')
+
+
+@dataclass(frozen=True)
+class RotatedLog:
+    """
+    The files a log was rotated into, from oldest to newest, along with the `name` of the log. Files are `collated`
+    (read one after the other) if they follow each other in time, and must otherwise be merged (see :func:`collatable`).
+    """
+    name: str
+    paths: List[Path]
+    collated: bool = True
+
+
+def _is_log(path: Path) -> bool:
+    return not path.name.startswith('.') and not path.name.endswith(_NOT_LOGS)
+
+
+def expand_log_paths(paths: Iterable[Path]) -> List[Path]:
+    """
+    Expands directories into the log files they contain, and glob patterns (e.g. `'logs/node*.log*'`, quoted so that
+    they are not expanded by the shell) into the log files they match. Index sidecars and caches are left out.
+    """
+    expanded = []
+    for path in paths:
+        if path.is_dir():
+            expanded.extend(sorted(child for child in path.iterdir() if child.is_file() and _is_log(child)))
+        elif not path.exists() and glob.has_magic(str(path)):
+            expanded.extend(sorted(Path(match) for match in glob.glob(str(path)) if _is_log(Path(match))))
+        elif _is_log(path):
+            expanded.append(path)
+    return expanded
+
+
+def _rotation(path: Path) -> Tuple[str, int]:
+    """
+    Returns the name of the log a file was rotated from, and how many rotations ago it was (0 for the current file).
+    """
+    name = path.name
+    if compressed.is_compressed(path):
+        name = name[:-len(path.suffix)]
+
+    match = _ROTATION_NUMBER.match(name)
+    if match is None:
+        return name, 0
+    return match.group('base'), int(match.group('number'))
+
+
+def rotated_logs(paths: Iterable[Path]) -> List[RotatedLog]:
+    """
+    Groups log files by the log (in the same directory) they were rotated from, ordering the files of each log from
+    oldest to newest. Logs are returned in the order in which their first file appears in `paths`.
+    """
+    groups: Dict[Tuple[Path, str], List[Tuple[int, Path]]] = {}
+    for path in paths:
+        base, rotations = _rotation(path)
+        groups.setdefault((path.parent, base), []).append((rotations, path))
+
+    return [
+        RotatedLog(name=base, paths=[path for _, path in sorted(files, key=lambda file: -file[0])])
+        for (_, base), files in groups.items()
+    ]
+
+
+def file_time_bounds(paths: Sequence[Path], cache_bounds: bool = False) -> List[Optional[Tuple[datetime, datetime]]]:
+    """
+    Returns the time bounds of each of `paths` (see :func:`time_bounds.time_bounds`). If `cache_bounds` is set, bounds
+    are kept in a :class:`TimeBoundsCache` in the directory of each file, so that files which were seen before are not
+    opened at all; otherwise nothing gets written next to the files.
+    """
+    if not cache_bounds:
+        return [time_bounds.time_bounds(path) for path in paths]
+
+    caches: Dict[Path, TimeBoundsCache] = {}
+    bounds = []
+    for path in paths:
+        cache = caches.get(path.parent)
+        if cache is None:
+            cache = caches[path.parent] = TimeBoundsCache.for_directory(path.parent)
+        bounds.append(cache.bounds(path))
+
+    for cache in caches.values():
+        try:
+            cache.save()
+        except OSError:
+            pass
+
+    return bounds
+
+
+def overlapping_files(
+        paths: Sequence[Path],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        cache_bounds: bool = False,
+) -> List[Path]:
+    """
+    Leaves out the log files which have no lines in the time range [`start`, `end`], based on the time bounds of each
+    file (see :func:`file_time_bounds`). Files must be time-ordered.
+    """
+    if start is None and end is None:
+        return list(paths)
+
+    overlapping = []
+    for path, bounds in zip(paths, file_time_bounds(paths, cache_bounds)):
+        if bounds is None:
+            continue
+        first, last = bounds
+        if (start is None or last >= start) and (end is None or first <= end):
+            overlapping.append(path)
+
+    return overlapping
+
+
+def collatable(paths: Sequence[Path], cache_bounds: bool = False) -> bool:
+    """
+    Tells whether time-ordered log files follow each other in time without overlapping, so that reading them one after
+    the other yields time-ordered lines. Files without any lines are left out of the comparison.
+    """
+    bounds = [bound for bound in file_time_bounds(paths, cache_bounds) if bound is not None]
+    return all(previous_last <= first for (_, previous_last), (first, _) in zip(bounds, bounds[1:]))
+
+
+class _DeferredSource(LogSource[TLogLine]):
+    """Creates a source only once it gets iterated over, so that collated files are opened one at a time."""
+
+    def __init__(self, factory: Callable[[], LogSource[TLogLine]]):
+        self.factory = factory
+
+    def __iter__(self) -> Iterator[TLogLine]:
+        return iter(self.factory())
+
+
+class RotatedLogSource(CollatingSource[TLogLine]):
+    """
+    Reads the files a log was rotated into one after the other, as a single source. `paths` must be ordered from
+    oldest to newest (see :func:`rotated_logs`), and each file is read by `open_file`, which defaults to reading its
+    raw lines. Each file is only opened once the previous one has been read.
+
+    If given a time range, files which have no lines in that range are skipped (see :func:`overlapping_files`, which
+    caches the time bounds of files if `cache_bounds` is set), but the lines of the remaining files are not filtered.
+    """
+
+    def __init__(
+            self,
+            paths: Sequence[Path],
+            open_file: Callable[[Path], LogSource] = log_file_source,
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None,
+            cache_bounds: bool = False,
+    ):
+        self.paths = overlapping_files(paths, start, end, cache_bounds)
+        super().__init__(*[_DeferredSource(partial(open_file, path)) for path in self.paths])
+
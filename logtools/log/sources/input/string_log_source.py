@@ -6,7 +6,7 @@ from logtools.log.base import LogSource, RawLogLine, LineNumberLocation
 from logtools.log.sources.input.textio_log_source import TextIOLogSource
 
 
-@dataclass
+@dataclass(slots=True)
 class ParseLocation(LineNumberLocation):
     name: str
 
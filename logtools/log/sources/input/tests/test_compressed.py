@@ -0,0 +1,112 @@
+import bz2
+import gzip
+import lzma
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from dateutil import parser
+
+from logtools.log.sources.input.compressed import GzipCheckpoints, open_binary_at
+from logtools.log.sources.input.file_log_source import FileLogSource
+from logtools.log.sources.parallel.chunked_file_source import ChunkedChroniclesSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+from logtools.log.sources.parse.time_bounds import time_bounds, seek_range
+from logtools.log.sources.parse.timestamp_index import TimestampIndex
+
+START = parser.parse('2023-10-16 20:29:24.000+00:00')
+
+LINES = [
+    f'TRC {(START + timedelta(milliseconds=i)).isoformat(sep=" ", timespec="milliseconds")} '
+    f'Advertising block topics="codex discoveryengine" count={i}\n'
+    for i in range(1, 101)
+]
+
+CONTENTS = ''.join(LINES).encode()
+
+
+@pytest.fixture
+def multi_member_gzip(tmp_path) -> Path:
+    """A gzip file made of one member for every ten lines."""
+    path = tmp_path / 'log.log.gz'
+    path.write_bytes(b''.join(gzip.compress(''.join(LINES[i:i + 10]).encode()) for i in range(0, len(LINES), 10)))
+    return path
+
+
+@pytest.mark.parametrize('suffix,compress', [
+    ('.gz', gzip.compress),
+    ('.bz2', bz2.compress),
+    ('.xz', lzma.compress),
+])
+def test_should_read_compressed_files_transparently(tmp_path, suffix, compress):
+    path = tmp_path / f'log.log{suffix}'
+    path.write_bytes(compress(CONTENTS))
+
+    assert [line.raw for line in FileLogSource(path)] == LINES
+    assert [line.location.line_number for line in FileLogSource(path, start=len(LINES[0]), first_line_number=2)] == \
+           list(range(2, 101))
+
+
+def test_should_find_checkpoints_at_member_boundaries(multi_member_gzip):
+    checkpoints = GzipCheckpoints.build(multi_member_gzip, spacing=len(CONTENTS) // 4)
+
+    assert checkpoints.uncompressed_size == len(CONTENTS)
+    assert len(checkpoints.compressed) == 4
+    assert checkpoints.uncompressed[0] == 0
+    assert all(CONTENTS[offset - 1:offset] == b'\n' for offset in checkpoints.uncompressed[1:])
+
+
+def test_should_read_from_an_offset_using_saved_checkpoints(multi_member_gzip):
+    GzipCheckpoints.build(multi_member_gzip, spacing=1).save(GzipCheckpoints.sidecar(multi_member_gzip))
+    offset = len(''.join(LINES[:55]))
+
+    with open_binary_at(multi_member_gzip, offset) as stream:
+        assert stream.read() == CONTENTS[offset:]
+
+
+def test_should_ignore_stale_checkpoints(multi_member_gzip):
+    GzipCheckpoints.build(multi_member_gzip).save(GzipCheckpoints.sidecar(multi_member_gzip))
+    multi_member_gzip.write_bytes(gzip.compress(CONTENTS[:100]))
+
+    assert GzipCheckpoints.cached(multi_member_gzip) is None
+
+
+def test_should_ignore_trailing_garbage_after_members(tmp_path):
+    path = tmp_path / 'log.log.gz'
+    path.write_bytes(gzip.compress(CONTENTS) + b'\0' * 16)
+
+    assert GzipCheckpoints.build(path).uncompressed_size == len(CONTENTS)
+
+
+def test_should_parse_chunks_of_gzip_files_in_parallel(multi_member_gzip):
+    GzipCheckpoints.build(multi_member_gzip, spacing=1).save(GzipCheckpoints.sidecar(multi_member_gzip))
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        lines = list(ChunkedChroniclesSource(multi_member_gzip, executor, chunk_size=1, max_pending=2))
+
+    assert [(line.location.line_number, line.count) for line in lines] == [(n, n) for n in range(1, 101)]
+
+
+def test_should_seek_to_a_time_range_in_gzip_files(multi_member_gzip):
+    assert time_bounds(multi_member_gzip) == (START + timedelta(milliseconds=1), START + timedelta(milliseconds=100))
+
+    start, end = START + timedelta(milliseconds=40), START + timedelta(milliseconds=60)
+    byte_range = seek_range(multi_member_gzip, start, end, 'bisect')
+    lines = ChroniclesRawSource(FileLogSource(multi_member_gzip, byte_range.start, byte_range.end,
+                                              byte_range.first_line_number))
+
+    assert [line.count for line in lines if start <= line.timestamp <= end] == list(range(40, 61))
+
+
+def test_should_index_gzip_files_by_decompressing_them(multi_member_gzip):
+    index = TimestampIndex.build(multi_member_gzip, interval=500)
+    byte_range = index.byte_range(START + timedelta(milliseconds=40), START + timedelta(milliseconds=60))
+    lines = list(ChroniclesRawSource(FileLogSource(multi_member_gzip, byte_range.start, byte_range.end,
+                                                   byte_range.first_line_number)))
+
+    assert len(index.offsets) > 5
+    assert all(CONTENTS[offset - 1:offset] == b'\n' for offset in index.offsets[1:])
+    assert 0 < len(lines) < 100
+    assert all(line.location.line_number == line.count for line in lines)
+    assert {40, 60} <= {line.count for line in lines}
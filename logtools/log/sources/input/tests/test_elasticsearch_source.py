@@ -1,9 +1,11 @@
 from datetime import timedelta
+from types import SimpleNamespace
 
 import pytest
 from dateutil import parser
+from elasticsearch import Elasticsearch
 
-from logtools.log.sources.input.elastic_search_source import ElasticSearchSource
+from logtools.log.sources.input.elastic_search_source import ElasticSearchSource, ElasticSearchLocation
 
 
 @pytest.mark.vcr
@@ -67,3 +69,93 @@ def test_should_respect_fetching_limits_when_limit_larger_than_batch_size():
     lines = list(log)
     assert len(lines) == 10
     assert log.page_fetch_counter == 2
+
+
+def document(pod_name: str, message: str, timestamp: str = '2024-02-08T11:50:30.000Z'):
+    return {'_index': 'index', '_source': {
+        'pod_name': pod_name,
+        'pod_labels': {'runid': '20240208-115030'},
+        '@timestamp': timestamp,
+        'message': message,
+    }}
+
+
+def test_should_share_location_context_across_lines_of_the_same_pod():
+    log = ElasticSearchSource(client=Elasticsearch(hosts='http://localhost:9200'))
+
+    line1 = log._format_log_line(0, 'index', document('codex1', 'line 1'))
+    line2 = log._format_log_line(1, 'index', document('codex1', 'line 2'))
+    line3 = log._format_log_line(2, 'index', document('codex2', 'line 3'))
+
+    assert line1.location.context is line2.location.context
+    assert line1.location.context is not line3.location.context
+
+    assert (line2.location.index, line2.location.pod_name, line2.location.run_id, line2.location.result_number) == \
+           ('index', 'codex1', '20240208-115030', 1)
+
+
+def test_should_build_locations_from_their_fields():
+    location = ElasticSearchLocation(index='index', result_number=1, pod_name='codex1', run_id='20240208-115030')
+
+    assert (location.index, location.pod_name, location.run_id, location.result_number) == \
+           ('index', 'codex1', '20240208-115030', 1)
+    assert location == ElasticSearchSource(client=Elasticsearch(hosts='http://localhost:9200'))._format_log_line(
+        1, 'index', document('codex1', 'line 2')).location
+
+
+class PointInTimeClient:
+    """Serves time-ordered documents from a point in time, slicing them by position, as ElasticSearch would."""
+
+    def __init__(self, documents):
+        self.documents = [dict(doc, sort=[doc['_source']['@timestamp'], i]) for i, doc in enumerate(documents)]
+        self.indices = SimpleNamespace(exists=lambda index: True)
+        self.open = set()
+
+    def open_point_in_time(self, index, keep_alive):
+        self.open.add('pit')
+        return {'id': 'pit'}
+
+    def close_point_in_time(self, id):
+        self.open.remove(id)
+
+    def search(self, body, size):
+        assert body['pit']['id'] in self.open
+        documents = self.documents
+        if 'slice' in body:
+            documents = [doc for doc in documents if doc['sort'][1] % body['slice']['max'] == body['slice']['id']]
+        if 'search_after' in body:
+            documents = [doc for doc in documents if doc['sort'] > body['search_after']]
+        return {'pit_id': 'pit', 'hits': {'hits': documents[:size]}}
+
+
+def timed_documents(count: int):
+    return [document(f'codex{i % 2}', f'line {i}', f'2024-02-08T11:50:{i:02d}.000Z') for i in range(count)]
+
+
+def test_should_merge_slices_fetched_from_a_point_in_time_in_timestamp_order():
+    client = PointInTimeClient(timed_documents(30))
+    log = ElasticSearchSource(client=client, start_date=parser.parse('2024-02-08'),  # type: ignore[arg-type]
+                              end_date=parser.parse('2024-02-08'), es_batch_size=4, slices=3)
+
+    lines = list(log)
+
+    assert [line.raw for line in lines] == [f'line {i}' for i in range(30)]
+    assert [line.location.result_number for line in lines] == list(range(30))
+    assert log.page_fetch_counter == 3 * 3
+    assert not client.open
+
+
+def test_should_respect_fetching_limits_across_slices():
+    client = PointInTimeClient(timed_documents(30))
+    log = ElasticSearchSource(client=client, es_batch_size=4, limit=7, slices=2)  # type: ignore[arg-type]
+
+    assert [line.raw for line in log] == [f'line {i}' for i in range(7)]
+    assert not client.open
+
+
+def test_should_close_point_in_time_when_iteration_stops_early():
+    client = PointInTimeClient(timed_documents(30))
+    for line in ElasticSearchSource(client=client, es_batch_size=4, slices=3):  # type: ignore[arg-type]
+        break
+
+    assert not client.open
@@ -0,0 +1,61 @@
+import pickle
+from pathlib import Path
+
+from logtools.log.sources.input.file_log_source import FileLogSource
+from logtools.log.sources.input.mmap_log_source import MmapLogSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+
+SAMPLE_LOG = Path(__file__).parent / 'sample.log'
+
+
+def test_should_read_the_same_lines_as_file_log_source():
+    assert [line.raw for line in MmapLogSource(SAMPLE_LOG)] == [line.raw for line in FileLogSource(SAMPLE_LOG)]
+    assert [line.count for line in ChroniclesRawSource(MmapLogSource(SAMPLE_LOG))] == list(range(1, 11))
+
+
+def test_should_record_line_numbers_and_byte_offsets():
+    lines = list(MmapLogSource(SAMPLE_LOG))
+    contents = SAMPLE_LOG.read_bytes()
+
+    assert [line.location.line_number for line in lines] == list(range(1, 11))
+    assert lines[0].location.offset == 0
+    for line in lines:
+        assert line.location.path == SAMPLE_LOG
+        assert contents[line.location.offset:].startswith(line.data)
+
+
+def test_should_seek_back_to_a_line_from_its_offset():
+    fourth = list(MmapLogSource(SAMPLE_LOG))[3]
+
+    assert next(iter(FileLogSource(SAMPLE_LOG, start=fourth.location.offset))).raw == fourth.raw
+
+
+def test_should_read_line_aligned_byte_ranges():
+    lines = list(MmapLogSource(SAMPLE_LOG))
+    start, end = lines[2].location.offset, lines[5].location.offset
+
+    source = MmapLogSource(SAMPLE_LOG, start=start, end=end, first_line_number=3)
+
+    assert [(line.location.line_number, line.raw) for line in source] == [
+        (line.location.line_number, line.raw) for line in lines[2:5]]
+    assert source.lines_read == 3
+
+
+def test_should_read_nothing_from_empty_files(tmp_path):
+    empty = tmp_path / 'empty.log'
+    empty.touch()
+
+    source = MmapLogSource(empty)
+
+    assert list(source) == []
+    assert source.lines_read == 0
+
+
+def test_should_pickle_lines_without_their_decoded_text():
+    line = next(iter(MmapLogSource(SAMPLE_LOG)))
+    assert line.raw
+
+    unpickled = pickle.loads(pickle.dumps(line))
+
+    assert unpickled._raw is None
+    assert unpickled == line
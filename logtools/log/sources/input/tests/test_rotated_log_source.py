@@ -0,0 +1,113 @@
+import gzip
+from datetime import timedelta
+from pathlib import Path
+from typing import List
+
+import pytest
+from dateutil import parser
+
+from logtools.log.sources.input.rotated_log_source import RotatedLog, RotatedLogSource, collatable, \
+    expand_log_paths, overlapping_files, rotated_logs
+from logtools.log.sources.parse import time_bounds
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+
+START = parser.parse('2023-10-16 20:29:24.000+00:00')
+
+
+def log_lines(first: int, last: int) -> str:
+    return ''.join(
+        f'TRC {(START + timedelta(seconds=i)).isoformat(sep=" ", timespec="milliseconds")} '
+        f'Advertising block topics="codex discoveryengine" count={i}\n'
+        for i in range(first, last + 1)
+    )
+
+
+@pytest.fixture
+def rotated(tmp_path) -> List[Path]:
+    """A log rotated every ten lines, oldest file first."""
+    files = [tmp_path / 'node.log.2.gz', tmp_path / 'node.log.1', tmp_path / 'node.log']
+    files[0].write_bytes(gzip.compress(log_lines(1, 10).encode()))
+    files[1].write_text(log_lines(11, 20))
+    files[2].write_text(log_lines(21, 30))
+    return files
+
+
+def test_should_group_rotated_files_from_oldest_to_newest(tmp_path):
+    paths = [tmp_path / name for name in ['node.log', 'other.log', 'node.log.1', 'node.log.10.gz', 'node.log.2']]
+
+    assert rotated_logs(paths) == [
+        RotatedLog('node.log', [tmp_path / name for name in ['node.log.10.gz', 'node.log.2', 'node.log.1', 'node.log']]),
+        RotatedLog('other.log', [tmp_path / 'other.log']),
+    ]
+
+
+def test_should_not_group_logs_from_different_directories(tmp_path):
+    assert rotated_logs([tmp_path / 'a' / 'node.log', tmp_path / 'b' / 'node.log']) == [
+        RotatedLog('node.log', [tmp_path / 'a' / 'node.log']),
+        RotatedLog('node.log', [tmp_path / 'b' / 'node.log']),
+    ]
+
+
+def test_should_expand_directories_and_globs_leaving_out_sidecars(rotated, tmp_path):
+    (tmp_path / 'node.log.tsidx').write_bytes(b'')
+    (tmp_path / 'node.log.2.gz.gzidx').write_bytes(b'')
+    (tmp_path / '.logtools-time-bounds.json').write_text('{}')
+
+    assert expand_log_paths([tmp_path]) == sorted(rotated)
+    assert expand_log_paths([tmp_path / 'node.log.*']) == sorted(rotated[:2])
+
+
+def test_should_read_rotated_files_one_after_the_other(rotated):
+    lines = list(ChroniclesRawSource(RotatedLogSource(rotated)))
+
+    assert [line.count for line in lines] == list(range(1, 31))
+    assert [(line.location.path, line.location.line_number) for line in lines[9:11]] == [
+        (rotated[0], 10), (rotated[1], 1)
+    ]
+
+
+def test_should_skip_files_outside_of_the_time_range(rotated):
+    source = RotatedLogSource(rotated, start=START + timedelta(seconds=12), end=START + timedelta(seconds=25))
+
+    assert source.paths == rotated[1:]
+    assert [line.count for line in ChroniclesRawSource(source)] == list(range(11, 31))
+
+
+def test_should_not_open_files_with_cached_time_bounds(rotated, monkeypatch):
+    assert overlapping_files(rotated, end=START + timedelta(seconds=5), cache_bounds=True) == rotated[:1]
+
+    def fail(path):
+        raise AssertionError(f'{path} should not be opened')
+
+    monkeypatch.setattr(time_bounds, 'time_bounds', fail)
+
+    assert overlapping_files(rotated, start=START + timedelta(seconds=20), cache_bounds=True) == rotated[1:]
+
+
+def test_should_not_write_next_to_log_files_unless_caching_time_bounds(rotated, tmp_path):
+    assert overlapping_files(rotated, start=START + timedelta(seconds=20)) == rotated[1:]
+    assert collatable(rotated)
+
+    assert not (tmp_path / time_bounds.TIME_BOUNDS_CACHE).exists()
+
+
+def test_should_update_cached_time_bounds_of_files_which_changed(rotated):
+    assert overlapping_files(rotated, start=START + timedelta(seconds=31), cache_bounds=True) == []
+
+    with rotated[2].open('a') as current:
+        current.write(log_lines(31, 32))
+
+    assert overlapping_files(rotated, start=START + timedelta(seconds=31), cache_bounds=True) == rotated[2:]
+
+
+def test_should_only_collate_files_which_follow_each_other_in_time(rotated, tmp_path):
+    assert collatable(rotated)
+    assert not collatable(list(reversed(rotated)))
+
+    overlapping = tmp_path / 'overlapping.log'
+    overlapping.write_text(log_lines(5, 15))
+    assert not collatable([rotated[0], overlapping])
+
+    empty = tmp_path / 'empty.log'
+    empty.write_text('')
+    assert collatable([rotated[0], empty, rotated[1]])
@@ -6,21 +6,24 @@ TTextIOLineLocation = TypeVar('TTextIOLineLocation', bound=LineNumberLocation)
 
 
 class TextIOLogSource(LogSource[RawLogLine[TTextIOLineLocation]]):
-    def __init__(self, source: TextIO):
+    def __init__(self, source: TextIO, first_line_number: int = 1):
         self.source = source
+        self.first_line_number = first_line_number
+        self.lines_read = 0
 
     def __iter__(self) -> Iterator[RawLogLine[TTextIOLineLocation]]:
+        return self._read(self.source)
+
+    def _read(self, source: TextIO) -> Iterator[RawLogLine[TTextIOLineLocation]]:
+        i = self.first_line_number - 1
         try:
-            for i, raw_string in enumerate(self.source, start=1):
+            for i, raw_string in enumerate(source, start=self.first_line_number):
                 yield RawLogLine(
                     location=self._location(i),
                     raw=raw_string
                 )
         finally:
-            self._done()
+            self.lines_read = i - self.first_line_number + 1
 
     def _location(self, line_no: int):
         return LineNumberLocation(line_number=line_no)
-
-    def _done(self):
-        pass
@@ -0,0 +1,177 @@
+import os
+from collections import deque
+from concurrent.futures import Executor, Future
+from pathlib import Path
+from typing import Iterator, List, Tuple, Optional, Callable, Deque
+
+from logtools.log.base import LogSource
+from logtools.log.sources.input.compressed import is_compressed, is_gzip, GzipCheckpoints, open_binary_at
+from logtools.log.sources.input.file_log_source import FileLineLocation
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesLogLine
+from logtools.log.sources.parse.parse_cache import ParseCache, ParsedColumns
+from logtools.log.sources.parse.timestamp_index import ByteRange
+from logtools.log.sources.pipeline import Pipeline
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+
+ChroniclesPredicate = Callable[[ChroniclesLogLine[FileLineLocation]], bool]
+
+
+def newline_aligned_ranges(
+        path: Path,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        start: int = 0,
+        end: Optional[int] = None,
+) -> Iterator[Tuple[int, Optional[int]]]:
+    """
+    Splits a file, or its line-aligned byte range [`start`, `end`), into byte ranges of roughly `chunk_size` bytes
+    which start and end at line boundaries. Ranges of compressed files refer to their decompressed contents, and can
+    only be split at gzip checkpoints (see :class:`GzipCheckpoints`); other compressed files make up a single range.
+    """
+    if is_compressed(path):
+        yield from _compressed_ranges(path, chunk_size, start, end)
+        return
+
+    with path.open('rb') as stream:
+        size = stream.seek(0, 2)
+        size = size if end is None else min(end, size)
+        while start < size:
+            chunk_end = size
+            if start + chunk_size < size:
+                stream.seek(start + chunk_size)
+                stream.readline()
+                chunk_end = min(stream.tell(), size)
+            yield start, chunk_end
+            start = chunk_end
+
+
+def _compressed_ranges(
+        path: Path,
+        chunk_size: int,
+        start: int,
+        end: Optional[int],
+) -> Iterator[Tuple[int, Optional[int]]]:
+    if not is_gzip(path):
+        yield start, end
+        return
+
+    checkpoints = GzipCheckpoints.for_file(path)
+    size = checkpoints.uncompressed_size if end is None else min(end, checkpoints.uncompressed_size)
+    for checkpoint in checkpoints.uncompressed:
+        if checkpoint - start < chunk_size or checkpoint >= size:
+            continue
+        # checkpoints need not fall on line boundaries, so we move on to the next one.
+        with open_binary_at(path, checkpoint) as stream:
+            chunk_end = min(checkpoint + len(stream.readline()), size)
+        yield start, chunk_end
+        start = chunk_end
+
+    if start < size:
+        yield start, size
+
+
+def parse_chunk(
+        path: Path,
+        start: int,
+        end: Optional[int],
+        predicate: Optional[ChroniclesPredicate] = None,
+        lazy: bool = False,
+        cache: Optional[ParseCache] = None,
+) -> Tuple[int, List[ChroniclesLogLine[FileLineLocation]], Optional[ParsedColumns]]:
+    """
+    Parses and filters the lines in byte range [`start`, `end`) of a Chronicles log file. Returns the number of lines
+    in the range, the lines which passed the filter, numbered as though the range was a file of its own, and the
+    parse of the range if a `cache` is given and has no entry for the file yet (see :class:`ChroniclesRawSource`).
+    """
+    source = Pipeline(path=path, byte_range=ByteRange(start, end), lazy=lazy, cache=cache,
+                      filters=(predicate,) if predicate is not None else ()).fused()
+    lines = list(source)
+    return source.lines_read, lines, source.recorded
+
+
+class ChunkedChroniclesSource(LogSource[ChroniclesLogLine[FileLineLocation]]):
+    """
+    Parses (and optionally filters) a Chronicles log file in parallel. The file is split into newline-aligned byte
+    ranges which get parsed in an :class:`Executor`, typically a :class:`ProcessPoolExecutor` shared by all sources
+    in a pipeline. Lines come back in file order and with their correct line numbers.
+
+    Predicates get sent to the workers and must therefore be picklable. At most `max_pending` chunks are in flight
+    (or waiting to be consumed) at any given time. As with :class:`FileLogSource`, parsing can be restricted to a
+    line-aligned byte range [`start`, `end`) starting at line `first_line_number`.
+
+    If a `cache` is given, chunks are rebuilt from the cached parse of the file when there is one (see
+    :class:`ChroniclesRawSource`). Otherwise, the parse of a whole file gets put together from those of its chunks,
+    and saved once they are all in. Parsing only part of a file which is not cached yet leaves it out of the cache.
+    """
+
+    def __init__(
+            self,
+            path: Path,
+            executor: Executor,
+            predicate: Optional[ChroniclesPredicate] = None,
+            lazy: bool = False,
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+            max_pending: int = 8,
+            start: int = 0,
+            end: Optional[int] = None,
+            first_line_number: int = 1,
+            cache: Optional[ParseCache] = None,
+    ):
+        self.path = path
+        self.lazy = lazy
+        self.executor = executor
+        self.predicate = predicate
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending
+        self.start = start
+        self.end = end
+        self.first_line_number = first_line_number
+        self.cache = cache
+
+    def __iter__(self) -> Iterator[ChroniclesLogLine[FileLineLocation]]:
+        whole = self.start == 0 and self.end is None
+
+        # chunks of a file which is not cached yet come back with their parse.
+        stat = self.path.stat()
+        recorded: List[Optional[ParsedColumns]] = []
+        ranges = newline_aligned_ranges(self.path, self.chunk_size, self.start, self.end)
+        pending: Deque[Future] = deque()
+
+        def submit():
+            byte_range = next(ranges, None)
+            if byte_range is not None:
+                pending.append(self.executor.submit(
+                    parse_chunk, self.path, *byte_range, self.predicate, self.lazy, self.cache))
+
+        for _ in range(self.max_pending):
+            submit()
+
+        lines_before = self.first_line_number - 1
+        try:
+            while pending:
+                lines_read, lines, columns = pending.popleft().result()
+                submit()
+                recorded.append(columns)
+                for line in lines:
+                    line.location.line_number += lines_before
+                    yield line
+                lines_before += lines_read
+        finally:
+            for future in pending:
+                future.cancel()
+
+        # files read in a single chunk got saved by the worker which read them.
+        if self.cache is not None and whole and len(recorded) > 1 and all(chunk is not None for chunk in recorded):
+            self._save(stat, recorded)  # type: ignore[arg-type]
+
+    def _save(self, stat: os.stat_result, recorded: List[ParsedColumns]):
+        assert self.cache is not None
+        current = self.path.stat()
+        if (current.st_size, current.st_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            return
+
+        columns = ParsedColumns()
+        for chunk in recorded:
+            columns.extend(chunk)
+        columns.close(stat.st_size)
+        self.cache.save(self.path, stat.st_size, stat.st_mtime_ns, columns)
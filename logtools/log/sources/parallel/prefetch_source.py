@@ -0,0 +1,137 @@
+import threading
+from dataclasses import dataclass
+from queue import Empty, Queue
+from typing import Iterator, List, Optional, Union
+
+from logtools.log.base import LogSource, TLogLine, DEFAULT_BATCH_SIZE
+from logtools.log.sources.parallel.process_source import DEFAULT_MAX_BATCHES
+
+# How often a reader waiting for room to hand over a batch checks whether it should stop.
+_POLL_INTERVAL = 0.1
+
+# How long the consumer waits for a full batch before taking the lines of a partial batch instead.
+_FLUSH_INTERVAL = 0.05
+
+
+@dataclass
+class _ReaderError:
+    exception: BaseException
+
+
+class _Handover:
+    """
+    Lines handed over from a reader thread to its consumer: full batches get queued up, at most `max_batches` at a
+    time, while lines of the batch being filled are `pending`, and can be taken by the consumer as a partial batch.
+    """
+
+    def __init__(self, max_batches: int):
+        self.batches: Queue = Queue()
+        self.slots = threading.Semaphore(max_batches)
+        self.lock = threading.Lock()
+        self.pending: List = []
+        self.stopped = threading.Event()
+
+    def add(self, line) -> int:
+        """Adds a line to the pending batch, and returns the size of the batch."""
+        with self.lock:
+            self.pending.append(line)
+            return len(self.pending)
+
+    def hand_over(self) -> bool:
+        """Queues up the pending batch once there is room for it, unless the consumer stopped in the meantime."""
+        while not self.slots.acquire(timeout=_POLL_INTERVAL):
+            if self.stopped.is_set():
+                return False
+        with self.lock:
+            if not self.pending:
+                # the consumer took the batch while we waited.
+                self.slots.release()
+                return True
+            self.batches.put(self.pending)
+            self.pending = []
+        return True
+
+    def finish(self, end: Optional[_ReaderError]):
+        """Queues up the pending batch, if any, followed by `end`."""
+        with self.lock:
+            if self.pending:
+                self.batches.put(self.pending)
+                self.pending = []
+            self.batches.put(end)
+
+    def take(self) -> Union[List, _ReaderError, None]:
+        """
+        Returns the next batch. If none gets queued up for a while, the lines pending are returned instead. Batches
+        are queued up under the lock, so that pending lines only get taken once all batches before them are.
+        """
+        while True:
+            try:
+                batch = self.batches.get(timeout=_FLUSH_INTERVAL)
+            except Empty:
+                with self.lock:
+                    if self.pending and self.batches.empty():
+                        batch, self.pending = self.pending, []
+                        return batch
+                continue
+            if isinstance(batch, list):
+                self.slots.release()
+            return batch
+
+
+class PrefetchSource(LogSource[TLogLine]):
+    """
+    Reads a :class:`LogSource` ahead of its consumer, on a background thread. Reading and decompressing files, or
+    waiting on ElasticSearch, release the GIL, so wrapping input sources (e.g. :class:`FileLogSource` or
+    :class:`ElasticSearchSource`) lets their I/O overlap with parsing and printing the lines they already read.
+
+    Lines are handed over in batches of `batch_size`, and at most `max_batches` batches are buffered, which bounds how
+    far ahead the source gets read. Sources which yield lines slowly (e.g. pipes being written to) get their lines
+    handed over in partial batches whenever the consumer has waited a short while for a full one. Exceptions raised
+    while reading are re-raised on iteration, after the lines read before them. If iteration stops early, the thread
+    stops reading at the next line it reads, and closes the source; iteration does not wait for it to do so.
+    """
+
+    def __init__(
+            self,
+            source: LogSource[TLogLine],
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            max_batches: int = DEFAULT_MAX_BATCHES,
+    ):
+        self.source = source
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+
+    def __iter__(self) -> Iterator[TLogLine]:
+        handover = _Handover(self.max_batches)
+        reader = threading.Thread(target=self._read, args=(handover,), daemon=True)
+        reader.start()
+
+        try:
+            while True:
+                batch = handover.take()
+                if batch is None:
+                    break
+                if isinstance(batch, _ReaderError):
+                    raise batch.exception
+                yield from batch
+        finally:
+            # the reader might be waiting on the source, so we leave it to stop on its own.
+            handover.stopped.set()
+
+    def _read(self, handover: _Handover):
+        lines = iter(self.source)
+        try:
+            for line in lines:
+                if handover.stopped.is_set():
+                    return
+                if handover.add(line) >= self.batch_size and not handover.hand_over():
+                    return
+            handover.finish(None)
+        except BaseException as exception:
+            # lines read before the failure are still delivered.
+            handover.finish(_ReaderError(exception))
+        finally:
+            # the source gets closed by the thread which reads it, rather than left to the garbage collector.
+            close = getattr(lines, 'close', None)
+            if close is not None:
+                close()
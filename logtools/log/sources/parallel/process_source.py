@@ -0,0 +1,102 @@
+import multiprocessing
+import pickle
+import traceback
+from dataclasses import dataclass
+from multiprocessing.context import BaseContext
+from queue import Empty
+from typing import Callable, Iterator, Optional, List, Any
+
+from logtools.log.base import LogSource, TLogLine, DEFAULT_BATCH_SIZE
+
+DEFAULT_MAX_BATCHES = 4
+
+# How long to wait for a batch before checking whether the worker is still alive.
+_POLL_INTERVAL = 1.0
+
+
+@dataclass
+class _WorkerError:
+    exception: BaseException
+    formatted: str
+
+
+class ProcessSource(LogSource[TLogLine]):
+    """
+    Runs a :class:`LogSource` in a worker process and streams its lines back in batches. The source is built in the
+    worker by calling `factory`, which must therefore be picklable (e.g. a module-level function, or a
+    :func:`functools.partial` of one).
+
+    Batches are pickled as a unit, so objects shared by their lines (paths, location contexts, timezones) are sent once
+    per batch. At most `max_batches` batches of `batch_size` lines are buffered between the worker and the consumer,
+    which bounds memory use regardless of how far ahead the worker gets. Exceptions raised in the worker are re-raised
+    on iteration, and the worker gets terminated if iteration stops early.
+    """
+
+    def __init__(
+            self,
+            factory: Callable[[], LogSource[TLogLine]],
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            max_batches: int = DEFAULT_MAX_BATCHES,
+            context: Optional[BaseContext] = None,
+    ):
+        self.factory = factory
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.context = context if context is not None else multiprocessing.get_context()
+
+    def __iter__(self) -> Iterator[TLogLine]:
+        queue = self.context.Queue(maxsize=self.max_batches)  # type: ignore[attr-defined]
+        worker = self.context.Process(  # type: ignore[attr-defined]
+            target=_produce, args=(self.factory, queue, self.batch_size), daemon=True)
+        worker.start()
+
+        try:
+            while True:
+                batch = self._next_batch(queue, worker)
+                if batch is None:
+                    break
+                if isinstance(batch, _WorkerError):
+                    raise batch.exception from RuntimeError(f'Worker failed with:\n{batch.formatted}')
+                yield from batch
+            worker.join()
+        finally:
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+            queue.close()
+
+    @staticmethod
+    def _next_batch(queue, worker) -> Any:
+        while True:
+            try:
+                return queue.get(timeout=_POLL_INTERVAL)
+            except Empty:
+                if not worker.is_alive():
+                    # the worker might have flushed its last batches right before exiting.
+                    try:
+                        return queue.get_nowait()
+                    except Empty:
+                        raise RuntimeError(f'Worker exited unexpectedly with code {worker.exitcode}')
+
+
+def _produce(factory: Callable[[], LogSource[TLogLine]], queue, batch_size: int):
+    batch: List[TLogLine] = []
+    try:
+        for line in factory():
+            batch.append(line)
+            if len(batch) == batch_size:
+                queue.put(batch)
+                batch = []
+        if batch:
+            queue.put(batch)
+        queue.put(None)
+    except BaseException as exception:
+        formatted = traceback.format_exc()
+        try:
+            pickle.dumps(exception)
+        except Exception:
+            exception = RuntimeError(repr(exception))
+        # lines produced before the failure are still delivered.
+        if batch:
+            queue.put(batch)
+        queue.put(_WorkerError(exception, formatted))
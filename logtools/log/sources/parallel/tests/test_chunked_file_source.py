@@ -0,0 +1,56 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from dateutil import parser
+
+from logtools.log.sources.input.mmap_log_source import MmapLogSource
+from logtools.log.sources.parallel.chunked_file_source import ChunkedChroniclesSource, newline_aligned_ranges
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+from logtools.log.sources.transform.filtered_source import timestamp_range
+
+SAMPLE_LOG = Path(__file__).parents[2] / 'input' / 'tests' / 'sample.log'
+
+
+def test_should_split_file_into_newline_aligned_ranges():
+    contents = SAMPLE_LOG.read_bytes()
+    ranges = list(newline_aligned_ranges(SAMPLE_LOG, chunk_size=300))
+
+    assert len(ranges) > 1
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len(contents)
+    assert all(previous[1] == current[0] for previous, current in zip(ranges, ranges[1:]))
+    assert all(contents[end - 1:end] == b'\n' for _, end in ranges)
+
+
+def test_should_parse_chunks_in_file_order_with_correct_line_numbers():
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        lines = list(ChunkedChroniclesSource(SAMPLE_LOG, executor, chunk_size=300, max_pending=2))
+
+    expected = list(ChroniclesRawSource(MmapLogSource(SAMPLE_LOG)))
+
+    assert [(line.location, line.count, line.raw) for line in lines] == \
+           [(line.location, line.count, line.raw) for line in expected]
+
+
+def test_should_filter_lines_in_workers():
+    predicate = timestamp_range(parser.parse('2023-10-16 00:00:00.002+00:00'),
+                                parser.parse('2023-10-16 00:00:00.003+00:00'))
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        lines = list(ChunkedChroniclesSource(SAMPLE_LOG, executor, predicate=predicate, chunk_size=300, lazy=True))
+
+    expected = [line for line in ChroniclesRawSource(MmapLogSource(SAMPLE_LOG)) if predicate(line)]
+
+    assert 0 < len(lines) < 10
+    assert [line.location.line_number for line in lines] == [line.location.line_number for line in expected]
+
+
+def test_should_parse_only_the_given_byte_range():
+    lines = list(MmapLogSource(SAMPLE_LOG))
+    start, end = lines[3].location.offset, lines[8].location.offset
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        parsed = list(ChunkedChroniclesSource(SAMPLE_LOG, executor, chunk_size=300, start=start, end=end,
+                                              first_line_number=4))
+
+    assert [(line.location.line_number, line.count) for line in parsed] == [(n, n) for n in range(4, 9)]
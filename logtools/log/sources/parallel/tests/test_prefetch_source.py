@@ -0,0 +1,126 @@
+import gzip
+import threading
+from itertools import count
+from pathlib import Path
+
+import pytest
+
+from logtools.log.base import LogSource, RawLogLine
+from logtools.log.sources.input.file_log_source import FileLogSource
+from logtools.log.sources.parallel.prefetch_source import PrefetchSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+
+SAMPLE_LOG = Path(__file__).parents[2] / 'input' / 'tests' / 'sample.log'
+
+
+class FailingSource(LogSource):
+    def __iter__(self):
+        yield from FileLogSource(SAMPLE_LOG)
+        raise ValueError('something went wrong')
+
+
+class ClosingSource(LogSource):
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        try:
+            yield from FileLogSource(SAMPLE_LOG)
+        finally:
+            self.closed.set()
+
+
+class EndlessSource(LogSource):
+    def __init__(self):
+        self.lines_read = 0
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        try:
+            for line_number in count(1):
+                self.lines_read = line_number
+                yield RawLogLine(location=line_number, raw=f'line {line_number}')
+        finally:
+            self.closed.set()
+
+
+class StallingSource(LogSource):
+    """Yields a single line, and then stalls until released."""
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.resumed = threading.Event()
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        try:
+            yield RawLogLine(location=1, raw='line 1')
+            self.released.wait(timeout=5)
+            self.resumed.set()
+            yield RawLogLine(location=2, raw='line 2')
+        finally:
+            self.closed.set()
+
+
+def test_should_yield_lines_of_the_source_in_order():
+    lines = list(PrefetchSource(FileLogSource(SAMPLE_LOG), batch_size=3, max_batches=1))
+
+    assert [(line.location, line.raw) for line in lines] == \
+           [(line.location, line.raw) for line in FileLogSource(SAMPLE_LOG)]
+
+
+def test_should_prefetch_compressed_files_for_parsing(tmp_path):
+    compressed = tmp_path / 'sample.log.gz'
+    compressed.write_bytes(gzip.compress(SAMPLE_LOG.read_bytes()))
+
+    lines = list(ChroniclesRawSource(PrefetchSource(FileLogSource(compressed), batch_size=4)))
+
+    assert [line.count for line in lines] == list(range(1, 11))
+
+
+def test_should_propagate_exceptions_after_lines_read_before_them():
+    lines = []
+    with pytest.raises(ValueError, match='something went wrong'):
+        for line in PrefetchSource(FailingSource(), batch_size=4):
+            lines.append(line)
+
+    assert len(lines) == 10
+
+
+def test_should_stop_reading_when_iteration_stops_early():
+    source = ClosingSource()
+    for line in PrefetchSource(source, batch_size=1, max_batches=1):
+        break
+
+    assert source.closed.wait(timeout=5)
+
+
+def test_should_stop_reading_at_the_next_line_when_iteration_stops_early():
+    source = EndlessSource()
+    for line in PrefetchSource(source, batch_size=1, max_batches=1):
+        break
+
+    assert source.closed.wait(timeout=5)
+    assert source.lines_read < 10
+
+
+def test_should_hand_over_partial_batches_of_slow_sources():
+    source = StallingSource()
+    lines = iter(PrefetchSource(source, batch_size=1000))
+
+    assert next(lines).raw == 'line 1'
+    # the line got handed over while the source was stalled.
+    assert not source.resumed.is_set()
+
+    source.released.set()
+    assert [line.raw for line in lines] == ['line 2']
+
+
+def test_should_not_wait_for_stalled_sources_when_iteration_stops_early():
+    source = StallingSource()
+    for line in PrefetchSource(source, batch_size=1000):
+        break
+
+    assert not source.resumed.is_set()
+    source.released.set()
+    assert source.closed.wait(timeout=5)
@@ -0,0 +1,43 @@
+from functools import partial
+from pathlib import Path
+
+import pytest
+
+from logtools.log.base import LogSource
+from logtools.log.sources.input.file_log_source import FileLogSource
+from logtools.log.sources.parallel.process_source import ProcessSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+
+SAMPLE_LOG = Path(__file__).parents[2] / 'input' / 'tests' / 'sample.log'
+
+
+def parsed_sample(lazy: bool = False) -> LogSource:
+    return ChroniclesRawSource(FileLogSource(SAMPLE_LOG), lazy=lazy)
+
+
+class FailingSource(LogSource):
+    def __iter__(self):
+        yield from parsed_sample()
+        raise ValueError('something went wrong')
+
+
+def test_should_stream_lines_from_worker_process_in_batches():
+    lines = list(ProcessSource(partial(parsed_sample, lazy=True), batch_size=3, max_batches=1))
+
+    assert [(line.location, line.raw, line.timestamp, line.count) for line in lines] == \
+           [(line.location, line.raw, line.timestamp, line.count) for line in parsed_sample()]
+
+
+def test_should_propagate_worker_exceptions():
+    lines = []
+    with pytest.raises(ValueError, match='something went wrong'):
+        for line in ProcessSource(FailingSource, batch_size=4):
+            lines.append(line)
+
+    assert len(lines) == 10
+
+
+def test_should_stop_worker_when_iteration_stops_early():
+    iterator = iter(ProcessSource(parsed_sample, batch_size=1, max_batches=1))
+    assert next(iterator).count == 1
+    iterator.close()
@@ -0,0 +1,73 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+from dateutil import parser
+
+from logtools.log.sources.parallel.windowed_merge_source import WindowedMergeSource, time_windows, window_count
+
+LOG1 = """TRC 2023-10-16 20:29:24.594+00:00 Advertising block    topics="codex discoveryengine" count=1
+TRC 2023-10-16 20:29:24.597+00:00 Provided to nodes           topics="codex discovery" tid=1 count=2
+TRC 2023-10-16 20:29:24.597+00:00 Advertised block            topics="codex discoveryengine" count=3
+TRC 2023-10-16 20:29:24.646+00:00 Retrieved record from repo  topics="codex repostore" count=4
+TRC 2023-10-16 20:29:24.647+00:00 Providing block             topics="codex discovery" count=5
+"""
+
+LOG2 = """TRC 2023-10-16 20:29:24.595+00:00 Advertising block    topics="codex discoveryengine" count=6
+TRC 2023-10-16 20:29:24.596+00:00 Provided to nodes           topics="codex discovery" tid=1 count=7
+TRC 2023-10-16 20:29:24.596+00:00 Advertised block            topics="codex discoveryengine" count=8
+TRC 2023-10-16 20:29:24.645+00:00 Retrieved record from repo  topics="codex repostore" count=9
+TRC 2023-10-16 20:29:24.649+00:00 Providing block             topics="codex discovery" count=10
+"""
+
+
+@pytest.fixture
+def logs(tmp_path):
+    log1, log2 = tmp_path / 'log1.log', tmp_path / 'log2.log'
+    log1.write_text(LOG1)
+    log2.write_text(LOG2)
+    return [log1, log2]
+
+
+def test_should_split_time_range_into_contiguous_windows():
+    start, end = parser.parse('2023-10-16 00:00:00+00:00'), parser.parse('2023-10-16 00:00:03+00:00')
+    windows = time_windows(start, end, count=3)
+
+    assert windows == [
+        (start, parser.parse('2023-10-16 00:00:01+00:00')),
+        (parser.parse('2023-10-16 00:00:01+00:00'), parser.parse('2023-10-16 00:00:02+00:00')),
+        (parser.parse('2023-10-16 00:00:02+00:00'), end),
+    ]
+
+
+@pytest.mark.parametrize('windows', [1, 3, 50])
+def test_should_merge_logs_by_timestamp_across_windows(logs, windows):
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        merged = WindowedMergeSource(logs, executor, windows=windows)
+        assert [line.count for line in merged] == [1, 6, 7, 8, 2, 3, 9, 4, 5, 10]
+
+
+def test_should_merge_only_requested_time_range(logs):
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        merged = WindowedMergeSource(logs, executor, windows=4,
+                                     start=parser.parse('2023-10-16 20:29:24.596+00:00'),
+                                     end=parser.parse('2023-10-16 20:29:24.646+00:00'))
+        assert [(line.location.path.name, line.location.line_number) for line in merged] == [
+            ('log2.log', 2), ('log2.log', 3), ('log1.log', 2), ('log1.log', 3), ('log2.log', 4), ('log1.log', 4)
+        ]
+
+
+def test_should_split_logs_into_windows_of_bounded_size(logs):
+    start, end = parser.parse('2023-10-16 20:29:24.594+00:00'), parser.parse('2023-10-16 20:29:24.649+00:00')
+    size = sum(log.stat().st_size for log in logs)
+
+    assert window_count(logs, start, end, window_size=size) == 1
+    assert window_count(logs, start, end, window_size=size // 10) == 11
+    # only the part of each log which falls in the time range counts.
+    assert window_count(logs, start, start + (end - start) / 2, window_size=size // 10) == 6
+
+
+def test_should_derive_window_count_from_window_size(logs):
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        merged = WindowedMergeSource(logs, executor, window_size=100, seek='bisect')
+        assert [line.count for line in merged] == [1, 6, 7, 8, 2, 3, 9, 4, 5, 10]
@@ -0,0 +1,185 @@
+import math
+from collections import deque
+from concurrent.futures import Executor, Future
+from datetime import datetime
+from pathlib import Path
+from typing import Sequence, Optional, List, Tuple, Iterator, Deque, TypeVar
+
+from logtools.log.base import LogSource, TimestampedLogLine
+from logtools.log.sources.input.file_log_source import FileLineLocation
+from logtools.log.sources.input.mmap_log_source import log_file_source
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource, ChroniclesLogLine
+from logtools.log.sources.parse.parse_cache import ParseCache
+from logtools.log.sources.parse.time_bounds import time_bounds, seek_range
+from logtools.log.sources.parse.timestamp_index import TimestampIndex, ByteRange
+from logtools.log.sources.transform.merged_source import MergedSource
+
+TTimestampedLogLine = TypeVar('TTimestampedLogLine', bound=TimestampedLogLine)
+
+DEFAULT_WINDOW_SIZE = 32 * 1024 * 1024
+
+
+def window_count(paths: Sequence[Path], start: datetime, end: datetime, window_size: int) -> int:
+    """
+    Returns how many windows [`start`, `end`] must be split into for each of them to hold about `window_size` bytes of
+    `paths`, estimating the bytes of each file in that range from its size as if its lines were spread evenly over time.
+    """
+    total = 0.0
+    for path in paths:
+        bounds = time_bounds(path)
+        if bounds is None:
+            continue
+        first, last = bounds
+        overlap = (min(end, last) - max(start, first)).total_seconds()
+        if overlap < 0:
+            continue
+        duration = (last - first).total_seconds()
+        total += path.stat().st_size * (overlap / duration if duration > 0 else 1)
+    return max(1, math.ceil(total / window_size))
+
+
+def time_windows(start: datetime, end: datetime, count: int) -> List[Tuple[datetime, datetime]]:
+    """Splits [`start`, `end`] into `count` windows of equal duration."""
+    if start == end:
+        return [(start, end)]
+
+    step = (end - start) / count
+    bounds = [start + step * i for i in range(count)] + [end]
+    return list(zip(bounds, bounds[1:]))
+
+
+class _TimeWindow(LogSource[TTimestampedLogLine]):
+    """
+    Restricts a time-ordered source to the window [`start`, `end`), or [`start`, `end`] if `closed`. Reading stops as
+    soon as the source goes past the end of the window.
+    """
+
+    def __init__(self, source: LogSource[TTimestampedLogLine], start: datetime, end: datetime,
+                 closed: bool):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.closed = closed
+
+    def __iter__(self) -> Iterator[TTimestampedLogLine]:
+        for line in self.source:
+            if line.timestamp < self.start:
+                continue
+            if line.timestamp > self.end or (line.timestamp == self.end and not self.closed):
+                return
+            yield line
+
+
+def merge_window(
+        paths: Sequence[Path],
+        start: datetime,
+        end: datetime,
+        closed: bool,
+        lazy: bool = True,
+        ranges: Optional[Sequence[ByteRange]] = None,
+        bisect: bool = False,
+        cache: Optional[ParseCache] = None,
+) -> List[TimestampedLogLine[FileLineLocation]]:
+    """
+    Merges the lines of all `paths` which fall in the window [`start`, `end`) (or [`start`, `end`] if `closed`). If
+    given, `ranges` restrict the part of each file which gets read. Otherwise, if `bisect` is set, each file is
+    restricted to the window by binary search. Files are rebuilt from their cached parse, if a `cache` has one.
+    """
+    if ranges is None and bisect:
+        ranges = [seek_range(path, start, end, 'bisect') for path in paths]
+
+    parts: List[LogSource] = [
+        _TimeWindow(ChroniclesRawSource(log_file_source(path) if ranges is None else log_file_source(
+            path, ranges[i].start, ranges[i].end, ranges[i].first_line_number), lazy=lazy, cache=cache), start, end,
+            closed)
+        for i, path in enumerate(paths)
+    ]
+    return list(MergedSource(*parts))
+
+
+class WindowedMergeSource(LogSource[ChroniclesLogLine[FileLineLocation]]):
+    """
+    Merges time-ordered Chronicles log files in parallel by splitting the time range to merge into disjoint windows.
+    Each window is merged across all files independently in an :class:`Executor`, and windows are then concatenated in
+    order, so merge throughput scales with the number of workers instead of being bound by a single central heap.
+
+    If either end of the time range is not given, it is discovered from the first and last lines of the files. Unless
+    a number of `windows` is given, the range gets split into windows holding about `window_size` bytes of logs each
+    (see :func:`window_count`), and into at least `min_windows`. At most `max_pending` merged windows are in flight (or
+    waiting to be consumed) at any given time, so memory use is bounded by a few windows whatever the size of the logs.
+
+    Windows can `seek` straight to their part of each file, either by binary search over the files (`'bisect'`), or by
+    using a :class:`TimestampIndex` for each file (`'index'`). Without seeking, every window reads through the files
+    from their beginning, which costs as many passes over the logs as there are windows. If a `cache` is given,
+    windows are rebuilt from the cached parse of files which have one (e.g. from an earlier run reading them whole).
+    """
+
+    def __init__(
+            self,
+            paths: Sequence[Path],
+            executor: Executor,
+            windows: Optional[int] = None,
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None,
+            lazy: bool = True,
+            max_pending: int = 8,
+            seek: Optional[str] = None,
+            cache: Optional[ParseCache] = None,
+            window_size: int = DEFAULT_WINDOW_SIZE,
+            min_windows: int = 1,
+    ):
+        self.paths = paths
+        self.executor = executor
+        self.windows = windows
+        self.window_size = window_size
+        self.min_windows = min_windows
+        self.start = start
+        self.end = end
+        self.lazy = lazy
+        self.max_pending = max_pending
+        self.seek = seek
+        self.cache = cache
+
+    def __iter__(self) -> Iterator[ChroniclesLogLine[FileLineLocation]]:
+        span = self._time_span()
+        if span is None:
+            return
+
+        indexes = [TimestampIndex.for_file(path) for path in self.paths] if self.seek == 'index' else None
+        count = self.windows if self.windows is not None else max(
+            self.min_windows, window_count(self.paths, *span, window_size=self.window_size))
+        windows = time_windows(*span, count=count)
+        remaining = iter(enumerate(windows))
+        pending: Deque[Future] = deque()
+
+        def submit():
+            window = next(remaining, None)
+            if window is not None:
+                i, (start, end) = window
+                ranges = [index.byte_range(start, end) for index in indexes] if indexes is not None else None
+                pending.append(self.executor.submit(
+                    merge_window, self.paths, start, end, i == len(windows) - 1, self.lazy, ranges,
+                    self.seek == 'bisect', self.cache))
+
+        for _ in range(self.max_pending):
+            submit()
+
+        try:
+            while pending:
+                lines = pending.popleft().result()
+                submit()
+                yield from lines
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _time_span(self) -> Optional[Tuple[datetime, datetime]]:
+        start, end = self.start, self.end
+        if start is None or end is None:
+            bounds = [bound for bound in (time_bounds(path) for path in self.paths) if bound is not None]
+            if not bounds:
+                return None
+            start = start if start is not None else min(first for first, _ in bounds)
+            end = end if end is not None else max(last for _, last in bounds)
+
+        return (start, end) if start <= end else None
@@ -1,22 +1,45 @@
+import mmap
 import re
 import sys
-from dataclasses import dataclass
-from datetime import datetime
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone, tzinfo
 from enum import Enum
-from typing import Iterator, Optional
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Dict, Tuple, Collection
 
 from dateutil import parser
 
 from logtools.log.base import LogSource, TLocation, RawLogLine, TimestampedLogLine
+from logtools.log.interning import StringInterner
+from logtools.log.sources.input.compressed import is_compressed
+from logtools.log.sources.input.mmap_log_source import MappedLogLine, MappedLineLocation, MmapLogSource
+from logtools.log.sources.parse.parse_cache import ParseCache, ParsedColumns
+from logtools.log.sources.parse.topics import bytes_end_with_topics, ends_with_topics, find_topics, iter_topics, \
+    split_topics, topics_start
 
 _LOG_LINE = re.compile(
     r'(?P<line_type>\w{3}) (?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}.\d{3}[+-]\d{2}:\d{2}) (?P<message>.*) '
     r'count=(?P<count>\d+)$'
 )
 
-_TOPICS = re.compile(r'((\w+=("[^"]+"|\S+) )+)?\w+=("(\\"|[^"])+"|\S+)$')
+# The same expression, for lines which have not been decoded. Offsets within a match are then byte offsets.
+_LOG_LINE_BYTES = re.compile(_LOG_LINE.pattern.encode())
 
-_TOPICS_KV = re.compile(r'(?P<key>\w+)=(?P<value>"(?:\\"|[^"])+"|\S+)')
+# Offset of the message within a match of _LOG_LINE: a three-letter level, a 29-character timestamp, and two spaces.
+_MESSAGE_OFFSET = 34
+
+# Chronicles logs carry a handful of distinct offsets at most, so we share one tzinfo instance per offset instead of
+# having every parsed timestamp carry its own.
+_TIMEZONES: Dict[str, tzinfo] = {'+00:00': timezone.utc}
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+# Topic keys come from logging statements in the source code, so there are few of them and they repeat on nearly every
+# line. They are always interned.
+_TOPIC_KEYS = StringInterner()
 
 
 class LogLevel(Enum):
@@ -28,7 +51,13 @@ class LogLevel(Enum):
     note = 'NOT'
 
 
-@dataclass
+# Levels from least to most severe.
+LEVEL_ORDER = (LogLevel.trace, LogLevel.debug, LogLevel.info, LogLevel.note, LogLevel.warning, LogLevel.error)
+
+_LEVEL_CODES = {level.value.encode(): code for code, level in enumerate(LEVEL_ORDER)}
+
+
+@dataclass(slots=True)
 class ChroniclesLogLine(TimestampedLogLine[TLocation]):
     """
     A :class:`ChroniclesLogLine` is a log line coming from [Chronicles](https://github.com/status-im/nim-chronicles).
@@ -38,44 +67,445 @@ class ChroniclesLogLine(TimestampedLogLine[TLocation]):
     message: str
     topics: str
     count: Optional[int]
+    _fields: Optional[Dict[str, str]] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def fields(self) -> Dict[str, str]:
+        """The topics of this line as a dictionary. Topics are parsed on first access only."""
+        if self._fields is None:
+            self._fields = {_TOPIC_KEYS(key): value for key, value in iter_topics(self.topics)}
+        return self._fields
+
+    def extract_fields(self, keys: Collection[str]) -> Dict[str, str]:
+        """
+        Extracts only the topics in `keys`, stopping as soon as all of them have been found. Keys which are not
+        present in the line are absent from the result. Should a key be repeated, the last occurrence is returned, as
+        it is by :attr:`fields`.
+        """
+        if self._fields is not None:
+            return {key: self._fields[key] for key in keys if key in self._fields}
+
+        return find_topics(self.topics, keys)
+
+
+class LazyChroniclesLogLine(ChroniclesLogLine[TLocation]):
+    """
+    A :class:`ChroniclesLogLine` which decodes only its timestamp up front. The level, message, topics and count are
+    decoded from the raw line the first time any of them is accessed, so pipelines which only need timestamps (e.g.
+    merging) never pay for them.
+    """
+
+    __slots__ = ('_offset', '_message_end', '_end', '_decoded')
+
+    def __init__(self, location: TLocation, raw: str, timestamp: datetime, offset: int, message_end: int, end: int):
+        self.location = location
+        self.raw = raw
+        self.timestamp = timestamp
+        self._offset = offset
+        self._message_end = message_end
+        self._end = end
+        self._fields = None
+        self._decoded: Optional[Tuple[LogLevel, str, str, Optional[int]]] = None
+
+    @property
+    def level(self) -> LogLevel:  # type: ignore[override]
+        return self._decode()[0]
+
+    @property
+    def message(self) -> str:  # type: ignore[override]
+        return self._decode()[1]
+
+    @property
+    def topics(self) -> str:  # type: ignore[override]
+        return self._decode()[2]
+
+    @property
+    def count(self) -> Optional[int]:  # type: ignore[override]
+        return self._decode()[3]
+
+    def _decode(self) -> Tuple[LogLevel, str, str, Optional[int]]:
+        if self._decoded is None:
+            body = self._text(self._offset + _MESSAGE_OFFSET, self._message_end)
+            message, topics = split_topics(body) or (body.strip(), '')
+            # the count group starts right after ' count='
+            count = self._text(self._message_end + 7, self._end)
+            self._decoded = (
+                LogLevel(self._text(self._offset, self._offset + 3).upper()),
+                message,
+                topics,
+                int(count) if count else None,
+            )
+
+        return self._decoded
+
+    def _text(self, start: int, end: int) -> str:
+        return self.raw[start:end]
+
+    def __reduce__(self):
+        # the state of slotted dataclasses only covers their fields, so we need to pickle our own state explicitly.
+        return LazyChroniclesLogLine, (self.location, self.raw, self.timestamp, self._offset, self._message_end,
+                                       self._end)
+
+
+class BytesChroniclesLogLine(LazyChroniclesLogLine[TLocation]):
+    """
+    A :class:`LazyChroniclesLogLine` parsed from the undecoded bytes of a line (see :class:`MappedLogLine`). Only the
+    parts of the line which get accessed are decoded, and the line itself is decoded into `raw` on first access only,
+    so consumers which pass lines through unchanged can write out `data` as it is.
+    """
+
+    __slots__ = ('data', '_raw')
+
+    def __init__(self, location: TLocation, data: bytes, timestamp: datetime, offset: int, message_end: int,
+                 end: int):
+        self.location = location
+        self.data = data
+        self.timestamp = timestamp
+        self._offset = offset
+        self._message_end = message_end
+        self._end = end
+        self._fields = None
+        self._decoded = None
+        self._raw: Optional[str] = None
 
     @property
-    def fields(self):
-        fields = _TOPICS_KV.findall(self.topics)
-        return {key: value for key, value in fields} if fields else {}
+    def raw(self) -> str:  # type: ignore[override]
+        if self._raw is None:
+            self._raw = self.data.decode('utf-8', errors='replace')
+        return self._raw
+
+    def _text(self, start: int, end: int) -> str:
+        return self.data[start:end].decode('utf-8', errors='replace')
+
+    def __reduce__(self):
+        return BytesChroniclesLogLine, (self.location, self.data, self.timestamp, self._offset, self._message_end,
+                                        self._end)
+
+
+def parse_timestamp(timestamp: str) -> datetime:
+    """
+    Parses a timestamp in the layout used by Chronicles (`YYYY-MM-DD HH:MM:SS.mmm+HH:MM`). This is much cheaper than
+    :func:`dateutil.parser.parse`, to which we fall back only if the timestamp does not conform to the expected layout.
+    """
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return parser.parse(timestamp)
+
+    offset = timestamp[-6:]
+    if parsed.tzinfo is None or offset[0] not in '+-':
+        return parsed
+
+    shared = _TIMEZONES.get(offset)
+    if shared is None:
+        shared = _TIMEZONES[offset] = parsed.tzinfo
+
+    return parsed if parsed.tzinfo is shared else parsed.replace(tzinfo=shared)
+
+
+def _timezone(utc_offset: int) -> tzinfo:
+    """Returns the shared tzinfo instance for an offset in minutes."""
+    hours, minutes = divmod(abs(utc_offset), 60)
+    offset = f'{"-" if utc_offset < 0 else "+"}{hours:02}:{minutes:02}'
+    shared = _TIMEZONES.get(offset)
+    if shared is None:
+        shared = _TIMEZONES[offset] = timezone(timedelta(minutes=utc_offset))
+    return shared
+
+
+def _cached_range(stream: LogSource) -> Optional[MmapLogSource]:
+    """
+    Returns a source mapping the byte range `stream` reads from a log file, if it reads one (as :class:`MmapLogSource`
+    and :class:`FileLogSource` do) and the parse of that file can be cached, that is, if it is not compressed.
+    """
+    if isinstance(stream, MmapLogSource):
+        return stream
+    path = getattr(stream, 'path', None)
+    if path is None or is_compressed(path):
+        return None
+    return MmapLogSource(path, stream.start, stream.end, stream.first_line_number)  # type: ignore[attr-defined]
+
+
+def line_timestamp(raw: str) -> Optional[datetime]:
+    """Returns the timestamp of a raw Chronicles log line, or `None` if the line cannot be parsed."""
+    parsed = _LOG_LINE.search(raw)
+    return parse_timestamp(parsed['timestamp']) if parsed else None
 
 
 class ChroniclesRawSource(LogSource[ChroniclesLogLine[TLocation]]):
-    """Parses a Chronicles log from raw text. Other variants could parse from JSON or CSV."""
+    """
+    Parses a Chronicles log from raw text. Other variants could parse from JSON or CSV.
+
+    If `lazy` is set, the source yields :class:`LazyChroniclesLogLine` instances which only parse their timestamps
+    up front. Lazy parsing of :class:`MappedLogLine` inputs runs on their bytes, and yields
+    :class:`BytesChroniclesLogLine` instances which are never decoded as a whole unless their `raw` text is accessed.
+
+    If an `interner` is given, messages of (eager) lines are interned through it. This is worth it when lines are
+    retained in memory, as Chronicles logs repeat the same handful of messages over and over.
+
+    If a `prefilter` is given, raw lines which it rejects are dropped without being parsed (see
+    :func:`logtools.log.sources.transform.filtered_source.raw_prefilter`). Prefilters are only meant to save work:
+    lines which get through still need to be filtered after parsing.
+
+    If a `cache` is given, inputs reading from a log file which is not compressed (:class:`MmapLogSource` and
+    :class:`FileLogSource`) are parsed once and for all: lines get rebuilt from the cached parse of their file if
+    there is one, while reading a whole file which is not cached yet saves its parse to the cache. Reading part of a
+    file which is not cached yet leaves the parse of that part in `recorded` once iteration is over, so that parts read
+    separately (e.g. by :class:`ChunkedChroniclesSource`) can be put together and saved. Lines rebuilt from the cache
+    are the same as parsed lines. Compressed files, and other inputs, are always parsed.
+
+    Lines whose message does not end with topics are unparseable, and get skipped whether they are parsed eagerly or
+    lazily.
+    """
 
-    def __init__(self, stream: LogSource[RawLogLine[TLocation]]):
+    def __init__(
+            self,
+            stream: LogSource[RawLogLine[TLocation]],
+            lazy: bool = False,
+            interner: Optional[StringInterner] = None,
+            prefilter: Optional[Callable[[RawLogLine[TLocation]], bool]] = None,
+            cache: Optional[ParseCache] = None,
+    ):
         self.stream = stream
+        self.lazy = lazy
+        self.interner = interner
+        self.prefilter = prefilter
+        self.cache = cache
+        self.recorded: Optional[ParsedColumns] = None
 
     def __iter__(self) -> Iterator[ChroniclesLogLine[TLocation]]:
+        mapped = _cached_range(self.stream) if self.cache is not None else None
+        if mapped is None or self.cache is None:
+            yield from self._iter_parsed()
+            return
+
+        try:
+            yield from self._iter_cached(mapped, self.cache)  # type: ignore[misc]
+        finally:
+            if mapped is not self.stream:
+                self.stream.lines_read = mapped.lines_read  # type: ignore[attr-defined]
+
+    def _iter_parsed(self) -> Iterator[ChroniclesLogLine[TLocation]]:
+        parse = line_parser(self.lazy, self.interner)
+        prefilter = self.prefilter
         for line in self.stream:
-            parsed = self._parse_raw(line)
+            if prefilter is not None and not prefilter(line):
+                continue
+            parsed = parse(line)
             if not parsed:
                 print(f'Skip unparseable line: {line}', file=sys.stderr)
                 continue
             parsed.location = line.location
             yield parsed
 
+    def _iter_cached(
+            self,
+            stream: MmapLogSource,
+            cache: ParseCache,
+    ) -> Iterator[ChroniclesLogLine[MappedLineLocation]]:
+        with cache.open(stream.path) as columns:
+            if columns is not None:
+                yield from self._replay(stream, columns)
+                return
+
+        yield from self._record(stream, cache)
+
+    def _replay(self, stream: MmapLogSource, columns: ParsedColumns) -> Iterator[ChroniclesLogLine[MappedLineLocation]]:
+        """Rebuilds the lines in the byte range of `stream` from the cached parse of its file."""
+        starts = columns.starts
+        count = len(columns)
+        first = bisect_left(starts, stream.start, 0, count)
+        last = count if stream.end is None else bisect_left(starts, stream.end, first, count)
+        line_number = stream.first_line_number
+        try:
+            # empty files cannot be mapped.
+            if first == last:
+                return
+            with stream.path.open('rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                path = stream.path
+                prefilter: Optional[Callable] = self.prefilter
+                rows = zip(*(column[first:last] for column in (
+                    starts, columns.timestamps, columns.utc_offsets, columns.levels, columns.offsets,
+                    columns.message_ends, columns.count_ends, columns.topics_starts)), starts[first + 1:last + 1])
+                for start, timestamp, utc_offset, level, offset, message_end, end, topics, next_start in rows:
+                    location = MappedLineLocation(line_number, path, start)
+                    data = mapped[start:next_start]
+                    line_number += 1
+                    if prefilter is not None and not prefilter(MappedLogLine(location, data)):
+                        continue
+                    line = self._cached_line(location, data, timestamp, utc_offset, level, offset, message_end, end,
+                                             topics)
+                    if not line:
+                        print(f'Skip unparseable line: {MappedLogLine(location, data)}', file=sys.stderr)
+                        continue
+                    yield line
+        finally:
+            stream.lines_read = line_number - stream.first_line_number
+
+    def _record(self, stream: MmapLogSource, cache: ParseCache) -> Iterator[ChroniclesLogLine[MappedLineLocation]]:
+        """
+        Parses the byte range of `stream`, recording its parse. Whole files get their parse saved to the cache once
+        read, while the parse of other ranges is left in `recorded`, unless the file changed in the meantime.
+        """
+        self.recorded = None
+        stat = stream.path.stat()
+        columns: Optional[ParsedColumns] = ParsedColumns()
+        parse: Callable = line_parser(self.lazy, self.interner)
+        prefilter: Optional[Callable] = self.prefilter
+        end = stream.start
+        for raw in stream:
+            end = raw.location.offset + len(raw.data)
+            if columns is not None and not self._record_line(raw, columns):
+                # lines with unknown levels only fail once their level gets decoded, which cached lines cannot do.
+                columns = None
+            if prefilter is not None and not prefilter(raw):
+                continue
+            line = self._cached_line(raw.location, raw.data, *columns.row(len(columns) - 1)) if columns is not None \
+                else parse(raw)
+            if not line:
+                print(f'Skip unparseable line: {raw}', file=sys.stderr)
+                continue
+            yield line
+
+        current = stream.path.stat()
+        if columns is None or (current.st_size, current.st_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            return
+
+        # only whole files get cached, as the lines of a file can only be numbered from its start.
+        if stream.start == 0 and end == stat.st_size:
+            columns.close(end)
+            cache.save(stream.path, stat.st_size, stat.st_mtime_ns, columns)
+        else:
+            self.recorded = columns
+
     @staticmethod
-    def _parse_raw(line: RawLogLine[TLocation]) -> Optional[ChroniclesLogLine[TLocation]]:
-        parsed = _LOG_LINE.search(line.raw)
+    def _record_line(line: MappedLogLine[MappedLineLocation], columns: ParsedColumns) -> bool:
+        """Appends the parse of a line to `columns`, unless the line has an unknown level."""
+        parsed = _LOG_LINE_BYTES.search(line.data)
         if not parsed:
-            return None
+            columns.append(line.location.offset)
+            return True
+
+        level = _LEVEL_CODES.get(parsed['line_type'].upper())
+        timestamp = parse_timestamp(parsed['timestamp'].decode('ascii'))
+        utc_offset = timestamp.utcoffset()
+        if level is None or utc_offset is None:
+            return False
+
+        body = line.data[parsed.start() + _MESSAGE_OFFSET:parsed.end('message')].decode('utf-8', errors='replace')
+        columns.append(line.location.offset, (timestamp - _EPOCH) // _MICROSECOND, utc_offset // timedelta(minutes=1),
+                       level, parsed.start(), parsed.end('message'), parsed.end(), topics_start(body))
+        return True
 
-        topics = _TOPICS.search(parsed['message'])
-        if not topics:
+    def _cached_line(
+            self,
+            location: MappedLineLocation,
+            data: bytes,
+            timestamp: int,
+            utc_offset: int,
+            level: int,
+            offset: int,
+            message_end: int,
+            end: int,
+            topics: int,
+    ) -> Optional[ChroniclesLogLine[MappedLineLocation]]:
+        """Rebuilds a line from its bytes and their cached parse, or returns `None` if the line is unparseable."""
+        if level < 0 or topics < 0:
             return None
 
+        parsed_timestamp = _EPOCH + timedelta(0, 0, timestamp)
+        if utc_offset:
+            parsed_timestamp = parsed_timestamp.astimezone(_timezone(utc_offset))
+        if self.lazy:
+            return BytesChroniclesLogLine(location, data, parsed_timestamp, offset, message_end, end)
+
+        body = data[offset + _MESSAGE_OFFSET:message_end].decode('utf-8', errors='replace')
+        message = body[:topics].strip()
+        if self.interner is not None:
+            message = self.interner(message)
+        count = data[message_end + 7:end]
         return ChroniclesLogLine(
-            location=line.location,
-            raw=line.raw,
-            level=LogLevel(parsed['line_type'].upper()),
-            timestamp=parser.parse(parsed['timestamp']),
-            message=parsed['message'][:topics.start() - 1].strip(),
-            count=int(parsed['count']) if parsed['count'] else None,
-            topics=topics.group()
+            location=location,
+            raw=data.decode('utf-8', errors='replace'),
+            level=LEVEL_ORDER[level],
+            timestamp=parsed_timestamp,
+            message=message,
+            count=int(count) if count else None,
+            topics=body[topics:],
         )
+
+    @staticmethod
+    def parse_bytes(location: TLocation, data: bytes) -> Optional[ChroniclesLogLine[TLocation]]:
+        """
+        Lazily parses the undecoded bytes of a line, as this source does for :class:`MappedLogLine` objects, or returns
+        `None` if they cannot be parsed. Loops reading bytes on their own can use this to skip wrapping them in lines.
+        """
+        parsed = _LOG_LINE_BYTES.search(data)
+        if not parsed or not bytes_end_with_topics(data, parsed.start('message'), parsed.end('message')):
+            return None
+
+        return BytesChroniclesLogLine(
+            location=location,
+            data=data,
+            timestamp=parse_timestamp(parsed['timestamp'].decode('ascii')),
+            offset=parsed.start(),
+            message_end=parsed.end('message'),
+            end=parsed.end(),
+        )
+
+
+def line_parser(
+        lazy: bool = False,
+        interner: Optional[StringInterner] = None,
+) -> Callable[[RawLogLine[TLocation]], Optional[ChroniclesLogLine[TLocation]]]:
+    """
+    Returns the function which :class:`ChroniclesRawSource` parses each raw line with, given `lazy` and `interner`,
+    and which returns `None` for unparseable lines. This lets loops which read lines on their own (see
+    :mod:`logtools.log.sources.pipeline`) parse them as the source would, bar prefiltering and caching.
+    """
+    return _parse_lazy if lazy else partial(_parse_raw, interner=interner)
+
+
+def _parse_raw(
+        line: RawLogLine[TLocation],
+        interner: Optional[StringInterner] = None,
+) -> Optional[ChroniclesLogLine[TLocation]]:
+    parsed = _LOG_LINE.search(line.raw)
+    if not parsed:
+        return None
+
+    split = split_topics(parsed['message'])
+    if not split:
+        return None
+
+    message, topics = split
+    if interner is not None:
+        message = interner(message)
+
+    return ChroniclesLogLine(
+        location=line.location,
+        raw=line.raw,
+        level=LogLevel(parsed['line_type'].upper()),
+        timestamp=parse_timestamp(parsed['timestamp']),
+        message=message,
+        count=int(parsed['count']) if parsed['count'] else None,
+        topics=topics
+    )
+
+
+def _parse_lazy(line: RawLogLine[TLocation]) -> Optional[ChroniclesLogLine[TLocation]]:
+    if isinstance(line, MappedLogLine):
+        return ChroniclesRawSource.parse_bytes(line.location, line.data)
+
+    parsed = _LOG_LINE.search(line.raw)
+    if not parsed or not ends_with_topics(parsed['message']):
+        return None
+
+    return LazyChroniclesLogLine(
+        location=line.location,
+        raw=line.raw,
+        timestamp=parse_timestamp(parsed['timestamp']),
+        offset=parsed.start(),
+        message_end=parsed.end('message'),
+        end=parsed.end(),
+    )
@@ -0,0 +1,364 @@
+"""
+Columnar decoding of Chronicles log files with NumPy. Files are read in chunks of whole lines, and every line of a
+chunk is located, checked and has its timestamp and level decoded at once, by array operations over the bytes of the
+chunk, instead of line by line by regular expressions and datetime parsing. Lines are kept as offsets into their
+chunk, so no per-line object exists until lines get iterated over one by one.
+
+NumPy is an optional dependency (`pip install logtools[columnar]`), which this module requires.
+"""
+import string
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator, Optional, Sequence, Tuple, Union, overload
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+from logtools.log.base import LogSource
+from logtools.log.sources.input.compressed import open_binary_at
+from logtools.log.sources.input.mmap_log_source import MappedLineLocation
+from logtools.log.sources.parse.chronicles_raw_source import BytesChroniclesLogLine, LogLevel, LEVEL_ORDER, \
+    _LOG_LINE_BYTES, _MESSAGE_OFFSET, _timezone, parse_timestamp
+from logtools.log.sources.parse.topics import ends_with_topics
+from logtools.log.sources.transform.merged_source import epoch_nanos
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+# A line laid out as Chronicles writes it starts with its level and timestamp (`TRC 2023-10-16 20:29:24.595+00:00 `),
+# and ends with ` count=` and a number.
+_DIGITS = [4, 5, 6, 7, 9, 10, 12, 13, 15, 16, 18, 19, 21, 22, 24, 25, 26, 28, 29, 31, 32]
+_SEPARATORS = {3: ' ', 8: '-', 11: '-', 14: ' ', 17: ':', 20: ':', 23: '.', 30: ':', 33: ' '}
+_HEAD = _MESSAGE_OFFSET
+_COUNT = b' count='
+# Counts longer than this are left to the regular expression.
+_MAX_COUNT_DIGITS = 18
+
+_NANOS_PER_MINUTE = 60 * 1_000_000_000
+
+# Bytes which `\w` and `\s` match among ASCII ones.
+_WORD_BYTES = (string.ascii_letters + string.digits + '_').encode()
+_SPACE_BYTES = b'\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f '
+
+_UTC = timezone.utc
+_EPOCH = datetime(1970, 1, 1, tzinfo=_UTC)
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('columnar decoding requires NumPy, which comes with logtools[columnar]')
+
+
+def _level_key(text: bytes) -> int:
+    return (text[0] << 16) | (text[1] << 8) | text[2]
+
+
+_LEVEL_KEYS = [_level_key(level.value.encode()) for level in LEVEL_ORDER]
+
+Line = BytesChroniclesLogLine[MappedLineLocation]
+
+
+class ChroniclesBatch(Sequence[Line]):
+    """
+    A batch of Chronicles log lines from a file, stored column by column. Lines are the byte ranges [`starts`, `ends`)
+    of the shared `buffer`, which begins at byte `base_offset` of the file. `offsets`, `message_ends` and `count_ends`
+    locate the parts of each line as :class:`BytesChroniclesLogLine` does, relative to the start of the line.
+    Timestamps are UTC `datetime64[ns]` values, with the UTC offset each line was written with kept (in minutes) in
+    `utc_offsets`, and levels are indexes into :data:`LEVEL_ORDER`, so that they compare by severity.
+
+    Batches are sequences of :class:`BytesChroniclesLogLine` objects, which only get created when lines are accessed
+    one by one. Their timestamps keep the offset they were written with, as parsed lines do.
+    """
+
+    def __init__(self, path: Path, buffer: bytes, base_offset: int, starts: 'np.ndarray', ends: 'np.ndarray',
+                 line_numbers: 'np.ndarray', timestamps: 'np.ndarray', levels: 'np.ndarray', offsets: 'np.ndarray',
+                 message_ends: 'np.ndarray', count_ends: 'np.ndarray', utc_offsets: 'np.ndarray'):
+        self.path = path
+        self.buffer = buffer
+        self.base_offset = base_offset
+        self.starts = starts
+        self.ends = ends
+        self.line_numbers = line_numbers
+        self.timestamps = timestamps
+        self.levels = levels
+        self.offsets = offsets
+        self.message_ends = message_ends
+        self.count_ends = count_ends
+        self.utc_offsets = utc_offsets
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @overload
+    def __getitem__(self, index: int) -> Line:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> 'ChroniclesBatch':
+        ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Line, 'ChroniclesBatch']:
+        if isinstance(index, slice):
+            return self.select(index)
+        start = int(self.starts[index])
+        return BytesChroniclesLogLine(
+            MappedLineLocation(int(self.line_numbers[index]), self.path, self.base_offset + start),
+            self.buffer[start:int(self.ends[index])],
+            _timestamp(int(self.timestamps[index].astype('datetime64[us]').astype(np.int64)),
+                       int(self.utc_offsets[index])),
+            int(self.offsets[index]),
+            int(self.message_ends[index]),
+            int(self.count_ends[index]),
+        )
+
+    def __iter__(self) -> Iterator[Line]:
+        buffer, path, base_offset = self.buffer, self.path, self.base_offset
+        # building aware datetimes from microseconds since the epoch is much cheaper than localizing naive ones.
+        micros = self.timestamps.astype('datetime64[us]').astype(np.int64)
+        columns = (self.starts, self.ends, self.line_numbers, micros, self.utc_offsets, self.offsets,
+                   self.message_ends, self.count_ends)
+        for start, end, line_number, timestamp, utc_offset, offset, message_end, count_end in zip(
+                *(column.tolist() for column in columns)):
+            yield BytesChroniclesLogLine(
+                MappedLineLocation(line_number, path, base_offset + start),
+                buffer[start:end],
+                _timestamp(timestamp, utc_offset),
+                offset,
+                message_end,
+                count_end,
+            )
+
+    def select(self, rows: Union['np.ndarray', slice]) -> 'ChroniclesBatch':
+        """Returns the lines picked by `rows`, which may be a boolean mask, an array of indexes or a slice."""
+        return ChroniclesBatch(self.path, self.buffer, self.base_offset, self.starts[rows], self.ends[rows],
+                               self.line_numbers[rows], self.timestamps[rows], self.levels[rows], self.offsets[rows],
+                               self.message_ends[rows], self.count_ends[rows], self.utc_offsets[rows])
+
+    def between(self, start: Optional[datetime], end: Optional[datetime]) -> 'np.ndarray':
+        """Returns a mask of the lines with timestamps in [`start`, `end`]. Naive bounds are taken to be in UTC."""
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= self.timestamps >= datetime64(start)
+        if end is not None:
+            mask &= self.timestamps <= datetime64(end)
+        return mask
+
+    def level_in(self, levels: Sequence[LogLevel]) -> 'np.ndarray':
+        """Returns a mask of the lines with any of `levels`."""
+        return np.isin(self.levels, [LEVEL_ORDER.index(level) for level in levels])
+
+
+def _timestamp(micros: int, utc_offset: int) -> datetime:
+    """Builds a timestamp from microseconds since the epoch, in the UTC offset (in minutes) it was written with."""
+    timestamp = _EPOCH + timedelta(0, 0, micros)
+    return timestamp.astimezone(_timezone(utc_offset)) if utc_offset else timestamp
+
+
+def datetime64(timestamp: datetime) -> 'np.datetime64':
+    """Converts a timestamp into a `datetime64[ns]` value comparable with batch timestamps, taking naive ones as UTC."""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=_UTC)
+    return np.datetime64(epoch_nanos(timestamp), 'ns')
+
+
+def decode_batch(path: Path, buffer: bytes, base_offset: int = 0, first_line_number: int = 1) -> ChroniclesBatch:
+    """
+    Decodes a buffer holding whole lines of a Chronicles log file, read from byte `base_offset` of the file at `path`.
+    Lines laid out as Chronicles writes them get decoded by array operations, while others go through the regular
+    expression of :class:`ChroniclesRawSource`. Lines which the regular expression does not match either are left out
+    (and reported), as they are by :class:`ChroniclesRawSource`.
+    """
+    _require_numpy()
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    ends = np.flatnonzero(data == ord('\n')) + 1
+    if len(data) > 0 and data[-1] != ord('\n'):
+        ends = np.append(ends, len(data))
+    ends = ends.astype(np.int64)
+    starts = np.concatenate(([0], ends[:-1]))[:len(ends)].astype(np.int64)
+    count = len(starts)
+    line_numbers = np.arange(first_line_number, first_line_number + count, dtype=np.int64)
+    # the buffer gets padded so that gathering bytes past its end is harmless; the checks below then fail.
+    padded = np.concatenate((data, np.zeros(_HEAD, dtype=np.uint8)))
+
+    head = padded[starts[:, None] + np.arange(_HEAD)].astype(np.int64)
+    laid_out = np.ones(count, dtype=bool)
+    for position, separator in _SEPARATORS.items():
+        laid_out &= head[:, position] == ord(separator)
+    digits = head[:, _DIGITS] - ord('0')
+    laid_out &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+    sign = np.where(head[:, 27] == ord('+'), 1, np.where(head[:, 27] == ord('-'), -1, 0))
+    laid_out &= sign != 0
+
+    # the trailing ` count=` and its digits, which come right before the line break.
+    content_ends = ends - (padded[ends - 1] == ord('\n'))
+    count_digits = np.zeros(count, dtype=np.int64)
+    counting = laid_out.copy()
+    for _ in range(_MAX_COUNT_DIGITS + 1):
+        at = np.maximum(content_ends - count_digits - 1, 0)
+        counting &= (at >= starts + _HEAD) & (padded[at] >= ord('0')) & (padded[at] <= ord('9'))
+        if not counting.any():
+            break
+        count_digits += counting
+    message_ends = content_ends - count_digits - len(_COUNT)
+    suffix = padded[np.maximum(message_ends, 0)[:, None] + np.arange(len(_COUNT))]
+    laid_out &= (count_digits > 0) & (count_digits <= _MAX_COUNT_DIGITS) & (message_ends >= starts + _HEAD)
+    laid_out &= (suffix == np.frombuffer(_COUNT, dtype=np.uint8)).all(axis=1)
+
+    def number(*positions: int) -> 'np.ndarray':
+        value = np.zeros(count, dtype=np.int64)
+        for position in positions:
+            value = value * 10 + digits[:, _DIGITS.index(position)]
+        return value
+
+    year, month, day = number(4, 5, 6, 7), number(9, 10), number(12, 13)
+    hours, minutes, seconds, millis = number(15, 16), number(18, 19), number(21, 22), number(24, 25, 26)
+    offset = sign * (number(28, 29) * 60 + number(31, 32))
+    laid_out &= (month >= 1) & (month <= 12) & (day >= 1) & (hours < 24) & (minutes < 60) & (seconds < 60)
+
+    months = ((year - 1970) * 12 + np.clip(month, 1, 12) - 1).astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+    # days past the end of their month would roll over into the next one.
+    laid_out &= days.astype('datetime64[M]') == months
+    nanos = (days.astype('datetime64[ns]').astype(np.int64) + (hours * 60 + minutes - offset) * _NANOS_PER_MINUTE +
+             seconds * 1_000_000_000 + millis * 1_000_000)
+
+    # levels compare case-insensitively: clearing bit 5 upper-cases letters, and never turns other bytes into letters.
+    keys = ((head[:, 0] & 0xDF) << 16) | ((head[:, 1] & 0xDF) << 8) | (head[:, 2] & 0xDF)
+    levels = np.full(count, -1, dtype=np.int8)
+    for code, key in enumerate(_LEVEL_KEYS):
+        levels[keys == key] = code
+    laid_out &= levels >= 0
+
+    offsets = np.zeros(count, dtype=np.int64)
+    message_ends -= starts
+    count_ends = content_ends - starts
+    keep = laid_out.copy()
+    for row in np.flatnonzero(~laid_out).tolist():
+        line = buffer[starts[row]:ends[row]]
+        parsed = _LOG_LINE_BYTES.search(line)
+        if parsed is None:
+            print(f'Skip unparseable line: {line.decode("utf-8", errors="replace")}', file=sys.stderr)
+            continue
+        timestamp = parse_timestamp(parsed['timestamp'].decode('ascii'))
+        nanos[row] = epoch_nanos(timestamp)
+        utc_offset = timestamp.utcoffset()
+        offset[row] = utc_offset // timedelta(minutes=1) if utc_offset is not None else 0
+        levels[row] = LEVEL_ORDER.index(LogLevel(parsed['line_type'].decode('ascii').upper()))
+        offsets[row], message_ends[row], count_ends[row] = parsed.start(), parsed.end('message'), parsed.end()
+        keep[row] = True
+
+    rows = np.flatnonzero(keep)
+    for row in rows[~_ends_with_topics(buffer, data, (starts + offsets + _HEAD)[rows], (starts + message_ends)[rows])]:
+        print(f'Skip unparseable line: {buffer[starts[row]:ends[row]].decode("utf-8", errors="replace")}',
+              file=sys.stderr)
+        keep[row] = False
+
+    batch = ChroniclesBatch(path, buffer, base_offset, starts, ends, line_numbers, nanos.view('datetime64[ns]'),
+                            levels, offsets, message_ends, count_ends, offset.astype(np.int16))
+    return batch if keep.all() else batch.select(keep)
+
+
+def _ends_with_topics(buffer: bytes, data: 'np.ndarray', body_starts: 'np.ndarray',
+                      body_ends: 'np.ndarray') -> 'np.ndarray':
+    """
+    Returns a mask of the line bodies [`body_starts`, `body_ends`) of `buffer` which end with topics, as told by
+    :func:`ends_with_topics`. Bodies ending with a bare `key=value` topic in ASCII get checked by array operations over
+    the bytes of that topic only, and others (e.g. ending with a quoted value) one by one.
+    """
+    def table(matching: bytes) -> 'np.ndarray':
+        matches = np.zeros(256, dtype=bool)
+        matches[np.frombuffer(matching, dtype=np.uint8)] = True
+        return matches
+
+    # the last token of a body starts after its last space, and its key ends at its first `=`.
+    spaces = np.concatenate(([-1], np.flatnonzero(data == ord(' '))))
+    token_starts = np.maximum(spaces[np.searchsorted(spaces, body_ends) - 1] + 1, body_starts)
+    equals = np.concatenate((np.flatnonzero(data == ord('=')), [len(data)]))
+    separators = equals[np.searchsorted(equals, token_starts)]
+
+    # the bytes of all last tokens, one after the other, and the row each of them belongs to.
+    lengths = np.maximum(body_ends - token_starts, 0)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    positions = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths) + token_starts[rows]
+    token = data[positions]
+    in_key = positions < separators[rows]
+    errors = (in_key & ~table(_WORD_BYTES)[token]) | (~in_key & table(_SPACE_BYTES)[token])
+    non_ascii = np.bincount(rows, weights=token >= 128, minlength=len(lengths)) > 0
+
+    bare = (separators > token_starts) & (separators + 1 < body_ends) & \
+        (np.bincount(rows, weights=errors, minlength=len(lengths)) == 0)
+    nonempty = body_ends > body_starts
+    last = data[np.maximum(body_ends - 1, 0)] if len(data) > 0 else np.zeros(len(body_ends), dtype=np.uint8)
+
+    topics = bare & ~non_ascii & nonempty
+    for row in np.flatnonzero(nonempty & ~topics & (non_ascii | (last == ord('"')))).tolist():
+        topics[row] = ends_with_topics(buffer[body_starts[row]:body_ends[row]].decode('utf-8', errors='replace'))
+    return topics
+
+
+class ColumnarChroniclesSource(LogSource[Line]):
+    """
+    Parses a Chronicles log file into :class:`ChroniclesBatch` objects, decoding `chunk_size` bytes worth of lines at
+    a time. As with :class:`MmapLogSource`, parsing can be restricted to the line-aligned byte range [`start`, `end`)
+    starting at line `first_line_number`.
+
+    :meth:`iter_batches` yields the batches themselves, while iterating over the source yields their lines one by one:
+    these are the lazily decoded lines which :class:`ChroniclesRawSource` yields for :class:`MmapLogSource` inputs.
+
+    If a `predicate` is given, lines which fail it are left out of batches. Predicates with a `batch_mask` method
+    (time ranges, levels, and filter expressions on those) run on whole batches at once; others run line by line.
+    """
+
+    def __init__(self, path: Path, start: int = 0, end: Optional[int] = None, first_line_number: int = 1,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, predicate=None):
+        _require_numpy()
+        self.path = path
+        self.start = start
+        self.end = end
+        self.first_line_number = first_line_number
+        self.chunk_size = chunk_size
+        self.predicate = predicate
+
+    def __iter__(self) -> Iterator[Line]:
+        for batch in self.iter_batches():
+            yield from batch
+
+    def iter_batches(self, batch_size: Optional[int] = None) -> Iterator[ChroniclesBatch]:
+        """
+        Yields the lines of the file in columnar batches, one per chunk of the file unless `batch_size` caps the
+        number of lines in a batch.
+        """
+        line_number = self.first_line_number
+        for offset, buffer in self._chunks():
+            batch = decode_batch(self.path, buffer, offset, line_number)
+            line_number += buffer.count(b'\n') + (not buffer.endswith(b'\n'))
+            if self.predicate is not None:
+                batch = batch.select(self._mask(batch))
+            if batch_size is None or len(batch) <= batch_size:
+                yield batch
+                continue
+            for index in range(0, len(batch), batch_size):
+                yield batch.select(slice(index, index + batch_size))
+
+    def _mask(self, batch: ChroniclesBatch) -> 'np.ndarray':
+        batch_mask = getattr(self.predicate, 'batch_mask', None)
+        mask = batch_mask(batch) if batch_mask is not None else None
+        if mask is None:
+            mask = np.fromiter((self.predicate(line) for line in batch), dtype=bool, count=len(batch))
+        return mask
+
+    def _chunks(self) -> Iterator[Tuple[int, bytes]]:
+        offset = self.start
+        with open_binary_at(self.path, self.start) as stream:
+            while self.end is None or offset < self.end:
+                size = self.chunk_size if self.end is None else min(self.chunk_size, self.end - offset)
+                buffer = stream.read(size)
+                if not buffer:
+                    return
+                # chunks end on line boundaries, as does the range.
+                if not buffer.endswith(b'\n') and (self.end is None or offset + len(buffer) < self.end):
+                    buffer += stream.readline()
+                yield offset, buffer
+                offset += len(buffer)
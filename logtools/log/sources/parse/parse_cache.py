@@ -0,0 +1,213 @@
+"""
+Persistent cache of parsed Chronicles log files, so that tools run over the same logs again and again only parse each
+of them once. The parse of a log file is stored column by column, with one entry per line: its byte offset, its
+timestamp (as epoch microseconds and UTC offset), its level, and where its message, topics and count are. Lines can
+then be rebuilt straight from the bytes of the log, without running the parser over them.
+
+Cache entries live in a cache directory, named after the path of the file they belong to, and are discarded once the
+size or modification time of their file changes. The directory is capped in size, evicting the least recently used
+entries first.
+"""
+import mmap
+import os
+import struct
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from hashlib import sha1
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+CACHE_SUFFIX = '.pcache'
+
+# magic, version, size and mtime (in nanoseconds) of the parsed file, number of lines.
+_HEADER = struct.Struct('<4sIqqq')
+_MAGIC = b'LTPC'
+_VERSION = 1
+
+# Columns are laid out from the widest type to the narrowest, so that each of them is aligned in a mapped entry.
+_COLUMNS: List[Tuple[str, str]] = [
+    ('starts', 'q'), ('timestamps', 'q'), ('offsets', 'i'), ('message_ends', 'i'), ('count_ends', 'i'),
+    ('topics_starts', 'i'), ('utc_offsets', 'h'), ('levels', 'b'),
+]
+
+
+def default_cache_directory() -> Path:
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'logtools' / 'parse'
+
+
+@dataclass
+class ParsedColumns:
+    """
+    The parse of a log file. `starts` holds the byte offset of every line, followed by the size of the file, so that
+    line `i` spans [`starts[i]`, `starts[i + 1]`). `timestamps` are in microseconds since the epoch, `utc_offsets` in
+    minutes, and `levels` are indexes into :data:`LEVEL_ORDER`, or -1 for lines which cannot be parsed. `offsets`,
+    `message_ends` and `count_ends` locate the parts of each line as in :class:`LazyChroniclesLogLine`, while
+    `topics_starts` is where topics start within the (decoded) message, or -1 if they cannot be told apart from it.
+
+    Columns are arrays while a file gets parsed, and read-only views of the mapped entry once loaded from the cache.
+    """
+    starts: Sequence[int] = field(default_factory=lambda: array('q'))
+    timestamps: Sequence[int] = field(default_factory=lambda: array('q'))
+    offsets: Sequence[int] = field(default_factory=lambda: array('i'))
+    message_ends: Sequence[int] = field(default_factory=lambda: array('i'))
+    count_ends: Sequence[int] = field(default_factory=lambda: array('i'))
+    topics_starts: Sequence[int] = field(default_factory=lambda: array('i'))
+    utc_offsets: Sequence[int] = field(default_factory=lambda: array('h'))
+    levels: Sequence[int] = field(default_factory=lambda: array('b'))
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    def append(self, start: int, timestamp: int = 0, utc_offset: int = 0, level: int = -1, offset: int = 0,
+               message_end: int = 0, count_end: int = 0, topics_start: int = -1):
+        """Appends the parse of a line to the columns of a file being parsed. Unparseable lines only have a start."""
+        self.starts.append(start)  # type: ignore[attr-defined]
+        self.timestamps.append(timestamp)  # type: ignore[attr-defined]
+        self.utc_offsets.append(utc_offset)  # type: ignore[attr-defined]
+        self.levels.append(level)  # type: ignore[attr-defined]
+        self.offsets.append(offset)  # type: ignore[attr-defined]
+        self.message_ends.append(message_end)  # type: ignore[attr-defined]
+        self.count_ends.append(count_end)  # type: ignore[attr-defined]
+        self.topics_starts.append(topics_start)  # type: ignore[attr-defined]
+
+    def row(self, index: int) -> Tuple[int, int, int, int, int, int, int]:
+        """Returns the timestamp, UTC offset, level, offset, message end, count end and topics start of a line."""
+        return (self.timestamps[index], self.utc_offsets[index], self.levels[index], self.offsets[index],
+                self.message_ends[index], self.count_ends[index], self.topics_starts[index])
+
+    def extend(self, other: 'ParsedColumns'):
+        """Appends the columns of the lines following those of a file being parsed, e.g. parsed by another worker."""
+        for name, _ in _COLUMNS:
+            getattr(self, name).extend(getattr(other, name))
+
+    def close(self, size: int):
+        """Ends the columns of a file being parsed with the size of the file."""
+        self.starts.append(size)  # type: ignore[attr-defined]
+
+
+class ParseCache:
+    """
+    A directory of parsed log files, holding at most `max_bytes` worth of them. Caches are plain values, so they can
+    be handed over to worker processes, which then share the directory.
+    """
+
+    def __init__(self, directory: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory if directory is not None else default_cache_directory()
+        self.max_bytes = max_bytes
+
+    def entry(self, path: Path) -> Path:
+        """Returns the cache entry of a log file, which is named after its resolved path."""
+        return self.directory / (sha1(str(path.resolve()).encode()).hexdigest() + CACHE_SUFFIX)
+
+    @contextmanager
+    def open(self, path: Path) -> Iterator[Optional[ParsedColumns]]:
+        """
+        Maps the cached parse of a log file for the duration of the context, or yields `None` if the file has no
+        valid entry. Columns must not be used once the context is over.
+        """
+        entry = self.entry(path)
+        try:
+            stat = path.stat()
+            cached = entry.open('rb')
+        except OSError:
+            yield None
+            return
+
+        with cached:
+            try:
+                mapped = mmap.mmap(cached.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                yield None
+                return
+
+            with mapped:
+                views = _views(mapped, stat.st_size, stat.st_mtime_ns)
+                if views is None:
+                    yield None
+                    return
+                try:
+                    # entries get evicted in order of last use, which their modification time stands for.
+                    _touch(entry)
+                    yield ParsedColumns(**{name: view for (name, _), view in zip(_COLUMNS, views)})
+                finally:
+                    for view in views:
+                        view.release()
+
+    def save(self, path: Path, size: int, mtime_ns: int, columns: ParsedColumns):
+        """
+        Saves the parse of a log file of the given size and modification time, then evicts the least recently used
+        entries until the cache fits in `max_bytes` again. Entries are replaced atomically, so concurrent readers never
+        see a partially written one. Parses which would not fit in the cache on their own are not saved.
+        """
+        arrays = [getattr(columns, name) for name, _ in _COLUMNS]
+        entry_size = _HEADER.size + sum(len(column) * column.itemsize for column in arrays)
+        if entry_size > self.max_bytes:
+            return
+
+        entry = self.entry(path)
+        temporary = entry.with_name(f'{entry.name}.{os.getpid()}.tmp')
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with temporary.open('wb') as output:
+                output.write(_HEADER.pack(_MAGIC, _VERSION, size, mtime_ns, len(columns)))
+                for column in arrays:
+                    output.write(column.tobytes())
+            os.replace(temporary, entry)
+            self._evict(keep=entry)
+        except OSError:
+            # the cache only saves work, so failing to write to it is not worth failing over.
+            pass
+        finally:
+            temporary.unlink(missing_ok=True)
+
+    def _evict(self, keep: Path):
+        entries = []
+        for entry in self.directory.glob(f'*{CACHE_SUFFIX}'):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            entry.unlink(missing_ok=True)
+            total -= size
+
+
+def _views(mapped: mmap.mmap, size: int, mtime_ns: int) -> Optional[List[memoryview]]:
+    """Returns views of the columns in a mapped entry, or `None` if the entry is invalid or out of date."""
+    try:
+        magic, version, entry_size, entry_mtime_ns, count = _HEADER.unpack_from(mapped)
+    except struct.error:
+        return None
+
+    if magic != _MAGIC or version != _VERSION or entry_size != size or entry_mtime_ns != mtime_ns:
+        return None
+
+    lengths = [count + 1 if name == 'starts' else count for name, _ in _COLUMNS]
+    if len(mapped) != _HEADER.size + sum(length * array(code).itemsize for (_, code), length in zip(_COLUMNS, lengths)):
+        return None
+
+    views = []
+    position = _HEADER.size
+    with memoryview(mapped) as contents:
+        for (_, code), length in zip(_COLUMNS, lengths):
+            end = position + length * array(code).itemsize
+            views.append(contents[position:end].cast(code))  # type: ignore[call-overload]
+            position = end
+    return views
+
+
+def _touch(entry: Path):
+    try:
+        os.utime(entry)
+    except OSError:
+        pass
@@ -0,0 +1,131 @@
+"""
+Cheap tests on the raw text of Chronicles log lines, which reject lines before they get parsed. A prefilter may only
+reject lines which would fail the predicate it stands for once parsed, so it must let through any line it cannot make
+sense of: prefilters only look at lines laid out as Chronicles writes them, i.e. starting with their level and a UTC
+timestamp (`TRC 2023-10-16 20:29:24.595+00:00 ...`), and leave the rest to the parser.
+
+Prefilters work on both decoded lines and the undecoded bytes of :class:`MappedLogLine` instances, so that rejected
+lines are never decoded either.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Collection, Optional, Tuple
+
+from logtools.log.base import RawLogLine
+from logtools.log.sources.input.mmap_log_source import MappedLogLine
+
+# Chronicles timestamps (`YYYY-MM-DD HH:MM:SS.mmm`) follow a three-letter level and a space, and are followed by their
+# UTC offset.
+_TIMESTAMP = slice(4, 27)
+_OFFSET = slice(27, 33)
+
+
+class RawPrefilter(ABC):
+    """Tells whether a raw line might pass a predicate, rejecting (some of) the lines which certainly do not."""
+
+    def __call__(self, line: RawLogLine) -> bool:
+        if isinstance(line, MappedLogLine):
+            return self.accepts_bytes(line.data)
+        return self.accepts(line.raw)
+
+    @abstractmethod
+    def accepts(self, raw: str) -> bool:
+        ...
+
+    @abstractmethod
+    def accepts_bytes(self, data: bytes) -> bool:
+        ...
+
+
+class TimestampPrefilter(RawPrefilter):
+    """
+    Rejects lines with UTC timestamps outside of [`start`, `end`]. Timestamps in the Chronicles layout sort like the
+    times they stand for, so they are compared as strings, without being parsed.
+    """
+
+    def __init__(self, start: Optional[datetime], end: Optional[datetime]):
+        # lines have millisecond timestamps, so truncating the bounds never rejects a line within them. Missing bounds
+        # are replaced by strings which sort before and after any timestamp.
+        self.start = _utc_text(start) if start is not None else ''
+        self.end = _utc_text(end) if end is not None else '9' * 23
+        self.start_bytes = self.start.encode()
+        self.end_bytes = self.end.encode()
+
+    def accepts(self, raw: str) -> bool:
+        if not _laid_out(raw):
+            return True
+        return self.start <= raw[_TIMESTAMP] <= self.end
+
+    def accepts_bytes(self, data: bytes) -> bool:
+        if not _laid_out_bytes(data):
+            return True
+        return self.start_bytes <= data[_TIMESTAMP] <= self.end_bytes
+
+
+class LevelPrefilter(RawPrefilter):
+    """Rejects lines whose level (e.g. `'TRC'`) is not one of `levels`."""
+
+    def __init__(self, levels: Collection[str]):
+        self.levels = frozenset(level.upper() for level in levels)
+        self.levels_bytes = frozenset(level.encode() for level in self.levels)
+
+    def accepts(self, raw: str) -> bool:
+        return not _laid_out(raw) or raw[:3].upper() in self.levels
+
+    def accepts_bytes(self, data: bytes) -> bool:
+        return not _laid_out_bytes(data) or data[:3].upper() in self.levels_bytes
+
+
+class SubstringPrefilter(RawPrefilter):
+    """Rejects lines which do not contain all of `substrings`, e.g. a topic key and the value it must have."""
+
+    def __init__(self, substrings: Collection[str]):
+        self.substrings: Tuple[str, ...] = tuple(substrings)
+        self.substrings_bytes = tuple(substring.encode() for substring in self.substrings)
+
+    def accepts(self, raw: str) -> bool:
+        return all(substring in raw for substring in self.substrings)
+
+    def accepts_bytes(self, data: bytes) -> bool:
+        return all(substring in data for substring in self.substrings_bytes)
+
+
+class AllPrefilter(RawPrefilter):
+    """Rejects lines which any of `prefilters` rejects."""
+
+    def __init__(self, *prefilters: RawPrefilter):
+        self.prefilters = prefilters
+
+    def accepts(self, raw: str) -> bool:
+        return all(prefilter.accepts(raw) for prefilter in self.prefilters)
+
+    def accepts_bytes(self, data: bytes) -> bool:
+        return all(prefilter.accepts_bytes(data) for prefilter in self.prefilters)
+
+
+class AnyPrefilter(RawPrefilter):
+    """Rejects lines which all of `prefilters` reject."""
+
+    def __init__(self, *prefilters: RawPrefilter):
+        self.prefilters = prefilters
+
+    def accepts(self, raw: str) -> bool:
+        return any(prefilter.accepts(raw) for prefilter in self.prefilters)
+
+    def accepts_bytes(self, data: bytes) -> bool:
+        return any(prefilter.accepts_bytes(data) for prefilter in self.prefilters)
+
+
+def _laid_out(raw: str) -> bool:
+    return raw[_OFFSET] == '+00:00' and raw[3:4] == ' '
+
+
+def _laid_out_bytes(data: bytes) -> bool:
+    return data[_OFFSET] == b'+00:00' and data[3:4] == b' '
+
+
+def _utc_text(timestamp: datetime) -> str:
+    # naive timestamps are taken to be in UTC, as they are by the command line tools.
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.isoformat(sep=' ', timespec='milliseconds')[:23]
@@ -1,10 +1,16 @@
+import pickle
 from datetime import datetime
 
 import pytest
 import pytz
+from dateutil import parser
 
+from logtools.log.interning import StringInterner
+
+from logtools.log.sources.input.mmap_log_source import MmapLogSource
 from logtools.log.sources.input.string_log_source import StringLogSource
-from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource, ChroniclesLogLine, LogLevel
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource, ChroniclesLogLine, LogLevel, \
+    LazyChroniclesLogLine, BytesChroniclesLogLine, parse_timestamp
 
 
 def parse_single_line(lines: str):
@@ -104,3 +110,173 @@ def test_should_parse_timestamps_with_negative_time_offsets():
                                       tzinfo=pytz.FixedOffset(-180))
     assert line.message == "a message"
     assert line.count == 10641
+
+
+@pytest.mark.parametrize('timestamp', [
+    '2023-10-16 17:28:46.579+00:00',
+    '2024-02-02 20:38:47.316-03:00',
+    '2024-02-29 23:59:59.999+05:30',
+])
+def test_should_parse_chronicles_timestamps_like_dateutil(timestamp):
+    assert parse_timestamp(timestamp) == parser.parse(timestamp)
+    assert parse_timestamp(timestamp).utcoffset() == parser.parse(timestamp).utcoffset()
+
+
+def test_should_share_timezone_instances_across_timestamps_with_the_same_offset():
+    ts1 = parse_timestamp('2024-02-02 20:38:47.316-03:00')
+    ts2 = parse_timestamp('2024-02-03 10:00:00.000-03:00')
+
+    assert ts1.tzinfo is ts2.tzinfo
+
+
+def test_should_fall_back_to_generic_parser_for_non_chronicles_timestamps():
+    assert parse_timestamp('Oct 16 2023 17:28:46 UTC') == datetime(2023, 10, 16, 17, 28, 46, tzinfo=pytz.utc)
+
+
+def test_should_parse_lazy_lines_into_the_same_values_as_eager_lines():
+    lines = (
+        'TRC 2023-10-16 17:28:46.579+00:00 Sending want list to peer                  '
+        'topics="codex blockexcnetwork" tid=1 peer=16U*7mogoM type=WantBlock items=1 count=870781\n'
+        '  WRN 2024-02-02 20:37:18.316+00:00 Starting codex node     topics="codex node" '
+        'config="some \\"quoted\\" string with \'more\' escape chars" count=7\n'
+    )
+
+    eager = list(ChroniclesRawSource(StringLogSource(lines)))
+    lazy = list(ChroniclesRawSource(StringLogSource(lines), lazy=True))
+
+    assert all(isinstance(line, LazyChroniclesLogLine) for line in lazy)
+    assert [(line.timestamp, line.level, line.message, line.topics, line.count, line.fields) for line in lazy] == \
+           [(line.timestamp, line.level, line.message, line.topics, line.count, line.fields) for line in eager]
+
+
+def test_should_defer_decoding_of_lazy_lines_until_first_access():
+    line = next(iter(ChroniclesRawSource(StringLogSource(
+        'TRC 2023-10-16 17:28:46.579+00:00 Sending want list to peer topics="codex blockexcnetwork" count=3'
+    ), lazy=True)))
+
+    assert line.timestamp == datetime(2023, 10, 16, 17, 28, 46, 579000, tzinfo=pytz.utc)
+    assert line._decoded is None
+    assert line.count == 3
+    assert line._decoded is not None
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_should_skip_lines_without_topics(lazy):
+    lines = list(ChroniclesRawSource(StringLogSource(
+        'INF 2023-10-16 17:28:46.579+00:00 A message with no topics    count=3\n'
+        'INF 2023-10-16 17:28:46.580+00:00 A message with topics tid=1 count=4'
+    ), lazy=lazy))
+
+    assert [line.count for line in lines] == [4]
+
+
+def test_should_parse_fields_only_once():
+    line = parse_single_line(
+        'TRC 2023-10-16 17:28:46.579+00:00 Sending want list to peer topics="codex blockexcnetwork" tid=1 count=3'
+    )
+
+    assert line.fields is line.fields
+
+
+def test_should_extract_only_requested_fields():
+    line = parse_single_line(
+        'TRC 2023-10-16 17:28:46.579+00:00 Sending want list to peer                  '
+        'topics="codex blockexcnetwork" tid=1 peer=16U*7mogoM type=WantBlock items=1 count=870781'
+    )
+
+    assert line.extract_fields(['peer', 'tid', 'missing']) == {'peer': '16U*7mogoM', 'tid': '1'}
+    assert line.extract_fields([]) == {}
+
+    # same result should come out of the memoized fields, once they are parsed
+    _ = line.fields
+    assert line.extract_fields(['peer', 'tid', 'missing']) == {'peer': '16U*7mogoM', 'tid': '1'}
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_should_extract_the_last_occurrence_of_repeated_fields(lazy):
+    line = next(iter(ChroniclesRawSource(StringLogSource(
+        'TRC 2023-10-16 17:28:46.579+00:00 Sending want list to peer topics="codex" tid=1 peer=a tid=2 count=3'
+    ), lazy=lazy)))
+
+    assert line.extract_fields(['tid', 'peer']) == {'tid': '2', 'peer': 'a'}
+
+    _ = line.fields
+    assert line.extract_fields(['tid', 'peer']) == {'tid': '2', 'peer': 'a'}
+
+
+def test_should_pickle_lazy_lines():
+    line = next(iter(ChroniclesRawSource(StringLogSource(
+        'TRC 2023-10-16 17:28:46.579+00:00 Sending want list to peer topics="codex blockexcnetwork" count=3'
+    ), lazy=True)))
+
+    unpickled = pickle.loads(pickle.dumps(line))
+
+    assert unpickled.location == line.location
+    assert unpickled.timestamp == line.timestamp
+    assert unpickled.message == 'Sending want list to peer'
+    assert unpickled.count == 3
+
+
+def test_should_parse_lazy_lines_from_bytes_into_the_same_values_as_eager_lines(tmp_path):
+    lines = (
+        'TRC 2023-10-16 17:28:46.579+00:00 Sending want list to peer                  '
+        'topics="codex blockexcnetwork" tid=1 peer=16U*7mogoM type=WantBlock items=1 count=870781\n'
+        'WRN 2024-02-02 20:37:18.316+00:00 Starting cödex node     topics="codex node" '
+        'config="some \\"quoted\\" strïng with \'more\' escape chars" count=7\n'
+    )
+    log = tmp_path / 'log.log'
+    log.write_text(lines, encoding='utf-8')
+
+    eager = list(ChroniclesRawSource(StringLogSource(lines)))
+    lazy = list(ChroniclesRawSource(MmapLogSource(log), lazy=True))
+
+    assert all(isinstance(line, BytesChroniclesLogLine) for line in lazy)
+    assert [(line.timestamp, line.level, line.message, line.topics, line.count, line.fields) for line in lazy] == \
+           [(line.timestamp, line.level, line.message, line.topics, line.count, line.fields) for line in eager]
+    assert [line.raw for line in lazy] == [line.raw for line in eager]
+
+
+def test_should_not_decode_lines_parsed_from_bytes_unless_accessed(tmp_path):
+    log = tmp_path / 'log.log'
+    log.write_bytes(b'TRC 2023-10-16 17:28:46.579+00:00 Sending want list to peer topics="codex" count=3\n')
+
+    line = next(iter(ChroniclesRawSource(MmapLogSource(log), lazy=True)))
+    assert line.count == 3
+    assert line._raw is None
+
+    unpickled = pickle.loads(pickle.dumps(line))
+    assert unpickled._raw is None
+    assert unpickled.data == line.data
+    assert unpickled.timestamp == line.timestamp
+    assert unpickled.message == 'Sending want list to peer'
+
+
+def test_should_not_allocate_instance_dictionaries_for_lines():
+    eager = parse_single_line(
+        'TRC 2023-10-16 17:28:46.579+00:00 Sending want list to peer topics="codex blockexcnetwork" count=3'
+    )
+    lazy = next(iter(ChroniclesRawSource(StringLogSource(eager.raw), lazy=True)))
+
+    assert not hasattr(eager, '__dict__')
+    assert not hasattr(lazy, '__dict__')
+    assert not hasattr(eager.location, '__dict__')
+
+
+def test_should_intern_messages_when_given_an_interner():
+    lines = list(ChroniclesRawSource(StringLogSource(
+        'TRC 2023-10-16 17:28:46.579+00:00 Sending want list to peer topics="codex blockexcnetwork" count=1\n'
+        'TRC 2023-10-16 17:28:46.580+00:00 Sending want list to peer topics="codex blockexcnetwork" count=2\n'
+    ), interner=StringInterner()))
+
+    assert lines[0].message is lines[1].message
+
+
+def test_should_share_topic_keys_across_lines():
+    lines = list(ChroniclesRawSource(StringLogSource(
+        'TRC 2023-10-16 17:28:46.579+00:00 Sending want list to peer topics="codex" peerId=16U*7mogoM count=1\n'
+        'TRC 2023-10-16 17:28:46.580+00:00 Sending want list to peer topics="codex" peerId=16U*7mogoM count=2\n'
+    )))
+
+    keys1, keys2 = list(lines[0].fields), list(lines[1].fields)
+    assert keys1 == keys2 == ['topics', 'peerId']
+    assert all(key1 is key2 for key1, key2 in zip(keys1, keys2))
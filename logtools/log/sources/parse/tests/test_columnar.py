@@ -0,0 +1,95 @@
+from pathlib import Path
+
+import pytest
+from dateutil import parser
+
+from logtools.log.sources.input.mmap_log_source import MmapLogSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource, LogLevel, LEVEL_ORDER
+from logtools.log.sources.transform.filter_expression import compile_filter
+from logtools.log.sources.transform.filtered_source import timestamp_range, level_in, topic_value, all_of
+
+np = pytest.importorskip('numpy')
+
+from logtools.log.sources.parse.columnar import ColumnarChroniclesSource, decode_batch  # noqa: E402
+
+LINES = [
+    'TRC 2023-10-16 20:29:24.595+00:00 Advertising block topics="codex discoveryengine" count=1',
+    'dbg 2023-10-16 20:29:24.597+00:00 Provided to nodes topics="codex discovery" tid=1 count=2',
+    'INF 2023-10-16 20:29:24.646+00:00 Retrieved record topics="codex repostore" tid=2 count=3',
+    # not laid out from the first character, but still parseable.
+    '  ERR 2023-10-16 20:29:24.500+00:00 Failed topics="codex discovery" tid=1 count=4',
+    'WRN 2023-10-16 22:29:24.700+02:00 Other timezone topics="codex discovery" tid=1 count=5',
+    'NOT 2024-02-29 23:59:59.999-03:30 Leap day tid=2 count=6',
+    'INF 2023-10-16 20:29:24.646+00:00 No count topics="codex repostore"',
+    'INF 2023-10-16 20:29:24.646+00:00 Carriage return count=8\r',
+    'garbage',
+    'WRN 2023-10-16 20:29:25.000+00:00 A very long count tid=3 count=123456789012345678901234',
+    'ERR 2023-10-16 20:29:25.001+00:00 tid=4 count=12',
+    'INF 2023-10-16 20:29:25.002+00:00 No "topics"    count=13',
+    'DBG 2023-10-16 20:29:25.003+00:00 Quoted topics     topics="codex node" count=14',
+]
+
+
+@pytest.fixture
+def log(tmp_path: Path) -> Path:
+    path = tmp_path / 'log.log'
+    path.write_text('\n'.join(LINES))
+    return path
+
+
+def attributes(line):
+    return (line.location, line.data, line.timestamp, line.timestamp.utcoffset(), line.level, line.message,
+            line.topics, line.count)
+
+
+def test_should_decode_lines_as_the_raw_parser_does(log: Path):
+    expected = list(ChroniclesRawSource(MmapLogSource(log), lazy=True))
+
+    for chunk_size in (16, 100, 4096):
+        actual = list(ColumnarChroniclesSource(log, chunk_size=chunk_size))
+        assert [attributes(line) for line in actual] == [attributes(line) for line in expected]
+
+    assert [line.count for line in expected] == [1, 2, 3, 4, 5, 6, 123456789012345678901234, 12, 14]
+
+
+def test_should_decode_timestamps_and_levels_into_columns(log: Path):
+    batch = decode_batch(log, log.read_bytes())
+
+    assert batch.timestamps[4] == np.datetime64('2023-10-16T20:29:24.700', 'ns')
+    assert batch.timestamps[5] == np.datetime64('2024-03-01T03:29:59.999', 'ns')
+    assert [LEVEL_ORDER[level] for level in batch.levels[:3]] == [LogLevel.trace, LogLevel.debug, LogLevel.info]
+    assert batch.line_numbers.tolist() == [1, 2, 3, 4, 5, 6, 10, 11, 13]
+    assert batch[1].count == 2
+    assert [line.count for line in batch[2:4]] == [3, 4]
+
+
+def test_should_decode_byte_ranges(log: Path):
+    data = log.read_bytes()
+    start = data.index(b'INF')
+    end = data.index(b'NOT')
+
+    lines = list(ColumnarChroniclesSource(log, start=start, end=end, first_line_number=3, chunk_size=50))
+
+    assert [(line.location.line_number, line.location.offset, line.count) for line in lines] == [
+        (3, start, 3), (4, data.index(b'  ERR'), 4), (5, data.index(b'WRN'), 5),
+    ]
+
+
+@pytest.mark.parametrize('predicate', [
+    timestamp_range(parser.parse('2023-10-16 20:29:24.596+00:00'), parser.parse('2023-10-16 20:29:24.700+00:00')),
+    level_in(LogLevel.debug, LogLevel.error),
+    all_of(level_in(LogLevel.warning, LogLevel.error), topic_value('tid', '1')),
+    compile_filter('level>=INF and not timestamp>"2023-10-16 20:29:24.700"'),
+    compile_filter('count>2 or level=TRC'),
+])
+def test_should_filter_batches_as_lines_would_be(log: Path, predicate):
+    expected = [line.count for line in ChroniclesRawSource(MmapLogSource(log), lazy=True) if predicate(line)]
+
+    assert [line.count for line in ColumnarChroniclesSource(log, predicate=predicate)] == expected
+
+
+def test_should_split_batches(log: Path):
+    batches = list(ColumnarChroniclesSource(log).iter_batches(3))
+
+    assert [len(batch) for batch in batches] == [3, 3, 3]
+    assert [line.count for batch in batches for line in batch] == [1, 2, 3, 4, 5, 6, 123456789012345678901234, 12, 14]
@@ -0,0 +1,159 @@
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from logtools.log.sources.input.file_log_source import FileLogSource
+from logtools.log.sources.input.mmap_log_source import MmapLogSource
+from logtools.log.sources.parallel.chunked_file_source import ChunkedChroniclesSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource, LogLevel
+from logtools.log.sources.parse.parse_cache import ParseCache
+from logtools.log.sources.transform.filtered_source import level_in, raw_prefilter
+
+LINES = [
+    'TRC 2023-10-16 20:29:24.595+00:00 Advertising block topics="codex discoveryengine" count=1',
+    'garbage',
+    'DBG 2023-10-16 20:29:24.597+00:00 Provided to nodes topics="codex discovery" tid=1 count=2',
+    '  ERR 2023-10-16 20:29:24.500+00:00 Failed topics="codex discovery" tid=1 count=3',
+    'WRN 2023-10-16 22:29:24.700+02:00 Other timezone topics="codex discovery" tid=1 count=4',
+    'NOT 2023-10-16 17:29:24.700-03:30 No topics count=5',
+    'inf 2023-10-16 20:29:25.000+00:00 Blocé topics="codex répo" count=6',
+]
+
+
+@pytest.fixture
+def log(tmp_path: Path) -> Path:
+    path = tmp_path / 'log.log'
+    path.write_text('\n'.join(LINES) + '\n')
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> ParseCache:
+    return ParseCache(tmp_path / 'cache')
+
+
+def attributes(line):
+    return line.location, line.raw, line.timestamp, line.timestamp.utcoffset(), line.level, line.message, \
+        line.topics, line.count
+
+
+def parse(source, cache=None, lazy=False, **kwargs):
+    return [attributes(line) for line in ChroniclesRawSource(source, lazy=lazy, cache=cache, **kwargs)]
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_should_rebuild_lines_from_the_cache(log: Path, cache: ParseCache, lazy: bool):
+    expected = parse(MmapLogSource(log), lazy=lazy)
+
+    assert parse(MmapLogSource(log), cache, lazy) == expected
+    assert cache.entry(log).exists()
+    assert parse(MmapLogSource(log), cache, lazy) == expected
+
+
+def test_should_skip_lines_without_topics_whether_lazy_eager_or_cached(log: Path, cache: ParseCache):
+    parse(MmapLogSource(log), cache)
+
+    for lines in (parse(MmapLogSource(log)), parse(MmapLogSource(log), lazy=True),
+                  parse(MmapLogSource(log), cache), parse(MmapLogSource(log), cache, lazy=True)):
+        assert [line[-1] for line in lines] == [1, 2, 3, 4, 6]
+
+
+def test_should_rebuild_byte_ranges_from_the_cache(log: Path, cache: ParseCache):
+    parse(MmapLogSource(log), cache)
+    data = log.read_bytes()
+    start, end = data.index(b'DBG'), data.index(b'NOT')
+
+    expected_source = MmapLogSource(log, start, end, first_line_number=3)
+    cached_source = MmapLogSource(log, start, end, first_line_number=3)
+
+    assert parse(cached_source, cache) == parse(expected_source)
+    assert cached_source.lines_read == expected_source.lines_read == 3
+
+
+def test_should_prefilter_cached_lines(log: Path, cache: ParseCache):
+    parse(MmapLogSource(log), cache)
+    prefilter = raw_prefilter(level_in(LogLevel.info, LogLevel.warning))
+
+    # the ERR line is not laid out from its first character, so it gets through the prefilter.
+    assert [line[-1] for line in parse(MmapLogSource(log), cache, prefilter=prefilter)] == [3, 4, 6]
+
+
+def test_should_only_cache_whole_files(log: Path, cache: ParseCache):
+    parse(MmapLogSource(log, start=0, end=10), cache)
+    assert not cache.entry(log).exists()
+
+    for _ in ChroniclesRawSource(MmapLogSource(log), cache=cache):
+        break
+    assert not cache.entry(log).exists()
+
+
+@pytest.mark.parametrize('start', [0, 1])
+def test_should_cache_files_parsed_in_chunks(log: Path, cache: ParseCache, start: int):
+    start = log.read_bytes().index(b'\n') + 1 if start else 0
+    expected = parse(MmapLogSource(log, start=start, first_line_number=2 if start else 1), lazy=True)
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        for _ in range(2):
+            chunked = ChunkedChroniclesSource(log, executor, lazy=True, chunk_size=100, start=start,
+                                              first_line_number=2 if start else 1, cache=cache)
+            assert [attributes(line) for line in chunked] == expected
+            # parts of files are not cached.
+            assert cache.entry(log).exists() == (not start)
+
+    assert parse(MmapLogSource(log), cache, lazy=True) == parse(MmapLogSource(log), lazy=True)
+
+
+def test_should_cache_files_read_through_any_file_source(log: Path, cache: ParseCache):
+    expected = [line[1:] for line in parse(MmapLogSource(log))]
+    source = FileLogSource(log)
+
+    assert [line[1:] for line in parse(source, cache)] == expected
+    assert source.lines_read == len(LINES)
+    assert cache.entry(log).exists()
+    assert [line[1:] for line in parse(FileLogSource(log), cache)] == expected
+
+
+def test_should_not_cache_compressed_files(tmp_path: Path, log: Path, cache: ParseCache):
+    compressed = tmp_path / 'log.log.gz'
+    compressed.write_bytes(gzip.compress(log.read_bytes()))
+
+    assert len(parse(FileLogSource(compressed), cache)) == len(parse(MmapLogSource(log)))
+    assert not cache.entry(compressed).exists()
+
+
+def test_should_not_cache_lines_with_unknown_levels(log: Path, cache: ParseCache):
+    log.write_text('XYZ 2023-10-16 20:29:24.595+00:00 Unknown level tid=1 count=1\n')
+
+    assert len(list(ChroniclesRawSource(MmapLogSource(log), lazy=True, cache=cache))) == 1
+    assert not cache.entry(log).exists()
+
+
+def test_should_discard_entries_of_changed_files(log: Path, cache: ParseCache):
+    parse(MmapLogSource(log), cache)
+    log.write_text(LINES[0] + '\n')
+
+    assert [line[-1] for line in parse(MmapLogSource(log), cache)] == [1]
+    assert [line[-1] for line in parse(MmapLogSource(log), cache)] == [1]
+
+
+def test_should_evict_least_recently_used_entries(tmp_path: Path, log: Path):
+    logs = [log]
+    for i in range(2):
+        logs.append(tmp_path / f'log{i}.log')
+        logs[-1].write_bytes(log.read_bytes())
+
+    cache = ParseCache(tmp_path / 'cache')
+    parse(MmapLogSource(logs[0]), cache)
+    entry_size = cache.entry(logs[0]).stat().st_size
+    cache.max_bytes = 2 * entry_size
+
+    parse(MmapLogSource(logs[1]), cache)
+    # entries are ordered by their last use, which is only recorded to the filesystem's timestamp resolution.
+    os.utime(cache.entry(logs[0]), ns=(0, 0))
+    os.utime(cache.entry(logs[1]), ns=(1, 1))
+    parse(MmapLogSource(logs[2]), cache)
+
+    assert [cache.entry(path).exists() for path in logs] == [False, True, True]
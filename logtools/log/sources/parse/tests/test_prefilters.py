@@ -0,0 +1,64 @@
+from pathlib import Path
+
+import pytest
+from dateutil import parser
+
+from logtools.log.sources.input.mmap_log_source import MmapLogSource
+from logtools.log.sources.input.string_log_source import StringLogSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource, LogLevel
+from logtools.log.sources.parse.prefilters import TimestampPrefilter, LevelPrefilter, SubstringPrefilter, \
+    AllPrefilter
+from logtools.log.sources.transform.filtered_source import timestamp_range, level_in, topic_value, raw_prefilter
+
+LINES = [
+    'TRC 2023-10-16 20:29:24.595+00:00 Advertising block topics="codex discoveryengine" count=1',
+    'DBG 2023-10-16 20:29:24.597+00:00 Provided to nodes topics="codex discovery" tid=1 count=2',
+    'INF 2023-10-16 20:29:24.646+00:00 Retrieved record topics="codex repostore" tid=2 count=3',
+    # not laid out from the first character, but still parseable.
+    '  ERR 2023-10-16 20:29:24.500+00:00 Failed topics="codex discovery" tid=1 count=4',
+    'WRN 2023-10-16 22:29:24.700+02:00 Other timezone topics="codex discovery" tid=1 count=5',
+]
+
+PREDICATES = [
+    timestamp_range(parser.parse('2023-10-16 20:29:24.596+00:00'), parser.parse('2023-10-16 20:29:24.700+00:00')),
+    timestamp_range(parser.parse('2023-10-16 22:29:24.5961+02:00'), parser.parse('2023-10-16 20:29:24.6459+00:00')),
+    level_in(LogLevel.debug, LogLevel.error),
+    topic_value('tid', '1'),
+    topic_value('topics', 'codex discovery'),
+]
+
+
+@pytest.mark.parametrize('predicate', PREDICATES)
+def test_should_only_reject_lines_which_fail_the_predicate(predicate):
+    prefilter = raw_prefilter(predicate)
+    lines = list(ChroniclesRawSource(StringLogSource('\n'.join(LINES))))
+
+    assert prefilter is not None
+    for line in lines:
+        assert prefilter.accepts(line.raw) or not predicate(line)
+        assert prefilter.accepts_bytes(line.raw.encode()) == prefilter.accepts(line.raw)
+
+
+def test_should_compare_timestamps_as_text():
+    prefilter = TimestampPrefilter(parser.parse('2023-10-16 20:29:24.5961+00:00'), None)
+
+    assert [prefilter.accepts(line) for line in LINES] == [False, True, True, True, True]
+
+
+def test_should_reject_levels_and_missing_substrings():
+    assert [LevelPrefilter(['inf', 'WRN']).accepts(line) for line in LINES] == [False, False, True, True, True]
+    assert [SubstringPrefilter(['tid=', 'repostore']).accepts(line) for line in LINES] == \
+           [False, False, True, False, False]
+    assert [AllPrefilter(LevelPrefilter(['DBG', 'INF']), SubstringPrefilter(['tid='])).accepts(line)
+            for line in LINES] == [False, True, True, True, True]
+
+
+def test_should_skip_parsing_lines_rejected_by_the_prefilter(tmp_path: Path):
+    log = tmp_path / 'log.log'
+    log.write_text('\n'.join(LINES) + '\n')
+    predicate = level_in(LogLevel.debug, LogLevel.info)
+
+    for lazy in (False, True):
+        for source in (StringLogSource('\n'.join(LINES)), MmapLogSource(log)):
+            lines = ChroniclesRawSource(source, lazy=lazy, prefilter=raw_prefilter(predicate))
+            assert [line.count for line in lines] == [2, 3, 4, 5]
@@ -0,0 +1,78 @@
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from dateutil import parser
+
+from logtools.log.sources.input.mmap_log_source import MmapLogSource
+from logtools.log.sources.parse import time_bounds as bounds
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+from logtools.log.sources.parse.time_bounds import time_bounds, last_timestamp, bisect_range
+from logtools.log.sources.parse.timestamp_index import ByteRange
+
+SAMPLE_LOG = Path(__file__).parents[2] / 'input' / 'tests' / 'sample.log'
+
+START = parser.parse('2023-10-16 20:29:24.000+00:00')
+
+
+def test_should_find_time_bounds_of_log_file():
+    assert time_bounds(SAMPLE_LOG) == (parser.parse('2023-10-16 00:00:00.000+00:00'),
+                                       parser.parse('2023-10-16 00:00:00.004+00:00'))
+
+
+def test_should_find_last_timestamp_across_block_boundaries(tmp_path, monkeypatch):
+    monkeypatch.setattr(bounds, '_BLOCK_SIZE', 16)
+    log = tmp_path / 'log'
+    log.write_text(SAMPLE_LOG.read_text() + 'not a log line\n\n')
+
+    assert last_timestamp(log) == parser.parse('2023-10-16 00:00:00.004+00:00')
+
+
+def test_should_return_none_for_files_without_log_lines(tmp_path):
+    log = tmp_path / 'log'
+    log.write_text('not a log line\n')
+
+    assert time_bounds(log) is None
+    assert last_timestamp(log) is None
+
+
+@pytest.fixture
+def ordered_log(tmp_path) -> Path:
+    log = tmp_path / 'log'
+    log.write_text('not a log line\n' + ''.join(
+        f'TRC {(START + timedelta(milliseconds=i // 3)).isoformat(sep=" ", timespec="milliseconds")} '
+        f'Advertising block topics="codex discoveryengine" count={i}\n' + ('garbage\n' if i % 7 == 0 else '')
+        for i in range(1, 301)
+    ))
+    return log
+
+
+@pytest.mark.parametrize('start,end', [
+    (None, None),
+    (0, 0),
+    (10, 20),
+    (-5, 3),
+    (33, 33),
+    (99, None),
+    (None, 50),
+    (150, 200),
+    (20, 10),
+])
+def test_should_bisect_time_ranges_down_to_the_lines_they_contain(ordered_log, start, end):
+    start = START + timedelta(milliseconds=start) if start is not None else None
+    end = START + timedelta(milliseconds=end) if end is not None else None
+
+    byte_range = bisect_range(ordered_log, start, end)
+    lines = list(ChroniclesRawSource(MmapLogSource(ordered_log, byte_range.start, byte_range.end)))
+
+    assert [line.count for line in lines] == [
+        line.count for line in ChroniclesRawSource(MmapLogSource(ordered_log))
+        if (start is None or line.timestamp >= start) and (end is None or line.timestamp <= end)
+    ]
+
+
+def test_should_bisect_empty_files(tmp_path):
+    log = tmp_path / 'log'
+    log.touch()
+
+    assert bisect_range(log, START, START) == ByteRange()
@@ -0,0 +1,104 @@
+import os
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from dateutil import parser
+
+from logtools.log.sources.input.mmap_log_source import MmapLogSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+from logtools.log.sources.parse.timestamp_index import TimestampIndex, ByteRange
+
+START = parser.parse('2023-10-16 20:29:24.000+00:00')
+
+
+@pytest.fixture
+def log(tmp_path) -> Path:
+    path = tmp_path / 'log.log'
+    path.write_text('not a log line\n' + ''.join(
+        f'TRC {(START + timedelta(milliseconds=i // 2)).isoformat(sep=" ", timespec="milliseconds")} '
+        f'Advertising block topics="codex discoveryengine" count={i}\n'
+        for i in range(1, 101)
+    ))
+    return path
+
+
+def lines_in(log: Path, byte_range: ByteRange):
+    return list(ChroniclesRawSource(
+        MmapLogSource(log, byte_range.start, byte_range.end, byte_range.first_line_number)))
+
+
+@pytest.mark.parametrize('start,end', [
+    (None, None),
+    (10, 20),
+    (0, 0),
+    (-5, 3),
+    (47, 80),
+    (49, None),
+    (None, 12),
+])
+def test_should_narrow_time_ranges_to_byte_ranges_containing_all_their_lines(log, start, end):
+    start = START + timedelta(milliseconds=start) if start is not None else None
+    end = START + timedelta(milliseconds=end) if end is not None else None
+
+    index = TimestampIndex.build(log, interval=256)
+    byte_range = index.byte_range(start, end)
+    expected = [
+        (line.location.line_number, line.count) for line in ChroniclesRawSource(MmapLogSource(log))
+        if (start is None or line.timestamp >= start) and (end is None or line.timestamp <= end)
+    ]
+    actual = [
+        (line.location.line_number, line.count) for line in lines_in(log, byte_range)
+        if (start is None or line.timestamp >= start) and (end is None or line.timestamp <= end)
+    ]
+
+    assert len(index.timestamps) > 10
+    assert actual == expected
+
+
+def test_should_skip_lines_outside_of_the_time_range(log):
+    byte_range = TimestampIndex.build(log, interval=256).byte_range(
+        START + timedelta(milliseconds=20), START + timedelta(milliseconds=25))
+
+    assert 0 < byte_range.start
+    assert byte_range.end is not None and byte_range.end < log.stat().st_size
+    assert len(lines_in(log, byte_range)) < 40
+
+
+def test_should_save_index_next_to_log_and_reuse_it(log, monkeypatch):
+    index = TimestampIndex.for_file(log, interval=256)
+
+    assert TimestampIndex.sidecar(log).exists()
+
+    def build(*_):
+        raise AssertionError('Index should not have been rebuilt')
+
+    with monkeypatch.context() as patched:
+        patched.setattr(TimestampIndex, 'build', build)
+        reloaded = TimestampIndex.for_file(log, interval=256)
+
+    assert reloaded.timestamps == index.timestamps
+    assert reloaded.offsets == index.offsets
+    assert reloaded.line_numbers == index.line_numbers
+
+
+def test_should_rebuild_index_when_log_changes(log):
+    index = TimestampIndex.for_file(log, interval=256)
+
+    with log.open('a') as appended:
+        appended.write('TRC 2023-10-16 20:29:25.000+00:00 Advertising block topics="codex" count=101\n')
+    os.utime(log, ns=(index.mtime_ns + 1_000_000, index.mtime_ns + 1_000_000))
+
+    rebuilt = TimestampIndex.for_file(log, interval=256)
+
+    assert rebuilt.size == log.stat().st_size
+    assert [line.count for line in lines_in(log, rebuilt.byte_range(START + timedelta(seconds=1)))][-1] == 101
+
+
+def test_should_ignore_corrupted_sidecars(log):
+    TimestampIndex.sidecar(log).write_bytes(b'garbage')
+
+    index = TimestampIndex.for_file(log, interval=256)
+
+    assert len(index.timestamps) > 10
+    assert TimestampIndex.load(TimestampIndex.sidecar(log)) is not None
@@ -0,0 +1,125 @@
+import random
+import re
+import string
+import timeit
+
+from logtools.log.sources.parse.topics import bytes_end_with_topics, ends_with_topics, find_topics, \
+    split_topics, iter_topics, topics_start
+
+# These are the regular expressions which the scanners replaced, and which we use as a reference for well-formed lines.
+_TOPICS = re.compile(r'((\w+=("[^"]+"|\S+) )+)?\w+=("(\\"|[^"])+"|\S+)$')
+_TOPICS_KV = re.compile(r'(?P<key>\w+)=(?P<value>"(?:\\"|[^"])+"|\S+)')
+
+_WORD = string.ascii_letters + string.digits + ".,:;!?*()-'/"
+_KEY = string.ascii_letters + string.digits + '_'
+_BARE = string.ascii_letters + string.digits + '*:/.-_='
+_QUOTED = string.ascii_letters + string.digits + " *:/.-_='"
+
+
+def _text(rng: random.Random, alphabet: str, min_length: int = 1, max_length: int = 12) -> str:
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(min_length, max_length)))
+
+
+def _value(rng: random.Random, escapes: bool) -> str:
+    if rng.random() < 0.5:
+        return _text(rng, _BARE)
+
+    parts = [_text(rng, _QUOTED)]
+    # the original regex only understood escaped quotes in the last value.
+    while escapes and rng.random() < 0.5:
+        parts.append(_text(rng, _QUOTED))
+    return '"' + '\\"'.join(parts) + '"'
+
+
+def _well_formed_body(rng: random.Random) -> str:
+    message = ' '.join(_text(rng, _WORD) for _ in range(rng.randint(1, 6)))
+    tokens = [f'{_text(rng, _KEY)}={_value(rng, escapes=False)}' for _ in range(rng.randint(0, 7))]
+    tokens.append(f'{_text(rng, _KEY)}={_value(rng, escapes=True)}')
+    return message + ' ' * rng.randint(1, 20) + ' '.join(tokens)
+
+
+def test_should_split_topics_from_message():
+    assert split_topics(
+        'Sending want list to peer                  topics="codex blockexcnetwork" tid=1 peer=16U*7mogoM'
+    ) == ('Sending want list to peer', 'topics="codex blockexcnetwork" tid=1 peer=16U*7mogoM')
+
+
+def test_should_not_split_bodies_without_topics():
+    assert split_topics('A message without topics') is None
+    assert split_topics('A message with a = sign') is None
+
+
+def test_should_tokenize_escaped_quotes_in_any_value():
+    topics = 'topics="codex node" config="some \\"quoted\\" string" tid=1'
+
+    assert split_topics(f'Starting node {topics}') == ('Starting node', topics)
+    assert list(iter_topics(topics)) == [
+        ('topics', '"codex node"'),
+        ('config', '"some \\"quoted\\" string"'),
+        ('tid', '1'),
+    ]
+
+
+def test_should_skip_tokens_which_cannot_be_parsed():
+    assert list(iter_topics('tid=1 garbage peer=16U*7mogoM')) == [('tid', '1'), ('peer', '16U*7mogoM')]
+
+
+def test_should_be_equivalent_to_original_regexes_on_well_formed_lines():
+    rng = random.Random(1234)
+    for _ in range(5000):
+        body = _well_formed_body(rng)
+        expected = _TOPICS.search(body)
+
+        assert expected is not None
+        assert topics_start(body) == expected.start(), body
+        assert list(iter_topics(expected.group())) == _TOPICS_KV.findall(expected.group()), body
+
+
+def test_should_tell_whether_bodies_end_with_topics_as_topics_start_does():
+    rng = random.Random(2468)
+    bodies = ['', 'A message without topics', 'A message with a = sign', 'Quoted "value"', 'Blocé topics="répo"',
+              'tab topic=a\tb', 'key=é', 'spaced topics="codex node"', 'unclosed topics="codex']
+    bodies += [_well_formed_body(rng)[:rng.randint(0, 80)] for _ in range(2000)]
+
+    for body in bodies:
+        expected = topics_start(body) != -1
+        assert ends_with_topics(body) == expected, body
+        assert bytes_end_with_topics(body.encode()) == expected, body
+        assert bytes_end_with_topics(b'x ' + body.encode() + b' count=1', 2, 2 + len(body.encode())) == expected, body
+
+
+def test_should_find_the_last_occurrence_of_topics():
+    topics = 'topics="codex node" tid=1 peer=a tid=2 config="x \\"tid=3\\""'
+
+    assert find_topics(topics, ['tid', 'peer', 'missing']) == {'tid': '2', 'peer': 'a'}
+    assert find_topics(topics, ['config']) == {'config': '"x \\"tid=3\\""'}
+    assert find_topics(topics, []) == {}
+    # tokens which cannot be parsed make for a scan left to right.
+    assert find_topics('tid=1 garbage peer=a tid=2', ['tid', 'peer', 'missing']) == {'tid': '2', 'peer': 'a'}
+
+
+def test_should_find_the_same_topics_as_iter_topics():
+    rng = random.Random(4321)
+    for _ in range(2000):
+        topics = split_topics(_well_formed_body(rng))[1]  # type: ignore[index]
+        expected = dict(iter_topics(topics))
+        keys = [key for key in expected if rng.random() < 0.5] + ['missing']
+
+        assert find_topics(topics, keys) == {key: expected[key] for key in keys if key in expected}, topics
+
+
+def _scan_time(tokens: int) -> float:
+    body = 'msg ' + ' '.join(f'k{i}="v{i}"' for i in range(tokens)) + ' "x'
+
+    def scan():
+        assert topics_start(body) == -1
+        assert len(list(iter_topics(body))) == tokens
+
+    return min(timeit.repeat(scan, number=1, repeat=3))
+
+
+def test_should_scan_pathological_lines_in_linear_time():
+    # a long chain of quoted values which fails to match at the very end made the original regex backtrack
+    # exponentially. Scanning 4 times as many tokens should take about 4 times as long, and far less than the 16
+    # times a quadratic scan would take.
+    assert _scan_time(80_000) < 8 * _scan_time(20_000)
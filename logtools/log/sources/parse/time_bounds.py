@@ -0,0 +1,216 @@
+"""
+Cheap lookups of the time span covered by a Chronicles log file, and of the part of a time-ordered log file covering a
+given time range. These only read a handful of lines at selected positions in the file.
+"""
+import json
+import mmap
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from logtools.log.sources.input.compressed import open_binary, is_compressed, is_gzip, GzipCheckpoints, \
+    open_binary_at
+from logtools.log.sources.parse.chronicles_raw_source import line_timestamp
+from logtools.log.sources.parse.timestamp_index import ByteRange, TimestampIndex
+
+_BLOCK_SIZE = 64 * 1024
+
+TIME_BOUNDS_CACHE = '.logtools-time-bounds.json'
+
+
+def first_timestamp(path: Path) -> Optional[datetime]:
+    """Returns the timestamp of the first parseable line in a log file, or `None` if there is no such line."""
+    with open_binary(path) as log:
+        for raw in log:
+            timestamp = line_timestamp(raw.decode('utf-8', errors='replace'))
+            if timestamp is not None:
+                return timestamp
+    return None
+
+
+def last_timestamp(path: Path) -> Optional[datetime]:
+    """
+    Returns the timestamp of the last parseable line in a log file, or `None` if there is no such line. The file is
+    read backwards in blocks, so this costs the same regardless of the size of the file.
+
+    Compressed files cannot be read backwards, and are instead read from their last gzip checkpoint, if any, or from
+    the start.
+    """
+    if is_compressed(path):
+        return _last_compressed_timestamp(path)
+
+    with path.open('rb') as log:
+        end = log.seek(0, 2)
+        # a partial line carried over from the block after the one being read.
+        tail = b''
+        while end > 0:
+            start = max(0, end - _BLOCK_SIZE)
+            log.seek(start)
+            lines = (log.read(end - start) + tail).split(b'\n')
+            # unless we are at the start of the file, the first line might be cut short.
+            tail = lines.pop(0) if start > 0 else b''
+            for raw in reversed(lines):
+                timestamp = line_timestamp(raw.decode('utf-8', errors='replace'))
+                if timestamp is not None:
+                    return timestamp
+            end = start
+    return None
+
+
+def _last_compressed_timestamp(path: Path) -> Optional[datetime]:
+    checkpoints = GzipCheckpoints.for_file(path) if is_gzip(path) else None
+    # lines in the last checkpoint might all be unparseable, in which case we need to move back to the previous one.
+    for checkpoint in reversed(checkpoints.uncompressed if checkpoints is not None else [0]):
+        last = None
+        with open_binary_at(path, checkpoint) as log:
+            if checkpoint > 0:
+                log.readline()
+            for raw in log:
+                last = line_timestamp(raw.decode('utf-8', errors='replace')) or last
+        if last is not None:
+            return last
+    return None
+
+
+def time_bounds(path: Path) -> Optional[Tuple[datetime, datetime]]:
+    """Returns the timestamps of the first and last lines in a log file, or `None` if it has no parseable lines."""
+    first = first_timestamp(path)
+    if first is None:
+        return None
+    last = last_timestamp(path)
+    assert last is not None
+    return first, last
+
+
+class TimeBoundsCache:
+    """
+    The time bounds of the log files in a directory, cached in a small JSON file in that directory so that later runs
+    can tell which files fall in a time range without opening them. Entries are keyed by file name, and are discarded
+    once the size or modification time of their file changes (e.g. because it is still being written to).
+    """
+
+    def __init__(self, path: Path, entries: Optional[Dict[str, dict]] = None):
+        self.path = path
+        self.entries = entries if entries is not None else {}
+        self.dirty = False
+
+    @staticmethod
+    def for_directory(directory: Path) -> 'TimeBoundsCache':
+        return TimeBoundsCache.load(directory / TIME_BOUNDS_CACHE)
+
+    @staticmethod
+    def load(path: Path) -> 'TimeBoundsCache':
+        """Loads a cache from its file, starting over with an empty cache if the file is missing or unreadable."""
+        try:
+            entries = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            entries = None
+        return TimeBoundsCache(path, entries if isinstance(entries, dict) else None)
+
+    def bounds(self, log: Path) -> Optional[Tuple[datetime, datetime]]:
+        """Returns the time bounds of a log file in the directory, computing (and caching) them if needed."""
+        stat = log.stat()
+        entry = self.entries.get(log.name)
+        if entry is None or entry.get('size') != stat.st_size or entry.get('mtime_ns') != stat.st_mtime_ns:
+            bounds = time_bounds(log)
+            entry = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'bounds': [bound.isoformat() for bound in bounds] if bounds is not None else None,
+            }
+            self.entries[log.name] = entry
+            self.dirty = True
+
+        if entry['bounds'] is None:
+            return None
+        first, last = entry['bounds']
+        return datetime.fromisoformat(first), datetime.fromisoformat(last)
+
+    def save(self):
+        """Saves the cache if it changed since it was loaded. The file is replaced atomically."""
+        if not self.dirty:
+            return
+        temporary = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        try:
+            temporary.write_text(json.dumps(self.entries), encoding='utf-8')
+            os.replace(temporary, self.path)
+            self.dirty = False
+        finally:
+            temporary.unlink(missing_ok=True)
+
+
+def _line_start(mapped: mmap.mmap, position: int) -> int:
+    """Returns the offset of the first line starting at or after `position`."""
+    if position == 0:
+        return 0
+    newline = mapped.find(b'\n', position - 1)
+    return len(mapped) if newline == -1 else newline + 1
+
+
+def _first_timestamp_after(mapped: mmap.mmap, position: int) -> Tuple[Optional[datetime], int]:
+    """
+    Returns the timestamp of the first parseable line starting at or after `position` (or `None` if there is none),
+    and the offset right past that line.
+    """
+    offset = _line_start(mapped, position)
+    mapped.seek(offset)
+    while offset < len(mapped):
+        raw = mapped.readline()
+        offset += len(raw)
+        timestamp = line_timestamp(raw.decode('utf-8', errors='replace'))
+        if timestamp is not None:
+            return timestamp, offset
+    return None, offset
+
+
+def _bisect(mapped: mmap.mmap, timestamp: datetime, inclusive: bool) -> int:
+    """
+    Returns the offset of the first line of a time-ordered file whose timestamp is past `timestamp` (or equal to it,
+    if `inclusive`), or the size of the file if there is no such line.
+    """
+    low, high = 0, len(mapped)
+    while low < high:
+        middle = (low + high) // 2
+        found, past_line = _first_timestamp_after(mapped, middle)
+        if found is None or found > timestamp or (inclusive and found == timestamp):
+            high = middle
+        else:
+            # every line up to the one we found is before the timestamp.
+            low = past_line
+    return _line_start(mapped, low)
+
+
+def bisect_range(path: Path, start: Optional[datetime], end: Optional[datetime]) -> ByteRange:
+    """
+    Narrows the time range [`start`, `end`] down to the byte range of a time-ordered log file which holds the lines in
+    that range, by binary search over byte offsets. This takes a few dozen short reads however large the file is.
+
+    Unlike with a :class:`TimestampIndex`, the line number of the first line in the range is unknown without reading
+    the file up to it, so lines get numbered from the start of the range. Compressed files cannot be bisected.
+    """
+    if is_compressed(path):
+        raise ValueError(f'Cannot bisect compressed file {path}')
+
+    size = path.stat().st_size
+    if size == 0:
+        return ByteRange()
+
+    with path.open('rb') as log, mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        range_start = _bisect(mapped, start, inclusive=True) if start is not None else 0
+        range_end = _bisect(mapped, end, inclusive=False) if end is not None else size
+
+    return ByteRange(range_start, range_end if range_end < size else None)
+
+
+def seek_range(path: Path, start: Optional[datetime], end: Optional[datetime], method: str) -> ByteRange:
+    """
+    Narrows a time range down to a byte range of a time-ordered log file, by either `'bisect'`-ing the file or by
+    using its `'index'`. Compressed files always use their index, as every probe of a binary search would need to
+    decompress part of the file.
+    """
+    if method == 'index' or is_compressed(path):
+        return TimestampIndex.for_file(path).byte_range(start, end)
+    if method == 'bisect':
+        return bisect_range(path, start, end)
+    raise ValueError(f'Unknown seek method {method}')
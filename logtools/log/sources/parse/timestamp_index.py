@@ -0,0 +1,204 @@
+"""
+Sparse timestamp indexes for time-ordered Chronicles log files, stored in sidecar files next to the logs they index.
+An index samples the first parseable line after every `interval` bytes of the log, recording its timestamp, byte offset
+and line number, which is enough to narrow a time range down to a byte range without reading the rest of the file.
+"""
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from logtools.log.sources.input.compressed import GzipCheckpoints, is_compressed, is_gzip, open_binary
+from logtools.log.sources.parse.chronicles_raw_source import line_timestamp
+from logtools.log.sources.transform.merged_source import epoch_nanos
+
+DEFAULT_INTERVAL = 1024 * 1024
+
+SIDECAR_SUFFIX = '.tsidx'
+
+# magic, version, size and mtime (in nanoseconds) of the indexed file, sampling interval, number of samples.
+_HEADER = struct.Struct('<4sIqqqq')
+_MAGIC = b'LTIX'
+_VERSION = 1
+
+
+@dataclass(frozen=True)
+class ByteRange:
+    """A line-aligned byte range of a log file, along with the line number of its first line."""
+    start: int = 0
+    end: Optional[int] = None
+    first_line_number: int = 1
+
+
+class TimestampIndex:
+    """
+    Sparse index of the timestamps in a time-ordered log file. Samples are kept in three parallel arrays of
+    timestamps (as epoch nanoseconds), byte offsets and line numbers.
+    """
+
+    def __init__(self, size: int, mtime_ns: int, interval: int, timestamps: array, offsets: array,
+                 line_numbers: array):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.interval = interval
+        self.timestamps = timestamps
+        self.offsets = offsets
+        self.line_numbers = line_numbers
+
+    @staticmethod
+    def sidecar(path: Path) -> Path:
+        return path.with_name(path.name + SIDECAR_SUFFIX)
+
+    @staticmethod
+    def for_file(path: Path, interval: int = DEFAULT_INTERVAL) -> 'TimestampIndex':
+        """
+        Loads the sidecar index of a log file, or builds it (and attempts to save it) if it is missing or out of date
+        with respect to the size and modification time of the log. Indexes are still returned when they cannot be
+        saved, e.g. because the directory of the log is read-only.
+        """
+        stat = path.stat()
+        sidecar = TimestampIndex.sidecar(path)
+        index = TimestampIndex.load(sidecar)
+        if index is not None and index.size == stat.st_size and index.mtime_ns == stat.st_mtime_ns and \
+                index.interval == interval:
+            return index
+
+        index = TimestampIndex.build(path, interval)
+        try:
+            index.save(sidecar)
+        except OSError:
+            pass
+        return index
+
+    @staticmethod
+    def build(path: Path, interval: int = DEFAULT_INTERVAL) -> 'TimestampIndex':
+        """Builds the index of a log file by sampling the first parseable line after every `interval` bytes."""
+        stat = path.stat()
+        timestamps, offsets, line_numbers = array('q'), array('q'), array('q')
+        index = TimestampIndex(stat.st_size, stat.st_mtime_ns, interval, timestamps, offsets, line_numbers)
+        if stat.st_size == 0:
+            return index
+
+        if is_compressed(path):
+            TimestampIndex._sample_stream(path, index)
+            return index
+
+        with path.open('rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            size = len(mapped)
+            # offset and line number of the last position up to which newlines were counted.
+            counted, line_number = 0, 1
+            boundary = 0
+            while boundary < size:
+                # the first line starting at or after the boundary.
+                offset = 0 if boundary == 0 else mapped.find(b'\n', boundary - 1) + 1
+                if offset == 0 and boundary != 0:
+                    break
+
+                line_number += mapped[counted:offset].count(b'\n')
+                counted = offset
+
+                mapped.seek(offset)
+                next_boundary = boundary + interval
+                while offset < min(next_boundary, size):
+                    raw = mapped.readline()
+                    timestamp = line_timestamp(raw.decode('utf-8', errors='replace'))
+                    if timestamp is not None:
+                        timestamps.append(epoch_nanos(timestamp))
+                        offsets.append(offset)
+                        line_numbers.append(line_number + mapped[counted:offset].count(b'\n'))
+                        break
+                    offset += len(raw)
+
+                boundary = next_boundary
+
+        return index
+
+    @staticmethod
+    def _sample_stream(path: Path, index: 'TimestampIndex'):
+        """
+        Samples a compressed log file, which cannot be mapped, by decompressing it line by line. Gzip files also get
+        their checkpoints saved along the way, so that seeking to a sample does not decompress the file from the start.
+        """
+        if is_gzip(path):
+            GzipCheckpoints.for_file(path)
+
+        with open_binary(path) as log:
+            offset, line_number = 0, 1
+            boundary = 0
+            for raw in log:
+                if offset >= boundary:
+                    timestamp = line_timestamp(raw.decode('utf-8', errors='replace'))
+                    if timestamp is not None:
+                        index.timestamps.append(epoch_nanos(timestamp))
+                        index.offsets.append(offset)
+                        index.line_numbers.append(line_number)
+                        # the next sample is the first line past the boundary following this line.
+                        boundary = (offset // index.interval + 1) * index.interval
+                offset += len(raw)
+                line_number += 1
+
+    @staticmethod
+    def load(sidecar: Path) -> Optional['TimestampIndex']:
+        """Loads an index from a sidecar file, returning `None` if it is missing or unreadable."""
+        try:
+            contents = sidecar.read_bytes()
+            magic, version, size, mtime_ns, interval, count = _HEADER.unpack_from(contents)
+        except (OSError, struct.error):
+            return None
+
+        if magic != _MAGIC or version != _VERSION or len(contents) != _HEADER.size + 3 * 8 * count:
+            return None
+
+        columns = []
+        for i in range(3):
+            column = array('q')
+            start = _HEADER.size + i * 8 * count
+            column.frombytes(contents[start:start + 8 * count])
+            columns.append(column)
+
+        return TimestampIndex(size, mtime_ns, interval, *columns)
+
+    def save(self, sidecar: Path):
+        """
+        Saves the index to a sidecar file. The file is replaced atomically, so concurrent readers never see a partially
+        written index.
+        """
+        temporary = sidecar.with_name(f'{sidecar.name}.{os.getpid()}.tmp')
+        try:
+            with temporary.open('wb') as output:
+                output.write(_HEADER.pack(_MAGIC, _VERSION, self.size, self.mtime_ns, self.interval,
+                                          len(self.timestamps)))
+                for column in (self.timestamps, self.offsets, self.line_numbers):
+                    output.write(column.tobytes())
+            os.replace(temporary, sidecar)
+        finally:
+            temporary.unlink(missing_ok=True)
+
+    def byte_range(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> ByteRange:
+        """
+        Narrows the time range [`start`, `end`] down to a byte range of the indexed file which contains every line in
+        the time range. The byte range may contain lines outside the time range too, so lines still need filtering.
+        """
+        first = -1
+        if start is not None:
+            # samples before the last one preceding `start` are followed by lines older than `start`.
+            first = bisect_left(self.timestamps, epoch_nanos(start)) - 1
+
+        last = len(self.timestamps)
+        if end is not None:
+            # lines from the first sample past `end` onwards are all past `end`.
+            last = bisect_right(self.timestamps, epoch_nanos(end))
+
+        if first < 0:
+            range_start, first_line_number = 0, 1
+        else:
+            range_start, first_line_number = self.offsets[first], self.line_numbers[first]
+
+        range_end = self.offsets[last] if last < len(self.offsets) else None
+        return ByteRange(range_start, range_end, first_line_number)
+
@@ -0,0 +1,185 @@
+"""
+Hand-written scanners for the topics section of Chronicles log lines. Topics are a chain of space-separated
+`key=value` pairs at the end of a line, where values are either bare (`tid=1`) or quoted, possibly containing escaped
+quotes (`topics="codex node"`, `config="a \\"quoted\\" string"`).
+
+Both scanners run in linear time on the length of their input: each scan moves in a single direction, and quote
+searches are cached so that no part of the input gets rescanned when a token turns out to be invalid. This is unlike
+the regular expressions they replace, which backtracked exponentially on long chains that failed to match at the end.
+"""
+import re
+from typing import Collection, Dict, Iterator, Tuple, Optional
+
+_KEY = re.compile(r'\w+')
+
+_BARE_TOKEN = re.compile(r'\w+=\S+')
+
+# The same expression, restricted to ASCII bytes.
+_ASCII_BARE_TOKEN = re.compile(rb'\w+=[\x00-\x08\x0e-\x1b!-\x7f]+')
+
+
+def _closing_quote(string: str, start: int) -> int:
+    """Returns the position of the first unescaped quote at or after `start`, or -1 if there is none."""
+    quote = string.find('"', start)
+    while quote != -1 and string[quote - 1] == '\\':
+        quote = string.find('"', quote + 1)
+    return quote
+
+
+class _QuotedValues:
+    """
+    Locates quoted values right to left. Both the search for an opening `="` and the search for its closing quote are
+    cached, so a sequence of lookups with non-increasing ends examines every character a bounded number of times.
+    """
+
+    def __init__(self, body: str):
+        self.body = body
+        self._opening: Optional[int] = None
+        self._closing = -1
+
+    def starting_before(self, end: int) -> Tuple[int, int]:
+        """Returns the last `="` ending before `end` and the closing quote of the value it opens (or -1s)."""
+        if self._opening is None or self._opening + 2 > end:
+            self._opening = self.body.rfind('="', 0, end)
+            self._closing = _closing_quote(self.body, self._opening + 2) if self._opening != -1 else -1
+        return self._opening, self._closing
+
+
+def _token_start(body: str, end: int, quoted: _QuotedValues) -> int:
+    """Returns the start of the `key=value` token ending at `end`, or -1 if there is no such token."""
+    if body[end - 1] == '"':
+        opening, closing = quoted.starting_before(end - 1)
+        # closing quotes must be preceded by at least one character of content.
+        if opening != -1 and closing == end - 1 and closing > opening + 2:
+            key_start = body.rfind(' ', 0, opening) + 1
+            if _KEY.fullmatch(body, key_start, opening):
+                return key_start
+
+    start = body.rfind(' ', 0, end) + 1
+    return start if _BARE_TOKEN.fullmatch(body, start, end) else -1
+
+
+def topics_start(body: str) -> int:
+    """
+    Returns the position at which the topics start in the body (message and topics) of a Chronicles log line, or -1
+    if the body does not end with topics. The body is scanned once, right to left, and only over the topics.
+    """
+    quoted = _QuotedValues(body)
+    start = -1
+    end = len(body)
+    while end > 0:
+        token_start = _token_start(body, end, quoted)
+        if token_start == -1:
+            break
+
+        start = token_start
+        # tokens are separated by exactly one space.
+        end = token_start - 1
+        if end <= 0 or body[end] != ' ':
+            break
+
+    return start
+
+
+def ends_with_topics(body: str) -> bool:
+    """
+    Tells whether the body of a Chronicles log line ends with topics, as :func:`topics_start` would, but only looking
+    at the last topic.
+    """
+    if _BARE_TOKEN.fullmatch(body, body.rfind(' ') + 1):
+        return True
+    return body.endswith('"') and _token_start(body, len(body), _QuotedValues(body)) != -1
+
+
+def bytes_end_with_topics(data: bytes, start: int = 0, end: Optional[int] = None) -> bool:
+    """
+    :func:`ends_with_topics` for the undecoded body of a line, held in `data` from `start` to `end`. Bodies only get
+    decoded unless their last topic is a bare value in ASCII.
+    """
+    end = len(data) if end is None else end
+    if _ASCII_BARE_TOKEN.fullmatch(data, max(data.rfind(b' ', start, end) + 1, start), end):
+        return True
+    return ends_with_topics(data[start:end].decode('utf-8', errors='replace'))
+
+
+def split_topics(body: str) -> Optional[Tuple[str, str]]:
+    """Splits the body of a Chronicles log line into its message and its topics."""
+    start = topics_start(body)
+    if start == -1:
+        return None
+
+    return body[:start].strip(), body[start:]
+
+
+def iter_topics(topics: str) -> Iterator[Tuple[str, str]]:
+    """
+    Iterates over the `key=value` pairs in the topics of a Chronicles log line, left to right. Tokens which cannot be
+    parsed are skipped.
+    """
+    length = len(topics)
+    closing: Optional[int] = None
+    position = 0
+    while position < length:
+        key = _KEY.match(topics, position)
+        separator = key.end() if key else -1
+        if separator != -1 and separator < length - 1 and topics[separator] == '=':
+            value_start = separator + 1
+            value_end = -1
+
+            if topics[value_start] == '"':
+                # the closing quote is the first unescaped one after at least one character of content. Positions only
+                # move forward, so a previous search which ended past our start can be reused.
+                if closing is None or closing != -1 and closing < value_start + 2:
+                    closing = _closing_quote(topics, value_start + 2)
+                if closing != -1 and (closing == length - 1 or topics[closing + 1] == ' '):
+                    value_end = closing + 1
+
+            if value_end == -1:
+                # bare values (and quoted values which are not well-formed) extend until the next space.
+                value_end = topics.find(' ', value_start)
+                value_end = length if value_end == -1 else value_end
+
+            if value_end > value_start:
+                yield topics[position:separator], topics[value_start:value_end]
+                position = value_end + 1
+                continue
+
+        following_space = topics.find(' ', position)
+        if following_space == -1:
+            return
+        position = following_space + 1
+
+
+def find_topics(topics: str, keys: Collection[str]) -> Dict[str, str]:
+    """
+    Returns the values of the given `keys` in the topics of a Chronicles log line, taking the last occurrence of
+    repeated keys. Topics are scanned right to left, as :func:`topics_start` does, so that the first occurrence found
+    of a key is its last one, and the scan stops as soon as all keys are found. Topics which cannot be scanned that
+    way (e.g. with tokens which cannot be parsed) get scanned through left to right instead.
+    """
+    wanted = set(keys)
+    found: Dict[str, str] = {}
+    quoted = _QuotedValues(topics)
+    end = len(topics)
+    while wanted and end > 0:
+        start = _token_start(topics, end, quoted)
+        if start == -1:
+            break
+
+        separator = topics.index('=', start)
+        key = topics[start:separator]
+        if key in wanted:
+            found[key] = topics[separator + 1:end]
+            wanted.discard(key)
+        if start == 0:
+            return found
+        end = start - 1
+    else:
+        return found
+
+    found = {}
+    wanted = set(keys)
+    for key, value in iter_topics(topics):
+        if key in wanted:
+            found[key] = value
+    return found
@@ -0,0 +1,171 @@
+"""
+Declarative descriptions of how the lines of a log are read, parsed, filtered and transformed. A :class:`Pipeline` can
+be built into the usual stack of composable sources (:meth:`Pipeline.nested`), or into a single :class:`FusedSource`
+which runs every stage in one loop (:meth:`Pipeline.fused`), saving the generator frame and attribute lookups that
+each stacked source costs per line.
+"""
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Sequence
+
+from logtools.log.base import LogSource, RawLogLine
+from logtools.log.interning import StringInterner
+from logtools.log.sources.input.compressed import is_compressed, open_binary_at
+from logtools.log.sources.input.mmap_log_source import MappedLineLocation, MappedLogLine, log_file_source
+from logtools.log.sources.parallel.prefetch_source import PrefetchSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource, ChroniclesLogLine, line_parser
+from logtools.log.sources.parse.parse_cache import ParseCache, ParsedColumns
+from logtools.log.sources.parse.timestamp_index import ByteRange
+from logtools.log.sources.transform.filtered_source import FilteredSource, all_of, raw_prefilter
+from logtools.log.sources.transform.transformed_source import TransformedSource
+
+Transform = Callable[[ChroniclesLogLine], Optional[ChroniclesLogLine]]
+
+
+@dataclass(frozen=True)
+class Pipeline:
+    """
+    Reads Chronicles log lines either from the log file at `path` (restricted to `byte_range`) or from a `source` of
+    raw lines, and parses them, lazily or not, as :class:`ChroniclesRawSource` would with the given `interner` and
+    `cache`. Parsed lines then go through `filters`, which must all accept a line, and `transforms`, which return
+    the line to pass on (possibly a different one), or `None` to drop it. Filters also prefilter raw lines, if they can.
+
+    With `prefetch`, raw lines are read ahead on a background thread (see :class:`PrefetchSource`), which is worth it
+    for inputs slow to read, like compressed files or pipes. Files whose lines get rebuilt from the `cache` are not
+    prefetched.
+    """
+    path: Optional[Path] = None
+    source: Optional[LogSource] = None
+    byte_range: ByteRange = ByteRange()
+    lazy: bool = False
+    interner: Optional[StringInterner] = None
+    cache: Optional[ParseCache] = None
+    prefetch: bool = False
+    filters: Sequence[Callable] = ()
+    transforms: Sequence[Transform] = ()
+
+    def __post_init__(self):
+        if (self.path is None) == (self.source is None):
+            raise ValueError('A pipeline reads either from a log file or from a source of raw lines')
+
+    def predicate(self) -> Optional[Callable]:
+        """Returns a predicate accepting the lines which pass all filters, or `None` if there are no filters."""
+        if not self.filters:
+            return None
+        return self.filters[0] if len(self.filters) == 1 else all_of(*self.filters)
+
+    def raw_source(self) -> LogSource:
+        if self.source is not None:
+            source = self.source
+        else:
+            assert self.path is not None
+            source = log_file_source(self.path, self.byte_range.start, self.byte_range.end,
+                                     self.byte_range.first_line_number)
+        return PrefetchSource(source) if self.prefetch and not self._cached() else source
+
+    def _cached(self) -> bool:
+        """Tells whether the parse of the log file read by this pipeline goes through the cache."""
+        return self.cache is not None and self.path is not None and not is_compressed(self.path)
+
+    def nested(self) -> LogSource:
+        """Builds the pipeline as a stack of sources, one per stage."""
+        predicate = self.predicate()
+        source: LogSource = ChroniclesRawSource(self.raw_source(), lazy=self.lazy, interner=self.interner,
+                                                prefilter=raw_prefilter(predicate), cache=self.cache)
+        if predicate is not None:
+            source = FilteredSource(source, predicate)
+        for transform in self.transforms:
+            source = TransformedSource(source, transform)
+        return source
+
+    def fused(self) -> 'FusedSource':
+        """Builds the pipeline as a single source, which runs all stages in one loop."""
+        return FusedSource(self)
+
+
+class FusedSource(LogSource[ChroniclesLogLine]):
+    """
+    Runs all stages of a :class:`Pipeline` in a single loop. Log files are read, parsed, filtered and transformed line
+    by line without going through any other source, and yield the same lines as a :class:`MmapLogSource` would. Other
+    inputs (as well as cached or prefetched files) get parsed by a :class:`ChroniclesRawSource`, with filters and
+    transforms fused into one loop over its lines.
+
+    As with :class:`MmapLogSource`, `lines_read` tells how many lines were read from the input once iteration is
+    over, whether or not they were filtered out. As with :class:`ChroniclesRawSource`, `recorded` then holds the parse
+    of the part of a file which got read, if it was not cached yet.
+    """
+
+    def __init__(self, pipeline: Pipeline):
+        self.pipeline = pipeline
+        self.lines_read = 0
+        self.recorded: Optional[ParsedColumns] = None
+
+    def __iter__(self) -> Iterator[ChroniclesLogLine]:
+        if self.pipeline.path is not None and self.pipeline.cache is None and not self.pipeline.prefetch:
+            return self._iter_file(self.pipeline.path)
+        return self._iter_parsed()
+
+    def _iter_file(self, path: Path) -> Iterator[ChroniclesLogLine]:
+        pipeline = self.pipeline
+        predicate = pipeline.predicate()
+        transforms = tuple(pipeline.transforms)
+        prefilter = raw_prefilter(predicate)
+        accepts = prefilter.accepts_bytes if prefilter is not None else None
+        parse: Callable[[RawLogLine], Optional[ChroniclesLogLine]] = line_parser(pipeline.lazy, pipeline.interner)
+        parse_bytes = ChroniclesRawSource.parse_bytes if pipeline.lazy else None
+
+        start, end = pipeline.byte_range.start, pipeline.byte_range.end
+        first_line_number = line_number = pipeline.byte_range.first_line_number
+        offset = start
+        try:
+            with open_binary_at(path, start) as stream:
+                for data in stream:
+                    if end is not None and offset >= end:
+                        break
+                    location = MappedLineLocation(line_number, path, offset)
+                    offset += len(data)
+                    line_number += 1
+                    if accepts is not None and not accepts(data):
+                        continue
+                    # lazy lines are parsed straight from their bytes, without wrapping them in a raw line first.
+                    if parse_bytes is not None:
+                        line = parse_bytes(location, data)
+                    else:
+                        line = parse(MappedLogLine(location, data))
+                    if not line:
+                        print(f'Skip unparseable line: {MappedLogLine(location, data)}', file=sys.stderr)
+                        continue
+                    if predicate is not None and not predicate(line):
+                        continue
+                    for transform in transforms:
+                        transformed = transform(line)
+                        if transformed is None:
+                            break
+                        line = transformed
+                    else:
+                        yield line
+        finally:
+            self.lines_read = line_number - first_line_number
+
+    def _iter_parsed(self) -> Iterator[ChroniclesLogLine]:
+        pipeline = self.pipeline
+        predicate = pipeline.predicate()
+        transforms = tuple(pipeline.transforms)
+        raw = pipeline.raw_source()
+        parsed = ChroniclesRawSource(raw, lazy=pipeline.lazy, interner=pipeline.interner,
+                                     prefilter=raw_prefilter(predicate), cache=pipeline.cache)
+        try:
+            for line in parsed:
+                if predicate is not None and not predicate(line):
+                    continue
+                for transform in transforms:
+                    transformed = transform(line)
+                    if transformed is None:
+                        break
+                    line = transformed
+                else:
+                    yield line
+        finally:
+            self.lines_read = getattr(raw, 'lines_read', 0)
+            self.recorded = parsed.recorded
@@ -0,0 +1,86 @@
+import gzip
+from pathlib import Path
+
+import pytest
+
+from logtools.log.sources.input.string_log_source import StringLogSource
+from logtools.log.sources.parse.chronicles_raw_source import LogLevel
+from logtools.log.sources.parse.parse_cache import ParseCache
+from logtools.log.sources.parse.timestamp_index import ByteRange
+from logtools.log.sources.pipeline import Pipeline
+from logtools.log.sources.transform.filtered_source import level_in, topic_value
+
+SAMPLE_LOG = Path(__file__).parent.parent / 'input' / 'tests' / 'sample.log'
+
+
+def lines_of(source):
+    return [(line.location.line_number, line.level, line.count, line.message, line.topics) for line in source]
+
+
+def drop_odd_counts(line):
+    return line if line.count % 2 == 0 else None
+
+
+@pytest.mark.parametrize('lazy', [True, False])
+@pytest.mark.parametrize('filters,transforms', [
+    ((), ()),
+    ((level_in(LogLevel.trace, LogLevel.debug),), ()),
+    ((level_in(LogLevel.trace, LogLevel.debug), topic_value('tid', '4')), ()),
+    ((level_in(LogLevel.trace, LogLevel.debug),), (drop_odd_counts,)),
+])
+def test_should_yield_the_same_lines_fused_as_nested(lazy, filters, transforms):
+    pipeline = Pipeline(path=SAMPLE_LOG, lazy=lazy, filters=filters, transforms=transforms)
+
+    fused = lines_of(pipeline.fused())
+
+    assert fused == lines_of(pipeline.nested())
+    assert len(fused) > 0
+
+
+def test_should_read_byte_ranges():
+    contents = SAMPLE_LOG.read_bytes()
+    start = contents.index(b'\n') + 1
+    end = contents.index(b'\n', start) + 1
+    source = Pipeline(path=SAMPLE_LOG, byte_range=ByteRange(start, end + 1, 2)).fused()
+
+    assert [line.count for line in source] == [2, 3]
+    assert source.lines_read == 2
+
+
+def test_should_read_compressed_files(tmp_path):
+    compressed = tmp_path / 'sample.log.gz'
+    compressed.write_bytes(gzip.compress(SAMPLE_LOG.read_bytes()))
+
+    assert lines_of(Pipeline(path=compressed).fused()) == lines_of(Pipeline(path=SAMPLE_LOG).fused())
+
+
+def test_should_read_cached_files(tmp_path):
+    pipeline = Pipeline(path=SAMPLE_LOG, lazy=True, cache=ParseCache(tmp_path),
+                        filters=(level_in(LogLevel.trace),), transforms=(drop_odd_counts,))
+
+    first, second = pipeline.fused(), pipeline.fused()
+
+    assert lines_of(first) == lines_of(second) == lines_of(pipeline.nested())
+    assert first.lines_read == second.lines_read == 10
+
+
+def test_should_transform_lines_from_sources():
+    log = ('TRC 2023-10-16 20:29:24.595+00:00 Advertising block topics="codex" count=1\n'
+           'WRN 2023-10-16 20:29:24.597+00:00 Dropping blocks topics="codex" count=2')
+    pipeline = Pipeline(source=StringLogSource(log), transforms=(drop_odd_counts,))
+
+    assert [line.count for line in pipeline.fused()] == [2]
+
+
+def test_should_require_a_single_input():
+    with pytest.raises(ValueError):
+        Pipeline()
+
+    with pytest.raises(ValueError):
+        Pipeline(path=SAMPLE_LOG, source=StringLogSource(''))
+
+
+def test_should_prefetch_raw_lines():
+    pipeline = Pipeline(path=SAMPLE_LOG, lazy=True, prefetch=True, filters=(level_in(LogLevel.trace),))
+
+    assert lines_of(pipeline.fused()) == lines_of(Pipeline(path=SAMPLE_LOG, filters=pipeline.filters).fused())
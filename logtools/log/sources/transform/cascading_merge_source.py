@@ -0,0 +1,107 @@
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+from logtools.log.base import LogSource, TimestampedLogLine, TLocation
+from logtools.log.sources.transform.merged_source import MergedSource
+
+DEFAULT_FAN_IN = 64
+
+# Number of lines pickled together in a spilled run. Objects shared by lines in a batch (paths, timezones, location
+# contexts) are written only once per batch.
+_RUN_BATCH_SIZE = 1000
+
+
+class SpilledRun(LogSource[TimestampedLogLine[TLocation]]):
+    """A time-ordered run of lines spilled to disk by :class:`CascadingMergeSource`, as a sequence of pickled batches."""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    @staticmethod
+    def write(path: Path, lines: Iterator[TimestampedLogLine[TLocation]]) -> 'SpilledRun[TLocation]':
+        with path.open('wb') as run:
+            batch: List[TimestampedLogLine[TLocation]] = []
+            for line in lines:
+                batch.append(line)
+                if len(batch) == _RUN_BATCH_SIZE:
+                    pickle.dump(batch, run, protocol=pickle.HIGHEST_PROTOCOL)
+                    batch = []
+            if batch:
+                pickle.dump(batch, run, protocol=pickle.HIGHEST_PROTOCOL)
+        return SpilledRun(path)
+
+    def __iter__(self) -> Iterator[TimestampedLogLine[TLocation]]:
+        with self.path.open('rb') as run:
+            while True:
+                try:
+                    batch = pickle.load(run)
+                except EOFError:
+                    return
+                yield from batch
+
+
+class CascadingMergeSource(LogSource[TimestampedLogLine[TLocation]]):
+    """
+    Merges any number of time-ordered sources while iterating at most `fan_in` of them at once, so that the number of
+    open files does not grow with the number of inputs.
+
+    Sources are merged in consecutive groups of `fan_in`, each group being spilled to a sorted run in a temporary
+    directory (under `spill_dir`, if given). Runs are merged the same way until at most `fan_in` remain, and those are
+    merged into the output. Because groups are consecutive and every merge breaks ties by input order, the output is
+    identical to that of a single :class:`MergedSource` over all sources. Temporary runs are deleted once iteration
+    ends.
+
+    Sources must not open files (or otherwise hold resources) before they are iterated. This is the case for
+    :class:`FileLogSource`, :class:`MmapLogSource` and the parsing and filtering sources built on top of them, as well
+    as for pipelines (see :class:`FusedSource`).
+    """
+
+    def __init__(
+            self,
+            *sources: LogSource[TimestampedLogLine[TLocation]],
+            fan_in: int = DEFAULT_FAN_IN,
+            spill_dir: Optional[Path] = None,
+    ):
+        if fan_in < 2:
+            raise ValueError('Fan-in must be at least 2')
+
+        self.sources = sources
+        self.fan_in = fan_in
+        self.spill_dir = spill_dir
+
+    def __iter__(self) -> Iterator[TimestampedLogLine[TLocation]]:
+        if len(self.sources) <= self.fan_in:
+            yield from MergedSource(*self.sources)
+            return
+
+        with tempfile.TemporaryDirectory(prefix='log-merge-', dir=self.spill_dir) as spill_dir:
+            runs = self._spill(Path(spill_dir), self.sources)
+            yield from MergedSource(*runs)
+
+    def _spill(
+            self,
+            spill_dir: Path,
+            sources: Sequence[LogSource[TimestampedLogLine[TLocation]]]
+    ) -> Sequence[LogSource[TimestampedLogLine[TLocation]]]:
+        level = 0
+        while len(sources) > self.fan_in:
+            runs: List[LogSource[TimestampedLogLine[TLocation]]] = []
+            for start in range(0, len(sources), self.fan_in):
+                group = sources[start:start + self.fan_in]
+                # a trailing group with a single source has nothing to be merged with.
+                if len(group) == 1:
+                    runs.append(group[0])
+                    continue
+
+                runs.append(SpilledRun.write(spill_dir / f'run-{level}-{len(runs)}', MergedSource(*group)))
+                # runs from the previous level are no longer needed once they have been merged.
+                for source in group:
+                    if isinstance(source, SpilledRun):
+                        source.path.unlink()
+
+            sources = runs
+            level += 1
+
+        return sources
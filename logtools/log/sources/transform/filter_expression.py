@@ -0,0 +1,419 @@
+"""
+A small expression language for filtering Chronicles log lines, shared by the command line tools. Expressions compare
+attributes of lines with constants, and combine comparisons with `and`, `or`, `not` and parentheses::
+
+    level>=WRN and topics.cid=zb2rhe5P4gZ and message~"Block"
+
+Attributes are `timestamp`, `level`, `count`, `message` and `topics.<key>` (the value of topic `key`). All of them can
+be compared with `=` and `!=`; timestamps, levels (by severity) and counts can also be compared with `<`, `<=`, `>` and
+`>=`, while messages and topic values can be searched with `~`, which looks for a word or phrase regardless of case.
+Constants which contain spaces, quotes or operators must be quoted, with backslashes escaping quotes.
+
+Expressions compile into a single Python function over :class:`ChroniclesLogLine` objects, along with a raw text
+prefilter (see :mod:`logtools.log.sources.parse.prefilters`) and an ElasticSearch query clause. Expressions on
+timestamps and levels alone can also be evaluated over columnar batches of lines (see
+:mod:`logtools.log.sources.parse.columnar`).
+"""
+import re
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Callable, Dict, FrozenSet, List, NoReturn, Optional, Tuple, Union
+
+import pytz
+from dateutil import parser as tsparser
+
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesLogLine, LogLevel, LEVEL_ORDER
+from logtools.log.sources.parse.columnar import ChroniclesBatch, datetime64
+from logtools.log.sources.parse.prefilters import RawPrefilter, TimestampPrefilter, LevelPrefilter, \
+    SubstringPrefilter, AllPrefilter, AnyPrefilter
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*")
+      | (?P<operator><=|>=|!=|=|<|>|~)
+      | (?P<parenthesis>[()])
+      | (?P<word>[^\s()<>=!~"]+)
+    )
+''', re.VERBOSE)
+
+_ORDERED = ('=', '!=', '<', '<=', '>', '>=')
+_SEARCHABLE = ('=', '!=', '~')
+_FIELDS = {'timestamp': _ORDERED, 'level': _ORDERED, 'count': _ORDERED, 'message': _SEARCHABLE}
+_TOPIC_PREFIX = 'topics.'
+
+_PYTHON_OPERATORS = {'=': '==', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+# How far the time a log collector stamped a document with (`@timestamp`) may be from that of the line it holds.
+_ES_TIMESTAMP_SLACK = timedelta(minutes=1)
+_ARRAY_OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    '=': lambda left, right: left == right, '!=': lambda left, right: left != right,
+    '<': lambda left, right: left < right, '<=': lambda left, right: left <= right,
+    '>': lambda left, right: left > right, '>=': lambda left, right: left >= right,
+}
+
+
+@dataclass(frozen=True)
+class Comparison:
+    field: str
+    operator: str
+    value: Any
+
+
+@dataclass(frozen=True)
+class And:
+    operands: Tuple['Node', ...]
+
+
+@dataclass(frozen=True)
+class Or:
+    operands: Tuple['Node', ...]
+
+
+@dataclass(frozen=True)
+class Not:
+    operand: 'Node'
+
+
+Node = Union[Comparison, And, Or, Not]
+
+
+def _tokenize(expression: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    while expression[position:].strip():
+        match = _TOKEN.match(expression, position)
+        if match is None or match.lastgroup is None:
+            raise ValueError(f'Unexpected character at position {position} of filter: {expression[position:]}')
+        tokens.append((match.lastgroup, match[match.lastgroup]))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser for filter expressions, where `not` binds tighter than `and`, and `and` than `or`."""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.position = 0
+
+    def parse(self) -> Node:
+        node = self._or()
+        if self.position < len(self.tokens):
+            self._fail(f'unexpected {self.tokens[self.position][1]}')
+        return node
+
+    def _peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _keyword(self, keyword: str) -> bool:
+        token = self._peek()
+        if token is not None and token[0] == 'word' and token[1].lower() == keyword:
+            self.position += 1
+            return True
+        return False
+
+    def _next(self, description: str) -> Tuple[str, str]:
+        token = self._peek()
+        if token is None:
+            self._fail(f'expected {description}, got end of filter')
+        self.position += 1
+        return token
+
+    def _fail(self, message: str) -> NoReturn:
+        raise ValueError(f'Invalid filter "{self.expression}": {message}')
+
+    def _or(self) -> Node:
+        operands = [self._and()]
+        while self._keyword('or'):
+            operands.append(self._and())
+        return operands[0] if len(operands) == 1 else Or(tuple(operands))
+
+    def _and(self) -> Node:
+        operands = [self._not()]
+        while self._keyword('and'):
+            operands.append(self._not())
+        return operands[0] if len(operands) == 1 else And(tuple(operands))
+
+    def _not(self) -> Node:
+        if self._keyword('not'):
+            return Not(self._not())
+        return self._primary()
+
+    def _primary(self) -> Node:
+        kind, text = self._next('a comparison')
+        if kind == 'parenthesis' and text == '(':
+            node = self._or()
+            if self._next('")"') != ('parenthesis', ')'):
+                self._fail('expected ")"')
+            return node
+        if kind != 'word':
+            self._fail(f'expected an attribute, got {text}')
+
+        field = text.lower()
+        operators = _SEARCHABLE if field.startswith(_TOPIC_PREFIX) and len(field) > len(_TOPIC_PREFIX) else \
+            _FIELDS.get(field)
+        if operators is None:
+            self._fail(f'unknown attribute {text}')
+        if field.startswith(_TOPIC_PREFIX):
+            # topic keys are case-sensitive.
+            field = _TOPIC_PREFIX + text[len(_TOPIC_PREFIX):]
+
+        kind, operator = self._next('an operator')
+        if kind != 'operator' or operator not in operators:
+            self._fail(f'{text} cannot be compared with {operator}')
+
+        kind, value = self._next('a value')
+        if kind == 'string':
+            value = re.sub(r'\\(.)', r'\1', value[1:-1])
+        elif kind != 'word':
+            self._fail(f'expected a value, got {value}')
+
+        return Comparison(field, operator, self._convert(field, value))
+
+    def _convert(self, field: str, value: str) -> Any:
+        try:
+            if field == 'timestamp':
+                timestamp = tsparser.parse(value)
+                return timestamp if timestamp.tzinfo is not None else timestamp.replace(tzinfo=pytz.UTC)
+            if field == 'level':
+                return _level(value)
+            if field == 'count':
+                return int(value)
+        except (ValueError, KeyError, OverflowError):
+            self._fail(f'invalid {field} {value}')
+        return value
+
+
+def _level(value: str) -> LogLevel:
+    """Accepts levels either as they appear in logs (`WRN`) or by name (`warning`)."""
+    try:
+        return LogLevel(value.upper())
+    except ValueError:
+        return LogLevel[value.lower()]
+
+
+def _levels(operator: str, level: LogLevel) -> FrozenSet[LogLevel]:
+    severity = LEVEL_ORDER.index(level)
+    return frozenset(other for i, other in enumerate(LEVEL_ORDER) if {
+        '=': i == severity, '!=': i != severity, '<': i < severity, '<=': i <= severity, '>': i > severity,
+        '>=': i >= severity,
+    }[operator])
+
+
+def _phrase(text: str) -> 're.Pattern[str]':
+    """A case-insensitive pattern for the words of `text`, separated by anything but words."""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return re.compile(re.escape(text), re.IGNORECASE)
+    return re.compile(r'\b' + r'\W+'.join(re.escape(word) for word in words) + r'\b', re.IGNORECASE)
+
+
+def _unquote(value: Optional[str]) -> Optional[str]:
+    """Topic values which are quoted in lines are compared without their quotes and escapes."""
+    if value is None or len(value) < 2 or value[0] != '"' or value[-1] != '"':
+        return value
+    return re.sub(r'\\(.)', r'\1', value[1:-1])
+
+
+def _matches(pattern: 're.Pattern[str]', text: Optional[str]) -> bool:
+    return text is not None and pattern.search(text) is not None
+
+
+class _Compiler:
+    """Generates the source of the predicate of an expression, keeping its constants aside."""
+
+    constants: Dict[str, Any]
+
+    def __init__(self):
+        self.constants = {'_matches': _matches, '_unquote': _unquote}
+
+    def constant(self, value: Any) -> str:
+        name = f'_c{len(self.constants)}'
+        self.constants[name] = value
+        return name
+
+    def compile(self, node: Node) -> str:
+        if isinstance(node, And):
+            return '(' + ' and '.join(self.compile(operand) for operand in node.operands) + ')'
+        if isinstance(node, Or):
+            return '(' + ' or '.join(self.compile(operand) for operand in node.operands) + ')'
+        if isinstance(node, Not):
+            return f'(not {self.compile(node.operand)})'
+        return self._comparison(node)
+
+    def _comparison(self, node: Comparison) -> str:
+        field, operator, value = node.field, node.operator, node.value
+        if field == 'level':
+            return f'(line.level in {self.constant(_levels(operator, value))})'
+        if field == 'count':
+            return f'(line.count is not None and line.count {_PYTHON_OPERATORS[operator]} {self.constant(value)})'
+        if field == 'timestamp':
+            return f'(line.timestamp {_PYTHON_OPERATORS[operator]} {self.constant(value)})'
+
+        if field == 'message':
+            attribute = 'line.message'
+        else:
+            key = self.constant(field[len(_TOPIC_PREFIX):])
+            attribute = f'_unquote(line.extract_fields(({key},)).get({key}))'
+
+        if operator == '~':
+            return f'_matches({self.constant(_phrase(value))}, {attribute})'
+        return f'({attribute} {_PYTHON_OPERATORS[operator]} {self.constant(value)})'
+
+
+def _prefilter(node: Node) -> Optional[RawPrefilter]:
+    """Returns a raw text prefilter which rejects only lines that `node` rejects, if there is one."""
+    if isinstance(node, (And, Or)):
+        prefilters = [_prefilter(operand) for operand in node.operands]
+        if isinstance(node, And):
+            kept = [prefilter for prefilter in prefilters if prefilter is not None]
+            return AllPrefilter(*kept) if kept else None
+        # a line passes a disjunction as soon as it passes any of its operands, which all need to be prefiltered.
+        if any(prefilter is None for prefilter in prefilters):
+            return None
+        return AnyPrefilter(*prefilters)  # type: ignore[arg-type]
+
+    if isinstance(node, Not):
+        return None
+
+    field, operator, value = node.field, node.operator, node.value
+    if field == 'level':
+        return LevelPrefilter([level.value for level in _levels(operator, value)])
+    if field == 'timestamp' and operator != '!=':
+        return TimestampPrefilter(
+            value if operator in ('=', '>', '>=') else None,
+            value if operator in ('=', '<', '<=') else None,
+        )
+    if field == 'message':
+        return SubstringPrefilter([value]) if operator == '=' else None
+    if field.startswith(_TOPIC_PREFIX) and operator != '!=':
+        key = field[len(_TOPIC_PREFIX):]
+        # values with quotes or backslashes are escaped in raw lines, so only their key can be looked for.
+        if operator == '~' or '"' in value or '\\' in value:
+            return SubstringPrefilter([f'{key}='])
+        return SubstringPrefilter([f'{key}=', value])
+    return None
+
+
+def _es_clause(node: Node) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    Translates `node` into an ElasticSearch query clause which matches at least the documents of the lines `node`
+    accepts, and tells whether it matches exactly those. A missing clause matches every document.
+
+    Nothing translates exactly: `@timestamp` is the time at which the log collector got a line rather than the
+    timestamp of the line itself, so timestamps get compared with some slack, and everything else gets looked for in
+    the full text of the `message` field, which holds the whole line.
+    """
+    if isinstance(node, (And, Or)):
+        translated = [_es_clause(operand) for operand in node.operands]
+        exact = all(operand_exact for _, operand_exact in translated)
+        clauses = [clause for clause, _ in translated if clause is not None]
+        if isinstance(node, And):
+            if not clauses:
+                return None, exact
+            return (clauses[0] if len(clauses) == 1 else {'bool': {'filter': clauses}}), exact
+        if len(clauses) < len(translated):
+            return None, False
+        return {'bool': {'should': clauses, 'minimum_should_match': 1}}, exact
+
+    if isinstance(node, Not):
+        clause, exact = _es_clause(node.operand)
+        # a superset of the lines an operand accepts does not tell which lines it rejects.
+        if clause is None or not exact:
+            return None, False
+        return {'bool': {'must_not': [clause]}}, True
+
+    field, operator, value = node.field, node.operator, node.value
+    if field == 'timestamp':
+        if operator == '!=':
+            return None, False
+        after = (value - _ES_TIMESTAMP_SLACK).isoformat()
+        before = (value + _ES_TIMESTAMP_SLACK).isoformat()
+        if operator in ('>', '>='):
+            return {'range': {'@timestamp': {'gte': after}}}, False
+        if operator in ('<', '<='):
+            return {'range': {'@timestamp': {'lte': before}}}, False
+        return {'range': {'@timestamp': {'gte': after, 'lte': before}}}, False
+
+    if field == 'level':
+        clauses = [{'match': {'message': level.value}} for level in _levels(operator, value)]
+        return {'bool': {'should': clauses, 'minimum_should_match': 1}}, False
+
+    if operator == '!=' or field == 'count':
+        return None, False
+
+    if field == 'message':
+        return {'match_phrase': {'message': value}}, False
+
+    key = field[len(_TOPIC_PREFIX):]
+    if operator == '=':
+        return {'match_phrase': {'message': f'{key}={value}'}}, False
+    return {'bool': {'filter': [{'match_phrase': {'message': key}}, {'match_phrase': {'message': value}}]}}, False
+
+
+def _batch_mask(node: Node, batch: ChroniclesBatch) -> Optional[Any]:
+    """Evaluates `node` over a columnar batch, if it only involves timestamps and levels."""
+    if isinstance(node, (And, Or)):
+        masks = [_batch_mask(operand, batch) for operand in node.operands]
+        if any(mask is None for mask in masks):
+            return None
+        combined: Any = masks[0]
+        for mask in masks[1:]:
+            combined = (combined & mask) if isinstance(node, And) else (combined | mask)
+        return combined
+
+    if isinstance(node, Not):
+        mask = _batch_mask(node.operand, batch)
+        return ~mask if mask is not None else None
+
+    if node.field == 'timestamp':
+        return _ARRAY_OPERATORS[node.operator](batch.timestamps, datetime64(node.value))
+    if node.field == 'level':
+        return batch.level_in(list(_levels(node.operator, node.value)))
+    return None
+
+
+class FilterExpression:
+    """
+    A compiled filter expression, which can be used as a predicate over :class:`ChroniclesLogLine` objects (e.g. with
+    :class:`FilteredSource`). Expressions pickle as their text, and get compiled again when unpickled.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tree = _Parser(text).parse()
+
+        compiler = _Compiler()
+        body = compiler.compile(self.tree)
+        namespace = dict(compiler.constants)
+        exec(compile(f'def predicate(line):\n    return {body}\n', f'<filter {text}>', 'exec'), namespace)
+        self.predicate: Callable[[ChroniclesLogLine], bool] = namespace['predicate']
+
+    def __call__(self, line: ChroniclesLogLine) -> bool:
+        return self.predicate(line)
+
+    def raw_prefilter(self) -> Optional[RawPrefilter]:
+        return _prefilter(self.tree)
+
+    def es_clause(self) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Returns an ElasticSearch query clause matching (at least) the documents of the lines this expression accepts,
+        or `None` if every document might match, and whether the clause matches exactly those documents. Documents
+        matched by an inexact clause still need to be parsed and filtered.
+        """
+        return _es_clause(self.tree)
+
+    def batch_mask(self, batch: ChroniclesBatch) -> Optional[Any]:
+        """Returns a mask of the lines of `batch` this expression accepts, or `None` if it needs lines one by one."""
+        return _batch_mask(self.tree, batch)
+
+    def __reduce__(self):
+        return FilterExpression, (self.text,)
+
+    def __repr__(self) -> str:
+        return f'FilterExpression({self.text!r})'
+
+
+def compile_filter(text: str) -> FilterExpression:
+    """Compiles a filter expression, raising a :class:`ValueError` if it is invalid."""
+    return FilterExpression(text)
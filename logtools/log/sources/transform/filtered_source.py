@@ -1,7 +1,18 @@
+import operator
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Callable, Iterator
+from functools import reduce
+from typing import Callable, Iterator, FrozenSet, Optional, Tuple, TYPE_CHECKING
 
 from logtools.log.base import LogSource, TLogLine, TimestampedLogLine, TLocation
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesLogLine, LogLevel
+from logtools.log.sources.parse.prefilters import RawPrefilter, TimestampPrefilter, LevelPrefilter, \
+    SubstringPrefilter, AllPrefilter
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from logtools.log.sources.parse.columnar import ChroniclesBatch
 
 
 class FilteredSource(LogSource[TLogLine]):
@@ -15,8 +26,99 @@ class FilteredSource(LogSource[TLogLine]):
                 yield line
 
 
+# Predicates are plain callables. The ones defined here are objects rather than closures so that they can be pickled
+# and sent to worker processes. They also provide a cheap test on the raw text of lines (see `raw_prefilter`), which
+# parsers can run to skip parsing lines that are bound to be rejected, and those which only look at timestamps and
+# levels can be evaluated over whole columnar batches of lines at once (see `batch_mask`).
+
+@dataclass(frozen=True)
+class TimestampRange:
+    start: datetime
+    end: datetime
+
+    def __call__(self, line: TimestampedLogLine[TLocation]) -> bool:
+        return self.start <= line.timestamp <= self.end
+
+    def raw_prefilter(self) -> RawPrefilter:
+        return TimestampPrefilter(self.start, self.end)
+
+    def batch_mask(self, batch: 'ChroniclesBatch') -> 'np.ndarray':
+        return batch.between(self.start, self.end)
+
+
+@dataclass(frozen=True)
+class LevelIn:
+    levels: FrozenSet[LogLevel]
+
+    def __call__(self, line: ChroniclesLogLine[TLocation]) -> bool:
+        return line.level in self.levels
+
+    def raw_prefilter(self) -> RawPrefilter:
+        return LevelPrefilter([level.value for level in self.levels])
+
+    def batch_mask(self, batch: 'ChroniclesBatch') -> 'np.ndarray':
+        return batch.level_in(list(self.levels))
+
+
+@dataclass(frozen=True)
+class TopicValue:
+    key: str
+    value: str
+
+    def __call__(self, line: ChroniclesLogLine[TLocation]) -> bool:
+        return line.extract_fields((self.key,)).get(self.key) == self.value
+
+    def raw_prefilter(self) -> RawPrefilter:
+        # values with quotes or backslashes are escaped in raw lines, so only their key can be looked for.
+        if '"' in self.value or '\\' in self.value:
+            return SubstringPrefilter([f'{self.key}='])
+        return SubstringPrefilter([f'{self.key}=', self.value])
+
+
+@dataclass(frozen=True)
+class AllOf:
+    predicates: Tuple[Callable, ...]
+
+    def __call__(self, line) -> bool:
+        return all(predicate(line) for predicate in self.predicates)
+
+    def raw_prefilter(self) -> Optional[RawPrefilter]:
+        prefilters = [prefilter for prefilter in map(raw_prefilter, self.predicates) if prefilter is not None]
+        return AllPrefilter(*prefilters) if prefilters else None
+
+    def batch_mask(self, batch: 'ChroniclesBatch') -> Optional['np.ndarray']:
+        masks = [batch_mask(predicate, batch) for predicate in self.predicates]
+        if any(mask is None for mask in masks):
+            return None
+        return reduce(operator.and_, masks)
+
+
 def timestamp_range(start: datetime, end: datetime) -> Callable[[TimestampedLogLine[TLocation]], bool]:
-    def predicate(line: TimestampedLogLine[TLocation]):
-        return start <= line.timestamp <= end
+    return TimestampRange(start, end)
+
+
+def level_in(*levels: LogLevel) -> Callable[[ChroniclesLogLine[TLocation]], bool]:
+    return LevelIn(frozenset(levels))
+
+
+def topic_value(key: str, value: str) -> Callable[[ChroniclesLogLine[TLocation]], bool]:
+    return TopicValue(key, value)
+
+
+def all_of(*predicates: Callable) -> Callable:
+    return AllOf(predicates)
+
+
+def batch_mask(predicate: Callable, batch: 'ChroniclesBatch') -> Optional['np.ndarray']:
+    """
+    Evaluates a predicate over a whole :class:`~logtools.log.sources.parse.columnar.ChroniclesBatch` at once, returning
+    a mask of the lines which pass it, or `None` if the predicate can only be evaluated line by line.
+    """
+    mask = getattr(predicate, 'batch_mask', None)
+    return mask(batch) if mask is not None else None
+
 
-    return predicate
+def raw_prefilter(predicate: Optional[Callable]) -> Optional[RawPrefilter]:
+    """Returns the raw text prefilter of a predicate, or `None` if it has none."""
+    prefilter = getattr(predicate, 'raw_prefilter', None)
+    return prefilter() if prefilter is not None else None
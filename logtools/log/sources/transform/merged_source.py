@@ -1,28 +1,57 @@
-from heapq import heapify, heappop, heappush
-from typing import Iterator
+from datetime import datetime, timezone
+from heapq import heapify, heapreplace, heappop
+from typing import Iterator, Tuple, List
 
 from logtools.log.base import LogSource, TimestampedLogLine, TLocation
-from logtools.log.sources.transform.ordered_source import OrderedSource
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def epoch_nanos(timestamp: datetime) -> int:
+    """Converts an aware :class:`datetime` into integer nanoseconds since the Unix epoch, without loss of precision."""
+    delta = timestamp - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1_000
 
 
 class MergedSource(LogSource[TimestampedLogLine[TLocation]]):
-    def __init__(self, *sources: OrderedSource[TLocation]):
-        self.sources = [source for source in sources if source.peek is not None]
-        heapify(self.sources)
+    """
+    Merges time-ordered sources into a single time-ordered source.
+
+    Lines are keyed on `(epoch_nanos, source_index, seq)` tuples, where `source_index` is the position of a source in
+    the argument list and `seq` the position of a line in its source. Lines with equal timestamps therefore come out
+    in argument order, and then in source order, no matter how the heap happens to be laid out. Keys are unique, so
+    heap entries are ordered by plain tuple comparisons of integers in C, and lines themselves are never compared.
+    """
+
+    def __init__(self, *sources: LogSource[TimestampedLogLine[TLocation]]):
+        self.sources = sources
+        self._merged = self._merge()
 
     def __iter__(self) -> Iterator[TimestampedLogLine[TLocation]]:
         return self
 
     def __next__(self) -> TimestampedLogLine[TLocation]:
-        if not self.sources:
-            raise StopIteration()
-
-        # by construction, we can't have any empty iterators at this point, so the call to next always succeeds.
-        log = heappop(self.sources)
-        value = next(log)
-
-        # if the iterator still has stuff in it...
-        if log.peek is not None:
-            heappush(self.sources, log)
-
-        return value
+        return next(self._merged)
+
+    def _merge(self) -> Iterator[TimestampedLogLine[TLocation]]:
+        heap: List[Tuple[int, int, int, TimestampedLogLine[TLocation], Iterator]] = []
+        for index, source in enumerate(self.sources):
+            lines = iter(source)
+            line = next(lines, None)
+            if line is not None:
+                heap.append((epoch_nanos(line.timestamp), index, 0, line, lines))
+        heapify(heap)
+
+        while len(heap) > 1:
+            nanos, index, seq, line, lines = heap[0]
+            yield line
+            following = next(lines, None)
+            if following is None:
+                heappop(heap)
+            else:
+                heapreplace(heap, (epoch_nanos(following.timestamp), index, seq + 1, following, lines))
+
+        # once a single source is left, there is nothing to merge it with.
+        if heap:
+            yield heap[0][3]
+            yield from heap[0][4]
@@ -0,0 +1,96 @@
+import tempfile
+from datetime import timedelta
+from heapq import heappush, heappop
+from operator import attrgetter
+from pathlib import Path
+from typing import Iterator, Optional, List, Tuple
+
+from logtools.log.base import LogSource, TimestampedLogLine, TLocation
+from logtools.log.sources.transform.cascading_merge_source import SpilledRun, CascadingMergeSource, DEFAULT_FAN_IN
+from logtools.log.sources.transform.merged_source import epoch_nanos
+
+DEFAULT_RUN_SIZE = 100_000
+
+
+class ReorderedSource(LogSource[TimestampedLogLine[TLocation]]):
+    """
+    Restores the order of a source whose lines are at most `slack` out of order, such as logs written by several
+    threads. Lines are held in a heap until a line at least `slack` newer has been read, so memory use is bounded by
+    the number of lines in a `slack`-wide window (and by `max_lines`, if given, past which the oldest lines get
+    emitted regardless). Lines with equal timestamps keep their relative order.
+
+    Lines which arrive too late to be put back in order are still emitted, and counted in `late_lines`.
+    """
+
+    def __init__(
+            self,
+            source: LogSource[TimestampedLogLine[TLocation]],
+            slack: timedelta,
+            max_lines: Optional[int] = None,
+    ):
+        self.source = source
+        self.slack = slack
+        self.max_lines = max_lines
+        self.late_lines = 0
+
+    def __iter__(self) -> Iterator[TimestampedLogLine[TLocation]]:
+        slack = self.slack // timedelta(microseconds=1) * 1_000
+        max_lines = self.max_lines if self.max_lines is not None else float('inf')
+        heap: List[Tuple[int, int, TimestampedLogLine[TLocation]]] = []
+        latest = last_emitted = None
+
+        for seq, line in enumerate(self.source):
+            nanos = epoch_nanos(line.timestamp)
+            if last_emitted is not None and nanos < last_emitted:
+                self.late_lines += 1
+            if latest is None or nanos > latest:
+                latest = nanos
+
+            heappush(heap, (nanos, seq, line))
+            while heap and (heap[0][0] <= latest - slack or len(heap) > max_lines):
+                last_emitted, _, emitted = heappop(heap)
+                yield emitted
+
+        while heap:
+            yield heappop(heap)[2]
+
+
+class SortedSource(LogSource[TimestampedLogLine[TLocation]]):
+    """
+    Sorts a source of arbitrarily ordered lines by timestamp with an external merge sort: the source is read in runs
+    of `run_size` lines, which are sorted in memory and spilled to a temporary directory (under `spill_dir`, if given),
+    and runs are then merged with a :class:`CascadingMergeSource`. Sources which fit in a single run are sorted in
+    memory only. The sort is stable, and temporary runs are deleted once iteration ends.
+    """
+
+    def __init__(
+            self,
+            source: LogSource[TimestampedLogLine[TLocation]],
+            run_size: int = DEFAULT_RUN_SIZE,
+            fan_in: int = DEFAULT_FAN_IN,
+            spill_dir: Optional[Path] = None,
+    ):
+        self.source = source
+        self.run_size = run_size
+        self.fan_in = fan_in
+        self.spill_dir = spill_dir
+
+    def __iter__(self) -> Iterator[TimestampedLogLine[TLocation]]:
+        lines = iter(self.source)
+        run = self._next_run(lines)
+        if len(run) < self.run_size:
+            yield from run
+            return
+
+        with tempfile.TemporaryDirectory(prefix='log-sort-', dir=self.spill_dir) as spill_dir:
+            runs: List[SpilledRun[TLocation]] = []
+            while run:
+                runs.append(SpilledRun.write(Path(spill_dir) / f'sorted-{len(runs)}', iter(run)))
+                run = self._next_run(lines)
+
+            yield from CascadingMergeSource(*runs, fan_in=self.fan_in, spill_dir=Path(spill_dir))
+
+    def _next_run(self, lines: Iterator[TimestampedLogLine[TLocation]]) -> List[TimestampedLogLine[TLocation]]:
+        run = [line for _, line in zip(range(self.run_size), lines)]
+        run.sort(key=attrgetter('timestamp'))
+        return run
@@ -0,0 +1,110 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from logtools.log.sources.input.file_log_source import FileLogSource
+from logtools.log.sources.input.string_log_source import StringLogSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+from logtools.log.sources.transform.cascading_merge_source import CascadingMergeSource
+from logtools.log.sources.transform.merged_source import MergedSource
+
+
+class TrackingSource:
+    """Wraps a source and keeps track of how many wrapped sources are being iterated at the same time."""
+    open_sources = 0
+    max_open_sources = 0
+
+    def __init__(self, source):
+        self.source = source
+
+    def __iter__(self):
+        TrackingSource.open_sources += 1
+        TrackingSource.max_open_sources = max(TrackingSource.max_open_sources, TrackingSource.open_sources)
+        try:
+            yield from self.source
+        finally:
+            TrackingSource.open_sources -= 1
+
+
+def log_text(index: int, lines: int = 5) -> str:
+    start = datetime(2023, 10, 16, 20, 29, 24, tzinfo=timezone.utc)
+    return '\n'.join(
+        f'TRC {(start + timedelta(milliseconds=(index * 7 + i * 5) % 13 + i * 10)).isoformat(sep=" ", timespec="milliseconds")} '
+        f'Advertising block topics="codex discoveryengine" count={index * lines + i}'
+        for i in range(lines)
+    )
+
+
+def log(index: int, lines: int = 5):
+    return ChroniclesRawSource(StringLogSource(name=f'log{index}', lines=log_text(index, lines)))
+
+
+class FunctionSource:
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+
+    def __iter__(self):
+        return self.function(*self.args)
+
+
+def open_files() -> int:
+    return len(os.listdir('/proc/self/fd'))
+
+
+@pytest.mark.parametrize('sources,fan_in', [(3, 4), (10, 3), (17, 4), (9, 2)])
+def test_should_produce_the_same_output_as_a_flat_merge(sources, fan_in, tmp_path):
+    expected = [line.count for line in MergedSource(*(log(i) for i in range(sources)))]
+    actual = [line.count for line in CascadingMergeSource(
+        *(log(i) for i in range(sources)), fan_in=fan_in, spill_dir=tmp_path)]
+
+    assert actual == expected
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_should_iterate_at_most_fan_in_sources_at_once(tmp_path):
+    TrackingSource.max_open_sources = 0
+    merged = CascadingMergeSource(*(TrackingSource(log(i)) for i in range(20)), fan_in=4, spill_dir=tmp_path)
+
+    assert len(list(merged)) == 100
+    assert TrackingSource.max_open_sources == 4
+
+
+def test_should_keep_line_locations_across_spilled_runs(tmp_path):
+    merged = CascadingMergeSource(*(log(i, lines=2) for i in range(3)), fan_in=2, spill_dir=tmp_path)
+
+    assert sorted((line.location.name, line.location.line_number) for line in merged) == [
+        (f'log{i}', n) for i in range(3) for n in (1, 2)
+    ]
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='requires /proc/self/fd')
+def test_should_hold_at_most_fan_in_log_files_open_at_once(tmp_path):
+    paths = []
+    for i in range(20):
+        paths.append(tmp_path / f'log{i}.log')
+        paths[-1].write_text(log_text(i))
+    spill_dir = tmp_path / 'spill'
+    spill_dir.mkdir()
+
+    before = open_files()
+    sources = [ChroniclesRawSource(FileLogSource(path)) for path in paths]
+    assert open_files() == before
+
+    counts = []
+
+    def counting(source):
+        for line in source:
+            counts.append(open_files() - before)
+            yield line
+
+    merged = CascadingMergeSource(*(FunctionSource(counting, source) for source in sources), fan_in=4,
+                                  spill_dir=spill_dir)
+    for _ in merged:
+        counts.append(open_files() - before)
+
+    # the inputs of a merge, plus the run it gets spilled to.
+    assert len(counts) > 100
+    assert 0 < max(counts) <= 4 + 1
+    assert open_files() == before
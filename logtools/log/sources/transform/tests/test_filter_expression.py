@@ -0,0 +1,116 @@
+import pickle
+
+import pytest
+from dateutil import parser
+from elasticsearch import Elasticsearch
+
+from logtools.log.sources.input.elastic_search_source import ElasticSearchSource
+from logtools.log.sources.input.string_log_source import StringLogSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource, LogLevel
+from logtools.log.sources.transform.filter_expression import compile_filter, Comparison, And, Or, Not
+from logtools.log.sources.transform.filtered_source import FilteredSource
+
+LOG = '''TRC 2023-10-16 20:29:24.595+00:00 Advertising block topics="codex discoveryengine" cid=zb2a count=1
+WRN 2023-10-16 20:29:24.597+00:00 Dropping blocks topics="codex discovery" tid=1 cid=zb2b count=2
+ERR 2023-10-16 20:29:24.646+00:00 Block not found topics="codex repostore" cid=zb2a count=3
+INF 2023-10-16 20:29:24.700+00:00 Stored block topics="codex repostore" tid=2 cid="zb2 a" count=4
+NOT 2023-10-16 20:29:25.000+00:00 Blocked peer topics="codex blockexcnetwork" count=5'''
+
+
+def counts(expression: str):
+    lines = FilteredSource(ChroniclesRawSource(StringLogSource(LOG)), compile_filter(expression))
+    return [line.count for line in lines]
+
+
+def test_should_parse_expressions_with_precedence():
+    assert compile_filter('level=WRN or not count>2 and message=x').tree == Or((
+        Comparison('level', '=', LogLevel.warning),
+        And((Not(Comparison('count', '>', 2)), Comparison('message', '=', 'x'))),
+    ))
+
+
+@pytest.mark.parametrize('expression,expected', [
+    ('level>=WRN', [2, 3]),
+    ('level<INF', [1]),
+    ('level!=trace and level<=note', [4, 5]),
+    ('topics.cid=zb2a', [1, 3]),
+    ('topics.cid="zb2 a"', [4]),
+    ('topics.cid!=zb2a', [2, 4, 5]),
+    ('topics.topics~discovery', [2]),
+    ('topics.topics="codex repostore"', [3, 4]),
+    ('message~"block"', [1, 3, 4]),
+    ('message="Block not found"', [3]),
+    ('count>=2 and count<4', [2, 3]),
+    ('timestamp>"2023-10-16 20:29:24.646" and timestamp<="2023-10-16 20:29:25+00:00"', [4, 5]),
+    ('not (level=ERR or topics.tid=1)', [1, 4, 5]),
+    ('level>=WRN and topics.cid=zb2a and message~"Block"', [3]),
+])
+def test_should_filter_lines(expression, expected):
+    assert counts(expression) == expected
+
+
+@pytest.mark.parametrize('expression', [
+    'level>=WRN and topics.cid=zb2a',
+    'level=TRC or topics.tid=2',
+    'timestamp>="2023-10-16 20:29:24.646" and message="Stored block"',
+    'topics.cid="zb2 a"',
+])
+def test_should_prefilter_only_lines_the_expression_rejects(expression):
+    compiled = compile_filter(expression)
+    prefilter = compiled.raw_prefilter()
+    lines = list(ChroniclesRawSource(StringLogSource(LOG)))
+
+    assert prefilter is not None
+    assert any(not prefilter(line) for line in lines)
+    assert all(prefilter(line) for line in lines if compiled(line))
+
+
+def test_should_pickle_compiled_expressions():
+    compiled = pickle.loads(pickle.dumps(compile_filter('level>=WRN and message~block')))
+    assert [line.count for line in ChroniclesRawSource(StringLogSource(LOG)) if compiled(line)] == [3]
+
+
+@pytest.mark.parametrize('expression', [
+    'level>', 'unknown=1', 'level~x', '(level=WRN', 'level=XYZ', 'count=abc', 'level=WRN and', 'level=WRN)',
+])
+def test_should_reject_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        compile_filter(expression)
+
+
+def test_should_translate_timestamps_into_es_clauses_with_slack():
+    clause, exact = compile_filter('timestamp>="2023-10-16 20:00:00" and timestamp<"2023-10-16 21:00:00"') \
+        .es_clause()
+
+    assert not exact
+    assert clause == {'bool': {'filter': [
+        {'range': {'@timestamp': {'gte': '2023-10-16T19:59:00+00:00'}}},
+        {'range': {'@timestamp': {'lte': '2023-10-16T21:01:00+00:00'}}},
+    ]}}
+    assert compile_filter('timestamp="2023-10-16 20:00:00"').es_clause() == (
+        {'range': {'@timestamp': {'gte': '2023-10-16T19:59:00+00:00', 'lte': '2023-10-16T20:01:00+00:00'}}}, False)
+    assert compile_filter('not timestamp>"2023-10-16 21:00:00"').es_clause() == (None, False)
+
+
+def test_should_translate_other_attributes_into_full_text_clauses():
+    clause, exact = compile_filter('level>=WRN and topics.cid=zb2a and count>1').es_clause()
+
+    assert not exact
+    assert clause is not None
+    levels, topic = clause['bool']['filter']
+    assert {should['match']['message'] for should in levels['bool']['should']} == {'WRN', 'ERR'}
+    assert topic == {'match_phrase': {'message': 'cid=zb2a'}}
+
+
+def test_should_not_translate_negations_or_disjunctions_of_inexact_clauses():
+    assert compile_filter('not message~block').es_clause() == (None, False)
+    assert compile_filter('message~block or count=1').es_clause() == (None, False)
+
+
+def test_should_add_filters_to_es_query():
+    clause, _ = compile_filter('message~block').es_clause()
+    source = ElasticSearchSource(
+        pods={'codex1'}, client=Elasticsearch('http://localhost:9200'), filters=[clause],
+        start_date=parser.parse('2023-10-16 20:00:00+00:00'))
+
+    assert source._build_query()['query']['bool']['filter'][-1] == {'match_phrase': {'message': 'block'}}
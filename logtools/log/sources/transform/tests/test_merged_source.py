@@ -1,6 +1,8 @@
+from datetime import datetime, timezone, timedelta
+
 from logtools.log.sources.input.string_log_source import StringLogSource
 from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
-from logtools.log.sources.transform.merged_source import MergedSource
+from logtools.log.sources.transform.merged_source import MergedSource, epoch_nanos
 from logtools.log.sources.transform.ordered_source import OrderedSource
 
 
@@ -25,3 +27,29 @@ def test_should_merge_logs_by_timestamp():
 
     merged = MergedSource(log1, log2)
     assert [line.count for line in merged] == [1, 6, 7, 8, 2, 3, 9, 4, 5, 10]
+
+
+def test_should_break_timestamp_ties_by_source_and_then_by_line_order():
+    log1 = ChroniclesRawSource(StringLogSource(
+        name='log1',
+        lines="""TRC 2023-10-16 20:29:24.594+00:00 Advertising block    topics="codex discoveryengine" count=1
+          TRC 2023-10-16 20:29:24.594+00:00 Provided to nodes           topics="codex discovery" tid=1 count=2
+          TRC 2023-10-16 20:29:24.595+00:00 Advertised block            topics="codex discoveryengine" count=3"""
+    ))
+
+    log2 = ChroniclesRawSource(StringLogSource(
+        name='log2',
+        lines="""TRC 2023-10-16 20:29:24.594+00:00 Advertising block    topics="codex discoveryengine" count=4
+          TRC 2023-10-16 20:29:24.595+00:00 Provided to nodes           topics="codex discovery" tid=1 count=5
+          TRC 2023-10-16 20:29:24.595+00:00 Advertised block            topics="codex discoveryengine" count=6"""
+    ))
+
+    assert [line.count for line in MergedSource(log1, log2)] == [1, 2, 4, 3, 5, 6]
+
+
+def test_should_convert_timestamps_to_epoch_nanoseconds():
+    assert epoch_nanos(datetime(1970, 1, 1, tzinfo=timezone.utc)) == 0
+    assert epoch_nanos(datetime(2023, 10, 16, 20, 29, 24, 594123, tzinfo=timezone.utc)) == 1_697_488_164_594_123_000
+    assert epoch_nanos(
+        datetime(2023, 10, 16, 22, 29, 24, 594123, tzinfo=timezone(timedelta(hours=2)))
+    ) == 1_697_488_164_594_123_000
@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+import pytest
+
+from logtools.log.sources.input.string_log_source import StringLogSource
+from logtools.log.sources.parse.chronicles_raw_source import ChroniclesRawSource
+from logtools.log.sources.transform.reordered_source import ReorderedSource, SortedSource
+
+
+def test_should_restore_order_of_lines_within_slack():
+    log = ChroniclesRawSource(StringLogSource(
+        name='log1',
+        lines="""TRC 2023-10-16 20:29:24.595+00:00 Advertising block    topics="codex discoveryengine" count=1
+          TRC 2023-10-16 20:29:24.594+00:00 Provided to nodes           topics="codex discovery" tid=1 count=2
+          TRC 2023-10-16 20:29:24.597+00:00 Advertised block            topics="codex discoveryengine" count=3
+          TRC 2023-10-16 20:29:24.596+00:00 Retrieved record from repo  topics="codex repostore" count=4
+          TRC 2023-10-16 20:29:24.596+00:00 Retrieved record from repo  topics="codex repostore" count=5
+          TRC 2023-10-16 20:29:24.646+00:00 Providing block             topics="codex discovery" count=6"""
+    ))
+
+    reordered = ReorderedSource(log, slack=timedelta(milliseconds=2))
+
+    assert [line.count for line in reordered] == [2, 1, 4, 5, 3, 6]
+    assert reordered.late_lines == 0
+
+
+def test_should_emit_lines_which_arrive_later_than_slack_as_they_come():
+    log = ChroniclesRawSource(StringLogSource(
+        name='log1',
+        lines="""TRC 2023-10-16 20:29:24.594+00:00 Advertising block    topics="codex discoveryengine" count=1
+          TRC 2023-10-16 20:29:24.600+00:00 Provided to nodes           topics="codex discovery" tid=1 count=2
+          TRC 2023-10-16 20:29:24.595+00:00 Advertised block            topics="codex discoveryengine" count=3
+          TRC 2023-10-16 20:29:24.601+00:00 Retrieved record from repo  topics="codex repostore" count=4"""
+    ))
+
+    reordered = ReorderedSource(log, slack=timedelta(milliseconds=2))
+
+    assert [line.count for line in reordered] == [1, 3, 2, 4]
+    assert reordered.late_lines == 0
+
+    log = ChroniclesRawSource(StringLogSource(
+        name='log1',
+        lines="""TRC 2023-10-16 20:29:24.594+00:00 Advertising block    topics="codex discoveryengine" count=1
+          TRC 2023-10-16 20:29:24.600+00:00 Provided to nodes           topics="codex discovery" tid=1 count=2
+          TRC 2023-10-16 20:29:24.603+00:00 Advertised block            topics="codex discoveryengine" count=3
+          TRC 2023-10-16 20:29:24.595+00:00 Retrieved record from repo  topics="codex repostore" count=4"""
+    ))
+
+    reordered = ReorderedSource(log, slack=timedelta(milliseconds=2))
+
+    assert [line.count for line in reordered] == [1, 2, 4, 3]
+    assert reordered.late_lines == 1
+
+
+def test_should_bound_the_number_of_buffered_lines():
+    log = ChroniclesRawSource(StringLogSource(
+        name='log1',
+        lines="""TRC 2023-10-16 20:29:24.597+00:00 Advertising block    topics="codex discoveryengine" count=1
+          TRC 2023-10-16 20:29:24.596+00:00 Provided to nodes           topics="codex discovery" tid=1 count=2
+          TRC 2023-10-16 20:29:24.595+00:00 Advertised block            topics="codex discoveryengine" count=3"""
+    ))
+
+    assert [line.count for line in ReorderedSource(log, slack=timedelta(seconds=1), max_lines=1)] == [2, 3, 1]
+
+
+UNSORTED = """TRC 2023-10-16 20:29:24.649+00:00 Advertising block    topics="codex discoveryengine" count=1
+          TRC 2023-10-16 20:29:24.594+00:00 Provided to nodes           topics="codex discovery" tid=1 count=2
+          TRC 2023-10-16 20:29:24.646+00:00 Advertised block            topics="codex discoveryengine" count=3
+          TRC 2023-10-16 20:29:24.597+00:00 Retrieved record from repo  topics="codex repostore" count=4
+          TRC 2023-10-16 20:29:24.594+00:00 Providing block             topics="codex discovery" count=5
+          TRC 2023-10-16 20:29:24.600+00:00 Advertising block    topics="codex discoveryengine" count=6
+          TRC 2023-10-16 20:29:24.595+00:00 Provided to nodes           topics="codex discovery" tid=1 count=7"""
+
+
+@pytest.mark.parametrize('run_size', [2, 3, 100])
+def test_should_sort_unordered_sources(run_size, tmp_path):
+    log = ChroniclesRawSource(StringLogSource(name='log1', lines=UNSORTED))
+
+    sorted_log = SortedSource(log, run_size=run_size, fan_in=2, spill_dir=tmp_path)
+
+    assert [line.count for line in sorted_log] == [2, 5, 7, 4, 6, 3, 1]
+    assert list(tmp_path.iterdir()) == []
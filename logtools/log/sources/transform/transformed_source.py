@@ -0,0 +1,17 @@
+from typing import Callable, Iterator, Optional
+
+from logtools.log.base import LogSource, TLogLine
+
+
+class TransformedSource(LogSource[TLogLine]):
+    """Applies `transform` to every line of a source, leaving out the lines for which it returns `None`."""
+
+    def __init__(self, source: LogSource[TLogLine], transform: Callable[[TLogLine], Optional[TLogLine]]):
+        self.source = source
+        self.transform = transform
+
+    def __iter__(self) -> Iterator[TLogLine]:
+        for line in self.source:
+            transformed = self.transform(line)
+            if transformed is not None:
+                yield transformed
@@ -0,0 +1,14 @@
+from logtools.log.sources.input.string_log_source import StringLogSource
+
+
+def test_should_iterate_over_lines_in_batches():
+    source = StringLogSource('\n'.join(f'line {i}' for i in range(1, 11)))
+
+    batches = list(source.iter_batches(4))
+
+    assert [[line.location.line_number for line in batch] for batch in batches] == \
+           [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]]
+
+
+def test_should_yield_no_batches_for_empty_sources():
+    assert list(StringLogSource('').iter_batches(4)) == []
@@ -0,0 +1,21 @@
+from logtools.log.interning import StringInterner
+
+
+def test_should_return_the_same_object_for_equal_strings():
+    interner = StringInterner()
+    first = interner(''.join(['pod', '-1']))
+    second = interner(''.join(['pod', '-1']))
+
+    assert first == second
+    assert first is second
+
+
+def test_should_not_grow_past_its_maximum_size():
+    interner = StringInterner(max_size=2)
+    interner('a')
+    interner('b')
+
+    third = ''.join(['c', 'c'])
+    assert interner(third) is third
+    assert len(interner) == 2
+    assert interner(''.join(['c', 'c'])) is not third